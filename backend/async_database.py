@@ -0,0 +1,366 @@
+"""
+Async MongoDB data layer (Motor).
+
+Mirrors the data-access functions in database.py for use from `async def`
+endpoints and dependencies, so a Mongo round trip no longer blocks the event loop.
+Query shapes, projections and pipelines are shared with database.py; the sync
+versions remain for scripts like clear_users.py and for sync endpoints.
+Index management, rollup backfill and consistency checks are maintenance tasks
+and stay sync-only in database.py.
+"""
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from user_cache import user_cache
+from database import (
+    MONGODB_URI, DATABASE_NAME, KEYSET_SORT, chat_log_writer, _client_options, _Lazy,
+    _analysis_documents, _attach_sections, _section_ids, _wants_result,
+    _with_buffered_messages, _rollup_update, _history_projection,
+    _keyset_query, _keyset_result, _first_month, _trends_from_rollups, RECURRING_PROJECTION,
+    TRANSACTION_PROJECTION, _transaction_range, _transaction_document, _transaction_trends_pipeline, _transaction_trends
+)
+
+_client = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Return the shared Motor client, creating it on first use (normally in the app lifespan)."""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(MONGODB_URI, **_client_options())
+    return _client
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def ping() -> bool:
+    """Round-trip to the server; raises if MongoDB is unreachable."""
+    await get_client().admin.command("ping")
+    return True
+
+
+db = _Lazy(lambda: get_client()[DATABASE_NAME])
+
+# Collections
+analyses_collection = db["analyses"]
+users_collection = db["users"]
+goals_collection = db["savings_goals"]
+chat_history_collection = db["chat_history"]
+rollups_collection = db["monthly_rollups"]
+sections_collection = db["analysis_sections"]
+recurring_collection = db["recurring_series"]
+transactions_collection = db["transactions"]
+category_overrides_collection = db["category_overrides"]
+
+
+# ===== USER AUTHENTICATION =====
+
+async def create_user(email: str, password_hash: str, is_verified: bool = False) -> str:
+    """Create a new user and return the user ID."""
+    document = {
+        "email": email.lower(),
+        "password_hash": password_hash,
+        "is_verified": is_verified,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    inserted = await users_collection.insert_one(document)
+    return str(inserted.inserted_id)
+
+
+async def get_user_by_email(email: str) -> Optional[dict]:
+    """Get a user by email address."""
+    doc = await users_collection.find_one({"email": email.lower()})
+    if doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def get_user_by_id(user_id: str) -> Optional[dict]:
+    """Get a user by ID."""
+    try:
+        doc = await users_collection.find_one({"_id": ObjectId(user_id)})
+        if doc:
+            doc["_id"] = str(doc["_id"])
+        return doc
+    except Exception:
+        return None
+
+
+async def verify_user_email(email: str) -> bool:
+    """Mark a user's email as verified."""
+    doc = await users_collection.find_one_and_update(
+        {"email": email.lower()},
+        {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}},
+        projection={"_id": 1}
+    )
+    # A match counts as success even if the user was already verified
+    if doc is None:
+        return False
+    await user_cache.ainvalidate(str(doc["_id"]))
+    return True
+
+
+async def update_password_hash(user_id: str, password_hash: str) -> bool:
+    """Replace a user's password hash (e.g. after a bcrypt cost change)."""
+    result = await users_collection.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"password_hash": password_hash, "updated_at": datetime.utcnow()}}
+    )
+    return result.matched_count > 0
+
+
+async def get_user_by_google_id(google_id: str) -> Optional[dict]:
+    """Get a user by Google ID."""
+    doc = await users_collection.find_one({"google_id": google_id})
+    if doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def create_or_update_google_user(google_id: str, email: str, name: str = "", picture: str = "") -> dict:
+    """Create or update a user from Google OAuth."""
+    existing = await get_user_by_google_id(google_id)
+    if existing:
+        await users_collection.update_one(
+            {"google_id": google_id},
+            {"$set": {"name": name, "picture": picture, "updated_at": datetime.utcnow()}}
+        )
+        existing["name"] = name
+        existing["picture"] = picture
+        await user_cache.ainvalidate(existing["_id"])
+        return existing
+
+    # Link Google account to an existing email user
+    email_user = await get_user_by_email(email)
+    if email_user:
+        await users_collection.update_one(
+            {"email": email.lower()},
+            {"$set": {
+                "google_id": google_id,
+                "is_verified": True,  # Google users are auto-verified
+                "name": name,
+                "picture": picture,
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        email_user["google_id"] = google_id
+        email_user["is_verified"] = True
+        await user_cache.ainvalidate(email_user["_id"])
+        return email_user
+
+    document = {
+        "email": email.lower(),
+        "password_hash": None,  # Google users don't have password
+        "is_verified": True,  # Google users are auto-verified
+        "google_id": google_id,
+        "name": name,
+        "picture": picture,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    inserted = await users_collection.insert_one(document)
+    document["_id"] = str(inserted.inserted_id)
+    return document
+
+
+# ===== FINANCE ANALYSIS (Per-User) =====
+
+async def _keyset_page(collection, query: dict, limit: int, cursor: Optional[str], projection: dict = None) -> dict:
+    """Fetch one newest-first page and the cursor for the page after it."""
+    query, projection = _keyset_query(query, cursor, projection)
+    docs = await collection.find(query, projection).sort(KEYSET_SORT).limit(limit + 1).to_list(None)
+    if _wants_result(projection):
+        ids = _section_ids(docs)
+        sections = await sections_collection.find({"_id": {"$in": ids}}).to_list(None) if ids else []
+        _attach_sections(docs, sections, projection)
+    return _keyset_result(docs, limit)
+
+
+async def save_analysis(user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
+    """Save an analysis to MongoDB and return the inserted ID."""
+    document, sections = _analysis_documents(user_id, income, profile, expenses, result)
+    # Sections first, so an analysis never points at text that isn't there
+    await sections_collection.insert_one(sections)
+    inserted = await analyses_collection.insert_one(document)
+    await update_rollup(user_id, document["created_at"], income, expenses)
+    return str(inserted.inserted_id)
+
+
+async def get_analyses_page(user_id: str, limit: int = 10, cursor: str = None, fields: list = None) -> dict:
+    """Get one page of a user's analyses, newest first. See database.get_analyses_page."""
+    return await _keyset_page(
+        analyses_collection, {"user_id": user_id}, limit, cursor, _history_projection(fields)
+    )
+
+
+async def get_all_analyses(user_id: str, limit: int = 10) -> list:
+    """Get summaries of the most recent analyses for a specific user."""
+    return (await get_analyses_page(user_id, limit))["items"]
+
+
+async def get_analysis_by_id(user_id: str, analysis_id: str) -> dict:
+    """Get a specific analysis by ID (only if owned by user)."""
+    doc = await analyses_collection.find_one({"_id": ObjectId(analysis_id), "user_id": user_id})
+    if doc:
+        sections = await sections_collection.find_one({"_id": doc["_id"]}) if "result_ref" in doc else None
+        _attach_sections([doc], [sections] if sections else [])
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+# ===== SAVINGS GOALS (Per-User) =====
+
+async def save_goal(user_id: str, name: str, target: float, current: float = 0, deadline: str = None) -> str:
+    """Create a new savings goal for a user."""
+    document = {
+        "user_id": user_id,
+        "name": name,
+        "target": target,
+        "current": current,
+        "deadline": deadline,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+    inserted = await goals_collection.insert_one(document)
+    return str(inserted.inserted_id)
+
+
+async def get_all_goals(user_id: str) -> list:
+    """Get all savings goals for a specific user."""
+    goals = await goals_collection.find({"user_id": user_id}).sort("created_at", -1).to_list(None)
+    for doc in goals:
+        doc["_id"] = str(doc["_id"])
+    return goals
+
+
+async def update_goal(user_id: str, goal_id: str, updates: dict) -> bool:
+    """Update a savings goal (only if owned by user)."""
+    updates["updated_at"] = datetime.utcnow()
+    result = await goals_collection.update_one(
+        {"_id": ObjectId(goal_id), "user_id": user_id},
+        {"$set": updates}
+    )
+    return result.modified_count > 0
+
+
+async def delete_goal(user_id: str, goal_id: str) -> bool:
+    """Delete a savings goal (only if owned by user)."""
+    result = await goals_collection.delete_one({"_id": ObjectId(goal_id), "user_id": user_id})
+    return result.deleted_count > 0
+
+
+async def get_goal_by_id(user_id: str, goal_id: str) -> dict:
+    """Get a specific goal by ID (only if owned by user)."""
+    doc = await goals_collection.find_one({"_id": ObjectId(goal_id), "user_id": user_id})
+    if doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+# ===== CHAT HISTORY (Per-User) =====
+
+async def save_chat_message(user_id: str, role: str, content: str) -> str:
+    """Queue a chat message for a user; it is written in the next batch."""
+    return chat_log_writer.append(user_id, role, content)
+
+
+async def get_chat_history_page(user_id: str, limit: int = 50, cursor: str = None) -> dict:
+    """Get a page of chat history in chronological order. See database.get_chat_history_page."""
+    query, _ = _keyset_query({"user_id": user_id}, cursor, None)
+    docs = await chat_history_collection.find(query).sort(KEYSET_SORT).limit(limit + 1).to_list(None)
+    page = _keyset_result(_with_buffered_messages(docs, user_id, cursor), limit)
+    page["items"].reverse()  # Return in chronological order
+    return page
+
+
+async def get_chat_history(user_id: str, limit: int = 50) -> list:
+    """Get chat history for a user."""
+    return (await get_chat_history_page(user_id, limit))["items"]
+
+
+async def clear_chat_history(user_id: str) -> bool:
+    """Clear all chat history for a user."""
+    await asyncio.to_thread(chat_log_writer.discard, user_id)  # may wait for an in-flight batch
+    result = await chat_history_collection.delete_many({"user_id": user_id})
+    return result.deleted_count > 0
+
+
+# ===== TRANSACTIONS (Per-User) =====
+
+async def get_transactions(user_id: str, start, end=None, category: str = None) -> list:
+    """The user's transactions dated from `start` up to (not including) `end`, oldest first."""
+    docs = await transactions_collection.find(
+        _transaction_range(user_id, start, end, category), TRANSACTION_PROJECTION
+    ).sort("date", 1).to_list(None)
+    return [_transaction_document(doc) for doc in docs]
+
+
+async def get_transaction_trends(user_id: str, months: int = 6) -> dict:
+    """get_trends over the user's stored transactions for the last `months` calendar months."""
+    start = datetime.strptime(_first_month(months), "%Y-%m")
+    rows = await transactions_collection.aggregate(_transaction_trends_pipeline(user_id, start)).to_list(None)
+    return _transaction_trends(rows)
+
+
+# ===== RECURRING STATE (Per-User) =====
+
+async def get_recurring(user_id: str) -> Optional[dict]:
+    return await recurring_collection.find_one({"_id": user_id}, RECURRING_PROJECTION)
+
+
+# ===== CATEGORY OVERRIDES (Per-User) =====
+
+async def get_category_overrides(user_id: str) -> dict:
+    """{merchant key: category} the user has corrected."""
+    docs = await category_overrides_collection.find(
+        {"user_id": user_id}, {"_id": 0, "merchant": 1, "category": 1}
+    ).to_list(None)
+    return {doc["merchant"]: doc["category"] for doc in docs}
+
+
+async def set_category_override(user_id: str, merchant: str, category: str):
+    """Save the correction and apply it to the merchant's stored spending."""
+    await category_overrides_collection.update_one(
+        {"user_id": user_id, "merchant": merchant},
+        {"$set": {"category": category, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    await transactions_collection.update_many(
+        {"user_id": user_id, "merchant": merchant, "amount": {"$gt": 0}}, {"$set": {"category": category}}
+    )
+
+
+# ===== TRENDS & ANALYTICS (Per-User) =====
+
+async def update_rollup(user_id: str, created_at: datetime, income: float, expenses: list):
+    """Atomically add one analysis to its month's rollup document."""
+    query, update = _rollup_update(user_id, created_at, income, expenses)
+    await rollups_collection.update_one(query, update, upsert=True)
+
+
+async def get_trends(user_id: str, months: int = 6) -> dict:
+    """Get monthly and per-category trends from at most `months` rollup documents."""
+    docs = await rollups_collection.find(
+        {"user_id": user_id, "month": {"$gte": _first_month(months)}}
+    ).sort("month", 1).limit(max(months, 1)).to_list(None)
+    return _trends_from_rollups(docs)
+
+
+async def get_monthly_trends(user_id: str, months: int = 6) -> list:
+    """Get monthly spending trends from analysis history for a specific user."""
+    return (await get_trends(user_id, months))["monthly_breakdown"]
+
+
+async def get_category_trends(user_id: str, months: int = 6) -> dict:
+    """Get spending by category over time for a specific user."""
+    return await get_trends(user_id, months)
@@ -1,8 +1,12 @@
 """
 Authentication utilities for user signup, login, and JWT tokens.
 """
+import asyncio
+import multiprocessing
 import os
 import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -23,10 +27,18 @@ EMAIL_VERIFICATION_SECRET = os.getenv("EMAIL_VERIFICATION_SECRET", secrets.token
 email_serializer = URLSafeTimedSerializer(EMAIL_VERIFICATION_SECRET)
 
 
-def hash_password(password: str) -> str:
+# Password hashing: bcrypt cost factor (2^rounds iterations). Raising it makes new
+# hashes stronger; existing users are rehashed at their next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt runs in this many worker processes, so a burst of logins can't tie up the
+# request threadpool (and with it every other sync endpoint).
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def hash_password(password: str, rounds: int = None) -> str:
     """Hash a password using bcrypt."""
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
@@ -38,6 +50,50 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password_bytes, hashed_bytes)
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    """True if a hash was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+_password_pool = None
+_password_pool_lock = threading.Lock()
+
+
+def start_password_pool() -> ProcessPoolExecutor:
+    """Return the password hashing pool, starting it on first use."""
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None:
+            # spawn, not fork: the parent has driver and writer threads running
+            _password_pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _password_pool
+
+
+def stop_password_pool():
+    global _password_pool
+    with _password_pool_lock:
+        pool, _password_pool = _password_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def ahash_password(password: str) -> str:
+    """hash_password() on the password pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(start_password_pool(), hash_password, password, BCRYPT_ROUNDS)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password() on the password pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(start_password_pool(), verify_password, plain_password, hashed_password)
+
+
 def create_access_token(user_id: str, email: str) -> str:
     """Create a JWT access token."""
     expire = datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -84,12 +140,14 @@ def verify_google_token(token: str, client_id: str) -> Optional[dict]:
     """
     try:
         from google.oauth2 import id_token
-        from google.auth.transport import requests
+        from google_certs import GOOGLE_CERTS_URL, google_request
         
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
-            client_id
+        # Certs come from the shared cache, so this is normally local crypto only
+        idinfo = id_token.verify_token(
+            token,
+            google_request(),
+            audience=client_id,
+            certs_url=GOOGLE_CERTS_URL
         )
         
         # Verify the issuer
@@ -0,0 +1,61 @@
+"""
+Script to (re)build the monthly_rollups collection from existing analyses.
+
+    python backfill_rollups.py              # rebuild rollups for every user
+    python backfill_rollups.py --check      # only report users whose rollups drift
+
+Users are processed in parallel. Run the backfill before (or right after) deploying
+the rollup-based trends, then use --check to confirm nothing drifted.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from database import analyses_collection, rebuild_rollups, check_rollups
+
+
+def backfill_all(workers: int = 8) -> int:
+    """Rebuild rollups for every user with analyses. Returns the number of users processed."""
+    user_ids = analyses_collection.distinct("user_id")
+    print(f"🔄 Rebuilding rollups for {len(user_ids)} users with {workers} workers...")
+
+    months_written = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(rebuild_rollups, user_id): user_id for user_id in user_ids}
+        for future in as_completed(futures):
+            try:
+                months_written += future.result()
+            except Exception as e:
+                print(f"❌ Failed for user {futures[future]}: {e}")
+
+    print(f"✅ Wrote {months_written} monthly rollups")
+    return len(user_ids)
+
+
+def check_all(workers: int = 8) -> int:
+    """Report users whose rollups don't match raw history. Returns the number of drifted users."""
+    user_ids = analyses_collection.distinct("user_id")
+    print(f"🔍 Checking rollups for {len(user_ids)} users...")
+
+    drifted = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(check_rollups, user_id): user_id for user_id in user_ids}
+        for future in as_completed(futures):
+            mismatches = future.result()
+            if mismatches:
+                drifted += 1
+                months = ", ".join(m["month"] for m in mismatches)
+                print(f"   ❌ {futures[future]}: {months}")
+
+    print("✅ All rollups consistent" if drifted == 0 else f"⚠️ {drifted} users drifted")
+    return drifted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only verify rollups against raw history")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(1 if check_all(args.workers) else 0)
+    backfill_all(args.workers)
@@ -0,0 +1,110 @@
+"""
+Benchmark: concurrent authenticated requests, sync vs async user lookup.
+
+The auth dependency is `async def`, so a synchronous pymongo find_one inside it
+blocks the event loop for the whole round trip and requests are served one at a
+time. This fires CONCURRENCY concurrent requests through the ASGI app and reports
+throughput for both variants.
+
+By default the user store is an in-memory stand-in with a simulated round trip of
+RTT_MS. Set BENCH_MONGODB_URI to run the lookups against a real mongod instead.
+    python -m benchmarks.bench_auth_concurrency
+"""
+import asyncio
+import os
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+
+BENCH_MONGODB_URI = os.getenv("BENCH_MONGODB_URI")
+RTT_MS = float(os.getenv("RTT_MS", "5"))
+CONCURRENCY = 200
+
+USER = {"_id": "bench-user", "email": "bench@example.com", "is_verified": True}
+
+
+# ===== USER STORES =====
+
+def sync_lookup_stub(user_id: str) -> dict:
+    time.sleep(RTT_MS / 1000)
+    return USER
+
+
+async def async_lookup_stub(user_id: str) -> dict:
+    await asyncio.sleep(RTT_MS / 1000)
+    return USER
+
+
+def mongo_lookups():
+    """Real pymongo and Motor lookups against BENCH_MONGODB_URI."""
+    from pymongo import MongoClient
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    sync_users = MongoClient(BENCH_MONGODB_URI)["finance_bench"]["users"]
+    async_users = AsyncIOMotorClient(BENCH_MONGODB_URI)["finance_bench"]["users"]
+    sync_users.replace_one({"_id": USER["_id"]}, USER, upsert=True)
+
+    def sync_lookup(user_id: str) -> dict:
+        return sync_users.find_one({"_id": user_id})
+
+    async def async_lookup(user_id: str) -> dict:
+        return await async_users.find_one({"_id": user_id})
+
+    return sync_lookup, async_lookup
+
+
+# ===== APP =====
+
+def build_app(sync_lookup, async_lookup) -> FastAPI:
+    app = FastAPI()
+
+    async def user_blocking():
+        # The previous get_current_user: sync driver call inside async def
+        return sync_lookup(USER["_id"])
+
+    async def user_async():
+        return await async_lookup(USER["_id"])
+
+    @app.get("/me-blocking")
+    async def me_blocking(user: dict = Depends(user_blocking)):
+        return {"id": user["_id"]}
+
+    @app.get("/me-async")
+    async def me_async(user: dict = Depends(user_async)):
+        return {"id": user["_id"]}
+
+    return app
+
+
+async def fire(app: FastAPI, path: str) -> float:
+    """Send CONCURRENCY concurrent requests and return requests/second."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get(path)  # warm up
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(path) for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses)
+    return CONCURRENCY / elapsed
+
+
+async def main():
+    if BENCH_MONGODB_URI:
+        print(f"User store: mongod at {BENCH_MONGODB_URI}")
+        app = build_app(*mongo_lookups())
+    else:
+        print(f"User store: in-memory stand-in, {RTT_MS:.0f} ms simulated round trip")
+        app = build_app(sync_lookup_stub, async_lookup_stub)
+
+    blocking = await fire(app, "/me-blocking")
+    non_blocking = await fire(app, "/me-async")
+
+    print(f"{CONCURRENCY} concurrent requests")
+    print(f"Sync lookup in async dependency: {blocking:8.0f} req/s")
+    print(f"Async lookup (Motor):            {non_blocking:8.0f} req/s")
+    print(f"Speedup: {non_blocking / blocking:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Benchmark: email outbox delivery against a local SMTP sink.
+
+Starts a minimal SMTP server on 127.0.0.1 (stdlib only: it accepts every message
+and records the recipient) and an EmailOutbox over a temporary SQLite store, then
+drives deliver_batch directly:
+- MESSAGES queued messages are all delivered over one SMTP connection;
+- after the sink drops the open connection, the next batch reconnects once and
+  nothing is retried;
+- while the sink is down, the batch is rescheduled; once it is back, the retries
+  are delivered and the queue is empty.
+Fails on any of these, and reports the delivery rate.
+    python -m benchmarks.bench_email_outbox
+"""
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+MESSAGES = int(os.getenv("MESSAGES", "200"))
+RETRY_BASE = 0.2  # seconds before a rescheduled message is due again
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP session: replies 250 to everything and keeps what arrives after DATA."""
+
+    def handle(self):
+        self.server.sessions.append(self.connection)
+        self.wfile.write(b"220 sink ready\r\n")
+        recipient = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            if command == b"RCPT":
+                recipient = line.decode().split(":", 1)[1].strip().strip("<>")
+            if command == b"DATA":
+                self.wfile.write(b"354 go ahead\r\n")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.received.append(recipient)
+            self.wfile.write(b"250 ok\r\n")
+
+
+class Sink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int):
+        super().__init__(("127.0.0.1", port), SinkHandler)
+        self.received = []
+        self.sessions = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def drop_sessions(self):
+        """Close the open client connections, as a server timing them out would."""
+        for connection in self.sessions:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.sessions.clear()
+
+    def stop(self):
+        self.drop_sessions()
+        self.shutdown()
+        self.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    port = free_port()
+    tmp = tempfile.mkdtemp()
+    # email_service reads its settings at import time
+    os.environ.update(
+        STORAGE_BACKEND="sqlite", SQLITE_PATH=os.path.join(tmp, "bench.db"), SMTP_HOST="127.0.0.1",
+        SMTP_PORT=str(port), SMTP_STARTTLS="false", SMTP_LOGIN="false", SMTP_FROM="noreply@localhost",
+        EMAIL_RETRY_BASE=str(RETRY_BASE)
+    )
+    from email_service import EmailOutbox
+    from storage.sqlite import SQLiteStorage
+
+    store = SQLiteStorage(os.path.join(tmp, "bench.db"))
+    store.connect()
+    outbox = EmailOutbox(store)
+
+    def enqueue(count: int, prefix: str):
+        for i in range(count):
+            store.enqueue_email(f"{prefix}{i}@example.com", "Verify", "text", "<p>html</p>")
+
+    def drain() -> int:
+        claimed = 0
+        while True:
+            batch = outbox.deliver_batch()
+            claimed += batch
+            if not batch:
+                return claimed
+
+    sink = Sink(port)
+    enqueue(MESSAGES, "user")
+    start = time.perf_counter()
+    drain()
+    elapsed = time.perf_counter() - start
+    assert len(sink.received) == MESSAGES, (len(sink.received), outbox.stats())
+    assert outbox.connections == 1 and len(sink.sessions) == 1, outbox.stats()
+    print(f"{MESSAGES} messages over {outbox.connections} connection: {elapsed:.2f} s, {MESSAGES / elapsed:,.0f}/s")
+
+    sink.drop_sessions()
+    enqueue(5, "after-drop")
+    drain()
+    assert len(sink.received) == MESSAGES + 5, (len(sink.received), outbox.stats())
+    assert outbox.connections == 2 and outbox.retried == 0, outbox.stats()
+    print(f"dropped connection: reconnected once, {outbox.retried} retried")
+
+    sink.stop()
+    enqueue(3, "while-down")
+    drain()
+    assert outbox.retried == 3 and outbox.sent == MESSAGES + 5, outbox.stats()
+    sink = Sink(port)
+    time.sleep(RETRY_BASE * 2)
+    drain()
+    assert sorted(sink.received) == [f"while-down{i}@example.com" for i in range(3)], sink.received
+    time.sleep(RETRY_BASE * 2)
+    assert drain() == 0 and outbox.failed == 0, outbox.stats()
+    print(f"server down: {outbox.retried} rescheduled, delivered after restart, queue empty")
+    print(outbox.stats())
+
+    outbox._disconnect()
+    sink.stop()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: CSV/OFX/QIF import throughput and peak memory.
+
+Writes synthetic exports of 10k/100k/1M transactions and imports each one into
+a fresh SQLite database in a fresh interpreter (peak RSS is per process),
+reporting rows/s and peak RSS over the import baseline. Memory should stay
+flat as the row count grows.
+    python -m benchmarks.bench_import
+    ROWS=1000000 FORMATS=csv python -m benchmarks.bench_import
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+from benchmarks.statements import DESCRIPTIONS
+
+ROWS = [int(r) for r in os.getenv("ROWS", "10000,100000,1000000").split(",")]
+FORMATS = os.getenv("FORMATS", "csv,ofx,qif").split(",")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import os, resource, sys, time
+from storage.sqlite import SQLiteStorage
+from statement_import import import_statement
+
+store = SQLiteStorage(sys.argv[3])
+store.connect()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(sys.argv[2], "rb") as f:
+    result = import_statement(store, "bench-user", sys.argv[1], "bench", f)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+assert store.count_transactions("bench-user") == result["imported"]
+print(result["seconds"], peak, baseline, result["imported"], result["skipped"])
+"""
+
+
+def transactions(rows: int, seed: int = 11):
+    rng = random.Random(seed)
+    day = date(2015, 1, 1)
+    balance = 500000.0
+    for i in range(rows):
+        if i % 40 == 0:
+            day += timedelta(days=1)
+        description = rng.choice(DESCRIPTIONS)
+        amount = round(rng.randint(50, 90000) + rng.randint(0, 99) / 100, 2)
+        credit = description == "Salary Credit"
+        balance = round(balance + amount if credit else balance - amount, 2)
+        yield day, description, -amount if not credit else amount, balance
+
+
+def write_csv(path: str, rows: int):
+    with open(path, "w", newline="") as f:
+        f.write("Account Statement\nTxn Date,Description,Ref No.,Withdrawal Amt.,Deposit Amt.,Closing Balance\n")
+        for i, (day, description, amount, balance) in enumerate(transactions(rows)):
+            debit, credit = (f"{-amount:.2f}", "") if amount < 0 else ("", f"{amount:.2f}")
+            f.write(f"{day:%d/%m/%Y},{description},{i},{debit},{credit},{balance:.2f}\n")
+
+
+def write_ofx(path: str, rows: int):
+    with open(path, "w") as f:
+        f.write("OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n")
+        for i, (day, description, amount, _) in enumerate(transactions(rows)):
+            f.write(f"<STMTTRN><TRNTYPE>{'DEBIT' if amount < 0 else 'CREDIT'}<DTPOSTED>{day:%Y%m%d}120000"
+                    f"<TRNAMT>{amount:.2f}<FITID>{i}<NAME>{description}</STMTTRN>\n")
+        f.write("</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n")
+
+
+def write_qif(path: str, rows: int):
+    with open(path, "w") as f:
+        f.write("!Type:Bank\n")
+        for day, description, amount, _ in transactions(rows):
+            f.write(f"D{day:%m/%d/%Y}\nT{amount:,.2f}\nP{description}\n^\n")
+
+
+WRITERS = {"csv": write_csv, "ofx": write_ofx, "qif": write_qif}
+
+
+def run(source: str, path: str, db: str) -> tuple:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, source, path, db], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    seconds, peak, baseline = float(output[0]), int(output[1]), int(output[2])
+    return seconds, peak / 1024, (peak - baseline) / 1024, int(output[3]), int(output[4])
+
+
+def main():
+    print(f"{'format':<7}{'rows':>9}{'file (MiB)':>12}{'time (s)':>10}{'rows/s':>10}"
+          f"{'peak RSS (MiB)':>16}{'over baseline (MiB)':>21}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in FORMATS:
+            for rows in ROWS:
+                path = os.path.join(tmp, f"export-{rows}.{source}")
+                WRITERS[source](path, rows)
+                size = os.path.getsize(path) / 1024 / 1024
+                seconds, peak, growth, imported, skipped = run(source, path, os.path.join(tmp, f"{source}-{rows}.db"))
+                assert imported == rows and skipped == 0, (source, rows, imported, skipped)
+                print(f"{source:<7}{rows:>9}{size:12.1f}{seconds:10.2f}{imported / seconds:10,.0f}"
+                      f"{peak:16.1f}{growth:21.1f}")
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: login throughput, and what a login storm does to other endpoints.
+
+Fires CONCURRENCY concurrent logins at the app (SQLite storage, in-process) and,
+at the same time, a trickle of GET / requests. Compares:
+- inline: the previous handler, a sync endpoint calling bcrypt on the request threadpool
+- pool:   /auth/login, bcrypt on the password process pool
+
+GET / is a sync endpoint too, so with inline bcrypt it queues behind the logins.
+    python -m benchmarks.bench_login
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+CONCURRENCY = int(os.getenv("CONCURRENCY", "64"))
+PROBES = 20
+PASSWORD = "bench-password"
+
+
+async def storm(client, path: str) -> tuple:
+    """Run the login storm with GET / probes alongside. Returns (logins/s, probe latencies)."""
+    probe_latencies = []
+
+    async def probe():
+        for _ in range(PROBES):
+            start = time.perf_counter()
+            await client.get("/")
+            probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    body = {"email": "bench@example.com", "password": PASSWORD}
+    start = time.perf_counter()
+    logins = asyncio.gather(*(client.post(path, json=body) for _ in range(CONCURRENCY)))
+    responses, _ = await asyncio.gather(logins, probe())
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    return CONCURRENCY / elapsed, probe_latencies
+
+
+async def run():
+    import httpx
+    from fastapi import HTTPException
+
+    import main
+    from auth import hash_password, verify_password, create_access_token, BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+    from storage import storage
+
+    @main.app.post("/bench/login-inline")
+    def login_inline(data: main.LoginRequest):
+        user = storage.get_user_by_email(data.email)
+        if not user or not verify_password(data.password, user["password_hash"]):
+            raise HTTPException(status_code=401)
+        return {"access_token": create_access_token(user["_id"], user["email"])}
+
+    async with main.app.router.lifespan_context(main.app):
+        storage.create_user("bench@example.com", hash_password(PASSWORD), is_verified=True)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await client.post("/auth/login", json={"email": "bench@example.com", "password": PASSWORD})  # start workers
+            results = {
+                "inline": await storm(client, "/bench/login-inline"),
+                "pool": await storm(client, "/auth/login")
+            }
+
+    print(f"bcrypt cost {BCRYPT_ROUNDS}, {PASSWORD_HASH_WORKERS} hash workers, {CONCURRENCY} concurrent logins")
+    print(f"{'':<8}{'logins/s':>10}{'GET / p50 (ms)':>16}{'GET / max (ms)':>16}")
+    for name, (rate, probes) in results.items():
+        print(f"{name:<8}{rate:10.1f}{statistics.median(probes) * 1000:16.1f}{max(probes) * 1000:16.1f}")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+"""
+Benchmark: merchant keyword classification over 100k statement descriptions.
+
+Descriptions look like statement rows: payment-rail prefixes and reference
+numbers around a few hundred merchant names, so raw strings rarely repeat but
+normalized ones do. Compares the previous per-keyword `in` scans (subscription
+and entertainment lists, lowercasing each time) with the compiled classifier,
+cold (new instance) and warm (memoized), for the default dictionary and for
+one with KEYWORDS extra merchant keywords.
+    python -m benchmarks.bench_merchants
+"""
+import os
+import random
+import time
+
+from merchant_classifier import DEFAULT_ALIASES, DEFAULT_LABELS, MerchantClassifier
+
+DESCRIPTIONS = int(os.getenv("DESCRIPTIONS", "100000"))
+KEYWORDS = int(os.getenv("KEYWORDS", "2000"))
+RAILS = ["UPI/{}/{}", "POS {1} {0}", "NACH DR {0} {1}", "{0}", "NEFT-{0}-REF{1}", "ACH {0} {1}"]
+MERCHANTS = [
+    "Netflix", "NFLX DIGITAL", "Spotify India", "Amazon Prime", "Amazon Pay", "Hotstar", "Jio Fiber Internet",
+    "Airtel Phone", "Tata Power Electricity", "Gold's Gym", "LIC Insurance", "HDFC Mortgage", "Rent Payment",
+    "Google Cloud", "Apple Services", "Adobe Creative", "Steam Gaming", "Salary Credit", "Current A/c Interest",
+]
+
+
+def descriptions(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    names = MERCHANTS + [f"{rng.choice(['Shree', 'New', 'City', 'Royal'])} {rng.choice(['Mart', 'Foods', 'Cafe'])} "
+                         f"{i}" for i in range(300)]
+    return [rng.choice(RAILS).format(rng.choice(names).upper(), rng.randint(10 ** 5, 10 ** 9)) for _ in range(count)]
+
+
+def previous(texts: list, subscription: list, entertainment: list) -> list:
+    out = []
+    for text in texts:
+        out.append((
+            any(keyword in text.lower() for keyword in subscription),
+            any(keyword in text.lower() for keyword in entertainment)
+        ))
+    return out
+
+
+def compiled(classifier: MerchantClassifier, texts: list) -> list:
+    out = []
+    for text in texts:
+        labels = classifier.classify(text)[1]
+        out.append(("subscription" in labels, "entertainment" in labels))
+    return out
+
+
+def run(name: str, labels: dict, texts: list):
+    start = time.perf_counter()
+    classifier = MerchantClassifier(labels, DEFAULT_ALIASES)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    old = previous(texts, labels["subscription"], labels["entertainment"])
+    old_s = time.perf_counter() - start
+    start = time.perf_counter()
+    new = compiled(classifier, texts)
+    cold_s = time.perf_counter() - start
+    start = time.perf_counter()
+    compiled(classifier, texts)
+    warm_s = time.perf_counter() - start
+
+    changed = sum(1 for a, b in zip(old, new) if a != b)
+    n = len(texts)
+    print(f"{name:<22}{build * 1000:10.1f}{n / old_s:14,.0f}{n / cold_s:14,.0f}{n / warm_s:14,.0f}{changed:10d}")
+    return texts, old, new
+
+
+def main():
+    texts = descriptions(DESCRIPTIONS)
+    print(f"{DESCRIPTIONS} descriptions, {len({t for t in texts})} distinct")
+    print(f"{'dictionary':<22}{'build (ms)':>10}{'previous /s':>14}{'cold /s':>14}{'warm /s':>14}{'changed':>10}")
+    texts, old, new = run(f"default ({sum(map(len, DEFAULT_LABELS.values()))} keywords)", DEFAULT_LABELS, texts)
+    rng = random.Random(9)
+    extra = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 10))) for _ in range(KEYWORDS)]
+    large = {**DEFAULT_LABELS, "subscription": DEFAULT_LABELS["subscription"] + extra}
+    run(f"+{KEYWORDS} keywords", large, texts)
+
+    # Rows whose labels changed: keywords now match at word starts only ("rent" no longer matches "current")
+    for text, a, b in list((t, a, b) for t, a, b in zip(texts, old, new) if a != b)[:3]:
+        print(f"  {text!r}: previous {a} now {b}")
+
+
+if __name__ == "__main__":
+    main()
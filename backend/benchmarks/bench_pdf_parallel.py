@@ -0,0 +1,83 @@
+"""
+Benchmark: parallel page extraction speedup against the number of workers.
+
+Parses one synthetic PAGES-page statement (default 300) with PDF_PARSE_WORKERS set
+to each value in WORKERS (default 1,2,4,8 capped at the core count), each in a
+fresh interpreter. The pool is warmed up by a first parse, as it would be in a
+running server, and the second parse is timed. Workers=1 is the serial parser.
+
+Every worker count must also read an Amount/Balance table statement exactly as
+it was written: there only the running balance, which page ranges on the pool
+don't start with, tells a refund from a payment.
+    python -m benchmarks.bench_pdf_parallel
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.statements import make_statement, make_table_statement, table_rows
+
+PAGES = int(os.getenv("PAGES", "300"))
+AMOUNT_PAGES = 24  # the Amount/Balance statement, short pages so many ranges start with a refund
+AMOUNT_ROWS_PER_PAGE = 10
+CORES = os.cpu_count() or 1
+WORKERS = [int(w) for w in os.getenv("WORKERS", ",".join(str(w) for w in (1, 2, 4, 8) if w <= CORES) or "1").split(",")]
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time, warnings
+warnings.filterwarnings("ignore")
+import pdf_parser
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "rb") as f:
+        pdf_parser.parse_bank_pdf(f)  # start and warm up the pool
+        start = time.perf_counter()
+        count = len(pdf_parser.parse_bank_pdf(f))
+    elapsed = time.perf_counter() - start
+    with open(sys.argv[2], "rb") as f:
+        rows = [[row["debit"], row["credit"], row["balance"]] for row in pdf_parser.iter_transactions(f)]
+    print(elapsed, count, json.dumps(rows))
+    pdf_parser.stop_parse_pool()
+"""
+
+
+def run(workers: int, path: str, amounts_path: str, script: str) -> tuple:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, PDF_PARSE_WORKERS=str(workers), PDF_PARALLEL_MIN_PAGES="2")
+    output = subprocess.run(
+        [sys.executable, script, path, amounts_path], cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+        check=True
+    ).stdout.split(" ", 2)
+    return float(output[0]), int(output[1]), [tuple(row) for row in json.loads(output[2])]
+
+
+def main():
+    print(f"{PAGES}-page statement, {CORES} cores")
+    print(f"{'workers':>8}{'time (s)':>10}{'speedup':>9}{'rows':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "statement.pdf")
+        with open(path, "wb") as f:
+            f.write(make_statement(PAGES))
+        amounts_path = os.path.join(tmp, "amounts.pdf")
+        with open(amounts_path, "wb") as f:
+            f.write(make_table_statement(AMOUNT_PAGES, AMOUNT_ROWS_PER_PAGE, single_amount=True))
+        expected = [
+            (row["debit"], row["credit"], row["balance"])
+            for page in table_rows(AMOUNT_PAGES, AMOUNT_ROWS_PER_PAGE) for row in page
+        ]
+        # A script file rather than -c: spawned workers re-import the main module
+        script = os.path.join(tmp, "child.py")
+        with open(script, "w") as f:
+            f.write(CHILD)
+        serial = None
+        for workers in WORKERS:
+            elapsed, count, amounts = run(workers, path, amounts_path, script)
+            assert amounts == expected, (workers, [i for i, (a, b) in enumerate(zip(amounts, expected)) if a != b])
+            serial = serial or elapsed
+            print(f"{workers:>8}{elapsed:10.2f}{serial / elapsed:9.2f}x{count:7d}")
+
+
+if __name__ == "__main__":
+    main()
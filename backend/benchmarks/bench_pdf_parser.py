@@ -0,0 +1,83 @@
+"""
+Benchmark: PDF statement parsing time and peak memory, previous vs streaming parser.
+
+Generates synthetic 10/100/1000-page statements and parses each one in a fresh
+interpreter (peak RSS is per process), reporting wall time and peak RSS. The
+"previous" parser concatenates all page text into one string before scanning it;
+"streaming" is parse_bank_pdf (collects a list); "iterated" only counts the rows
+that iter_bank_pdf yields, i.e. a consumer that doesn't keep them.
+    python -m benchmarks.bench_pdf_parser
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.statements import make_statement
+
+PAGES = [int(p) for p in os.getenv("PAGES", "10,100,1000").split(",")]
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import re, resource, sys, time, warnings
+warnings.filterwarnings("ignore")
+from pypdf import PdfReader
+import pdf_parser
+
+
+def previous(file):
+    reader = PdfReader(file)
+    text = ""
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            text += page_text + "\\n"
+    expenses = []
+    for line in text.split("\\n"):
+        match = re.search(r"([A-Za-z ].+?)\\s+(\\d{1,3}(?:,\\d{3})*)$", line)
+        if match:
+            description = match.group(1).strip()
+            if "salary" in description.lower():
+                continue
+            expenses.append({"category": description, "amount": int(match.group(2).replace(",", ""))})
+    return expenses
+
+
+def iterated(file):
+    # Consume the generator without keeping rows, as a streaming consumer would
+    return [None] * sum(1 for _ in pdf_parser.iter_bank_pdf(file))
+
+
+parser = {"previous": previous, "streaming": pdf_parser.parse_bank_pdf, "iterated": iterated}[sys.argv[1]]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+with open(sys.argv[2], "rb") as f:
+    count = len(parser(f))
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, peak, baseline, count)
+"""
+
+
+def run(parser: str, path: str) -> tuple:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, parser, path], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    elapsed, peak, baseline, count = float(output[0]), int(output[1]), int(output[2]), int(output[3])
+    return elapsed, peak / 1024, (peak - baseline) / 1024, count  # ru_maxrss is in KiB on Linux
+
+
+def main():
+    print(f"{'pages':>6} {'parser':<10}{'time (s)':>10}{'peak RSS (MiB)':>16}{'over import (MiB)':>19}{'rows':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in PAGES:
+            path = os.path.join(tmp, f"statement-{pages}.pdf")
+            with open(path, "wb") as f:
+                f.write(make_statement(pages))
+            for parser in ("previous", "streaming", "iterated"):
+                elapsed, peak, growth, count = run(parser, path)
+                print(f"{pages:>6} {parser:<10}{elapsed:10.2f}{peak:16.1f}{growth:19.1f}{count:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: recurring-charge detection on one user's history.
+
+Builds ROWS transactions (default 10k and 100k) over five years: PLANTED
+recurring series (weekly/monthly/quarterly/annual, a few days of jitter, some
+with a price change part way) mixed into noise from a few thousand merchants
+with random amounts and dates. Times detect_recurring_expenses against the
+previous category+amount grouping, and fails unless every planted series is
+found with the right frequency and nothing else is reported.
+    python -m benchmarks.bench_recurring
+"""
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from recurring_detector import detect_recurring_expenses
+
+ROWS = [int(r) for r in os.getenv("ROWS", "10000,100000").split(",")]
+PLANTED = int(os.getenv("PLANTED", "40"))
+START, DAYS = date(2019, 1, 1), 5 * 365
+STEPS = {"weekly": (7, 0), "monthly": (0, 1), "quarterly": (0, 3), "annual": (0, 12)}
+RAILS = ["UPI/{}/ref{}", "POS {1} {0}", "NACH DR {0} {1}", "{0}"]
+
+
+def previous(expenses: list) -> int:
+    """The grouping detect_recurring_expenses used before: same category and amount seen twice."""
+    groups = {}
+    for exp in expenses:
+        key = f"{exp.get('category', 'Unknown').lower().strip()}_{exp.get('amount', 0)}"
+        groups[key] = groups.get(key, 0) + 1
+    return sum(1 for count in groups.values() if count > 1)
+
+
+def _shift(day: date, days: int, months: int) -> date:
+    if not months:
+        return day + timedelta(days=days)
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, min(day.day, 28))
+
+
+def history(rows: int, seed: int = 3) -> tuple:
+    rng = random.Random(seed)
+    expenses, planted = [], {}
+    for i in range(PLANTED):
+        frequency = list(STEPS)[i % len(STEPS)]
+        merchant = f"Service{i} Subscriptions"
+        amount = rng.choice([99, 149, 199, 499, 999, 4999, 12000])
+        change = rng.random() < 0.5
+        planted[merchant.lower()] = frequency
+        day, n = START + timedelta(days=rng.randint(0, 60)), 0
+        while day < START + timedelta(days=DAYS):
+            charge = amount + (rng.randint(1, 15) if change and n > 8 else 0)
+            jitter = timedelta(days=rng.randint(-2, 2) if frequency != "weekly" else rng.randint(0, 1))
+            description = rng.choice(RAILS).format(merchant, rng.randint(1000, 99999))
+            expenses.append({"category": description, "amount": charge, "date": (day + jitter).isoformat()})
+            day, n = _shift(day, *STEPS[frequency]), n + 1
+    noise = [f"Shop{i} {rng.choice(['Mart', 'Store', 'Cafe', 'Foods', 'Fuel'])}" for i in range(3000)]
+    while len(expenses) < rows:
+        expenses.append({
+            "category": rng.choice(noise),
+            "amount": rng.randint(20, 20000),
+            "date": (START + timedelta(days=rng.randint(0, DAYS))).isoformat()
+        })
+    rng.shuffle(expenses)
+    return expenses, planted
+
+
+def main():
+    print(f"{'rows':>8}{'previous (ms)':>15}{'engine (ms)':>13}{'found':>8}{'planted':>9}{'groups before':>15}")
+    for rows in ROWS:
+        expenses, planted = history(rows)
+        start = time.perf_counter()
+        before = previous(expenses)
+        previous_ms = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            result = detect_recurring_expenses(expenses)
+            timings.append(time.perf_counter() - start)
+        found = {item["merchant"]: item["frequency"] for item in result["recurring"]}
+        assert found == planted, (set(found.items()) ^ set(planted.items()))
+        print(f"{rows:>8}{previous_ms:15.1f}{min(timings) * 1000:13.1f}{len(found):>8}{len(planted):>9}{before:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: maintained recurring state vs. re-detecting from the whole history.
+
+Feeds the bench_recurring history (planted series in noise) into a SQLite store
+one monthly statement at a time with recurring_state.record, the way uploads and
+imports do, then reads it back the way GET /recurring does. Compares with running
+detect_recurring_expenses over the full history on every read, and fails unless
+the maintained state reports exactly the series the full detection finds.
+    python -m benchmarks.bench_recurring_state
+"""
+import os
+import tempfile
+import time
+
+import recurring_state
+from benchmarks.bench_recurring import ROWS, history
+from recurring_detector import detect_recurring_expenses
+from storage.sqlite import SQLiteStorage
+
+
+def statements(expenses: list) -> list:
+    """The history as monthly batches, oldest first."""
+    months = {}
+    for expense in expenses:
+        months.setdefault(expense["date"][:7], []).append(expense)
+    return [months[month] for month in sorted(months)]
+
+
+def main():
+    print(f"{'rows':>8}{'series':>8}{'state (KiB)':>13}{'update (ms)':>13}{'read (ms)':>11}{'full scan (ms)':>16}")
+    for rows in ROWS:
+        expenses, planted = history(rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStorage(os.path.join(tmp, "bench.db"))
+            store.connect()
+            updates = []
+            for batch in statements(expenses):
+                start = time.perf_counter()
+                recurring_state.record(store, "bench-user", batch)
+                updates.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            maintained = recurring_state.report(store.get_recurring("bench-user"))
+            read_ms = (time.perf_counter() - start) * 1000
+            series = len(store.get_recurring_state("bench-user")["state"]["series"])
+            size = len(store._conn().execute("SELECT data FROM recurring_state").fetchone()[0])
+            store.close()
+
+        start = time.perf_counter()
+        full = detect_recurring_expenses(expenses)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        found = {item["merchant"]: item["frequency"] for item in maintained["recurring"]}
+        assert found == planted, (set(found.items()) ^ set(planted.items()))
+        assert found == {item["merchant"]: item["frequency"] for item in full["recurring"]}
+        update_ms = sum(updates) / len(updates) * 1000
+        print(f"{rows:>8}{series:>8}{size / 1024:13.0f}{update_ms:13.1f}{read_ms:11.1f}{full_ms:16.1f}")
+
+
+if __name__ == "__main__":
+    main()
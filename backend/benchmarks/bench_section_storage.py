@@ -0,0 +1,128 @@
+"""
+Benchmark: storage and read cost of inline vs compressed analysis sections.
+
+Builds a corpus of analyses whose four result sections look like the agents'
+markdown output (tables, bullets, rupee amounts), then compares:
+- document size: inline `result` vs slim analysis + compressed sections (zlib / zstd)
+- history list read: decoding whole inline documents vs slim documents
+- /history/{id} read: decoding the inline document vs slim + decompress
+
+Sizes are BSON bytes, as stored by MongoDB before its own block compression.
+    python -m benchmarks.bench_section_storage
+"""
+import random
+import time
+
+import bson
+
+import compression
+from database import _analysis_documents
+
+ANALYSES = 2_000
+CATEGORIES = ["Rent", "Groceries", "Dining Out", "Transport", "Electricity", "Internet",
+              "Netflix", "Gym", "Insurance", "Shopping", "Medical", "Education"]
+
+
+def rupees(n: int) -> str:
+    return f"₹{n:,}"
+
+
+def expense_section(expenses: list) -> str:
+    total = sum(e["amount"] for e in expenses)
+    rows = "\n".join(
+        f"| {e['category']} | {rupees(e['amount'])} | {e['amount'] * 100 / total:.1f}% |" for e in expenses
+    )
+    return f"""## Total Spending Summary
+Your total spending this month is **{rupees(total)}**, covering {len(expenses)} categories.
+
+## Category-wise Breakdown
+| Category | Amount | Percentage |
+|---|---|---|
+{rows}
+
+## Key Insights
+- **{expenses[0]['category']}** is your largest expense at {rupees(expenses[0]['amount'])}.
+- Discretionary spending makes up a significant share of the total.
+- Fixed costs such as rent and utilities are stable month to month.
+- Consider setting category limits for dining and shopping.
+"""
+
+
+def prose(topic: str, income: int) -> str:
+    sentences = [
+        f"Based on your monthly income of {rupees(income)}, {topic.lower()} should be reviewed regularly.",
+        f"We recommend keeping at least {rupees(income * 3)} as an emergency fund.",
+        "Automate transfers on salary day so savings happen before spending.",
+        f"A SIP of {rupees(income // 10)} in a diversified index fund suits a moderate risk profile.",
+        "Review subscriptions you no longer use and cancel them.",
+        "Keep high-interest debt to a minimum and prepay where possible.",
+    ]
+    body = "\n".join(f"- {random.choice(sentences)}" for _ in range(random.randint(25, 40)))
+    return f"**{topic}**\n\n{body}\n\n**Health rating:** {random.choice(['Good', 'Needs Improvement'])}\n"
+
+
+def make_corpus() -> list:
+    corpus = []
+    for _ in range(ANALYSES):
+        income = random.randint(30_000, 250_000)
+        expenses = sorted(
+            ({"category": c, "amount": random.randint(500, 40_000)} for c in random.sample(CATEGORIES, 8)),
+            key=lambda e: -e["amount"]
+        )
+        result = {
+            "expense_analysis": expense_section(expenses),
+            "budget_plan": prose("Budget Health Assessment", income),
+            "investment_plan": prose("Investment Plan", income),
+            "fraud_alerts": prose("Fraud Review", income),
+        }
+        corpus.append((income, expenses, result))
+    return corpus
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    random.seed(7)
+    corpus = make_corpus()
+
+    inline = [bson.encode({"user_id": "u", "income": i, "profile": "moderate", "expenses": e, "result": r})
+              for i, e, r in corpus]
+    inline_bytes = sum(map(len, inline))
+    print(f"{ANALYSES:,} analyses")
+    print(f"Inline result:                     {inline_bytes / 1e6:8.2f} MB "
+          f"({inline_bytes / ANALYSES / 1024:.1f} KB/analysis)")
+
+    for codec in compression.CODECS:
+        compression.DEFAULT_CODEC = codec
+        pairs = [_analysis_documents("u", i, "moderate", e, r) for i, e, r in corpus]
+        slim = [bson.encode(doc) for doc, _ in pairs]
+        sections = [bson.encode(sec) for _, sec in pairs]
+        slim_bytes, section_bytes = sum(map(len, slim)), sum(map(len, sections))
+        total = slim_bytes + section_bytes
+        print(f"{codec:5s} slim analyses + sections:   {total / 1e6:8.2f} MB "
+              f"(analyses {slim_bytes / 1e6:.2f} MB, sections {section_bytes / 1e6:.2f} MB, "
+              f"{inline_bytes / total:.1f}x smaller, working set {inline_bytes / slim_bytes:.1f}x smaller)")
+
+        list_inline = timed(lambda: [bson.decode(d) for d in inline])
+        list_slim = timed(lambda: [bson.decode(d) for d in slim])
+
+        def read_full():
+            for doc, sec in zip(slim, sections):
+                bson.decode(doc)
+                s = bson.decode(sec)
+                compression.unpack(bytes(s["data"]), s["codec"])
+
+        full_inline = list_inline  # an inline full read is the same decode
+        full_slim = timed(read_full)
+        print(f"      history list decode: inline {list_inline * 1e6 / ANALYSES:6.1f} us/doc, "
+              f"slim {list_slim * 1e6 / ANALYSES:6.1f} us/doc")
+        print(f"      full analysis read:  inline {full_inline * 1e6 / ANALYSES:6.1f} us/doc, "
+              f"slim + decompress {full_slim * 1e6 / ANALYSES:6.1f} us/doc")
+
+
+if __name__ == "__main__":
+    main()
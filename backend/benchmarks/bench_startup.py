@@ -0,0 +1,59 @@
+"""
+Benchmark: worker startup time.
+
+Starts a fresh interpreter RUNS times and measures, for each:
+- import: `import main` (module-level work: agents, database clients, ...)
+- serving: running the app's startup (lifespan) until GET / has been answered
+
+MONGODB_URI is taken from the environment; with an unreachable server this also
+shows how long startup work that waits on MongoDB holds up the first request.
+    python -m benchmarks.bench_startup
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = int(os.getenv("RUNS", "5"))
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def serve():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            assert (await client.get("/")).status_code == 200
+            t2 = time.perf_counter()
+    return t2
+
+t2 = asyncio.run(serve())
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t0) * 1000:.1f}")
+"""
+
+
+def run_once() -> tuple:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    import_ms, serving_ms = output.strip().splitlines()[-1].split()
+    return float(import_ms), float(serving_ms)
+
+
+def main():
+    print(f"MONGODB_URI: {os.getenv('MONGODB_URI', '(unset)')}")
+    results = [run_once() for _ in range(RUNS)]
+    imports = [r[0] for r in results]
+    serving = [r[1] for r in results]
+    print(f"{RUNS} runs, median")
+    print(f"import main:            {statistics.median(imports):8.1f} ms")
+    print(f"first request served:   {statistics.median(serving):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: the whole API in-process on each storage backend, same workload.
+
+For every backend a fresh interpreter imports main with STORAGE_BACKEND set, runs
+the app lifespan and drives it through httpx's ASGI transport: USERS concurrent
+users each save ANALYSES analyses, page through /history, open one analysis, read
+trends, create and list goals and exchange CHATS chat messages. LLM agents are
+replaced by canned responses, so only the API and storage are measured.
+
+SQLite always runs (temporary file). MongoDB runs when BENCH_MONGODB_URI is set;
+it uses the `finance_bench` database and drops it afterwards.
+    python -m benchmarks.bench_storage
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH_MONGODB_URI = os.getenv("BENCH_MONGODB_URI")
+USERS = int(os.getenv("USERS", "20"))
+ANALYSES = int(os.getenv("ANALYSES", "30"))
+CHATS = int(os.getenv("CHATS", "10"))
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, os, statistics, time
+import httpx
+import main
+from auth import create_access_token
+from storage import storage
+
+USERS, ANALYSES, CHATS = %d, %d, %d
+RESULT = {
+    "expense_analysis": "Spending is concentrated in rent and food. " * 40,
+    "budget_plan": "Overall financial health rating: Good. " * 40,
+    "investment_plan": "Keep an emergency fund before investing. " * 40,
+    "fraud_alerts": "No suspicious transactions found. " * 20
+}
+EXPENSES = [{"category": c, "amount": 50 + i * 7} for i, c in enumerate(
+    ["Rent", "Food", "Transport", "Utilities", "Entertainment", "Health", "Shopping", "Other"]
+)]
+main.controller.run = lambda data, baseline=None: dict(RESULT)
+main.chat_agent.chat = lambda message, context=None: "Noted: " + message
+
+timings = {}
+
+
+async def timed(name, request):
+    start = time.perf_counter()
+    response = await request
+    timings.setdefault(name, []).append(time.perf_counter() - start)
+    assert response.status_code == 200, (name, response.status_code, response.text)
+    return response.json()
+
+
+async def user_session(client, n):
+    user_id = await asyncio.to_thread(storage.create_user, f"bench{n}@example.com", "x", True)
+    headers = {"Authorization": "Bearer " + create_access_token(user_id, f"bench{n}@example.com")}
+    for i in range(ANALYSES):
+        body = {"income": 4000 + i, "profile": "bench", "expenses": EXPENSES}
+        await timed("POST /analyze", client.post("/analyze", json=body, headers=headers))
+    cursor, first = None, None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        page = await timed("GET /history", client.get("/history", params=params, headers=headers))
+        first = first or page["history"][0]["_id"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    await timed("GET /history/{id}", client.get(f"/history/{first}", headers=headers))
+    await timed("GET /trends/categories", client.get("/trends/categories", headers=headers))
+    await timed("POST /goals", client.post("/goals", json={"name": "Trip", "target": 2000}, headers=headers))
+    await timed("GET /goals", client.get("/goals", headers=headers))
+    for i in range(CHATS):
+        await timed("POST /chat", client.post("/chat", json={"message": f"question {i}"}, headers=headers))
+    await timed("GET /chat/history", client.get("/chat/history", headers=headers))
+
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(user_session(client, n) for n in range(USERS)))
+            elapsed = time.perf_counter() - start
+        if storage.name == "mongo":
+            import database
+            database.get_client().drop_database(database.DATABASE_NAME)
+    requests = sum(len(t) for t in timings.values())
+    print(json.dumps({
+        "elapsed": elapsed,
+        "requests": requests,
+        "ops": {name: statistics.mean(t) * 1000 for name, t in timings.items()}
+    }))
+
+
+asyncio.run(run())
+"""
+
+
+def run_backend(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD % (USERS, ANALYSES, CHATS)],
+        cwd=BACKEND_DIR, env={**os.environ, **env}, capture_output=True, text=True
+    )
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr[-2000:])
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    env = {"GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "bench"), "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "bench")}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results["sqlite"] = run_backend({**env, "STORAGE_BACKEND": "sqlite", "SQLITE_PATH": os.path.join(tmp, "bench.db")})
+    if BENCH_MONGODB_URI:
+        results["mongo"] = run_backend({
+            **env, "STORAGE_BACKEND": "mongo", "MONGODB_URI": BENCH_MONGODB_URI,
+            "MONGODB_DATABASE": "finance_bench", "MONGO_TLS": os.getenv("MONGO_TLS", "false")
+        })
+    else:
+        print("(set BENCH_MONGODB_URI to include the MongoDB backend)")
+
+    backends = list(results)
+    print(f"{USERS} concurrent users, {ANALYSES} analyses and {CHATS} chat messages each")
+    print(f"{'mean latency (ms)':<24}" + "".join(f"{name:>12}" for name in backends))
+    for op in results[backends[0]]["ops"]:
+        print(f"{op:<24}" + "".join(f"{results[name]['ops'][op]:12.2f}" for name in backends))
+    print(f"{'throughput (req/s)':<24}" + "".join(
+        f"{results[name]['requests'] / results[name]['elapsed']:12.0f}" for name in backends
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: statement line tokenizer vs the previous single-regex line parser.
+
+1. Throughput on ordinary statement lines.
+2. Pathological lines of growing length: runs of spaces and of space-separated
+   digits that don't end in an amount. The previous pattern backtracks on these
+   (cubic on the space runs); the tokenizer should stay linear. Fails if the
+   tokenizer's time grows more than ~2x faster than the line length.
+3. Account details from statement headers and footers (account numbers,
+   customer IDs, phone numbers, branch codes) must not read as rows. Long bare
+   integers are never amounts; short ones are rejected by dated layouts.
+4. Fuzz: random lines over an alphabet of digits, separators, currency marks,
+   Dr/Cr, dates and spaces. Fails on any exception, a malformed row, or a line
+   that takes more than FUZZ_MAX_MS.
+    python -m benchmarks.bench_tokenizer
+"""
+import os
+import random
+import re
+import time
+
+from statement_tokenizer import StatementTokenizer, detect_layout
+from benchmarks.statements import TABLE_FOOTER_LINES, TABLE_HEADER_LINES, statement_lines
+
+PREVIOUS = re.compile(r"([A-Za-z ].+?)\s+(\d{1,3}(?:,\d{3})*)$")
+FUZZ_LINES = int(os.getenv("FUZZ_LINES", "20000"))
+FUZZ_MAX_MS = float(os.getenv("FUZZ_MAX_MS", "50"))
+PATHOLOGICAL = {
+    "space run": lambda n: "a" + " " * n + "x",
+    "digit run": lambda n: "a" + " 1" * (n // 2) + "x",
+}
+# The previous pattern is only timed up to these lengths (2000 spaces already takes ~50 s)
+PREVIOUS_MAX = {"space run": 1000, "digit run": 8000}
+FUZZ_ALPHABET = ["1", "23", "456", ",", ".", " ", "  ", "-", "/", "(", ")", "₹", "$", "Rs.", "Cr", "DR", "a", "Rent",
+                 "Mar", "12/03/2024", "2024-03-12", "0.5", "1,00,000.00", "Opening Balance", "Total", "\t"]
+
+
+def time_call(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def previous_line(line: str):
+    return PREVIOUS.search(line)
+
+
+def throughput():
+    lines = [line for page in statement_lines(50) for line in page]
+    tokenizer = StatementTokenizer()
+    previous = min(time_call(lambda: [previous_line(line) for line in lines]) for _ in range(3))
+    current = min(time_call(lambda: [tokenizer.parse_line(line) for line in lines]) for _ in range(3))
+    print(f"ordinary lines ({len(lines)}):  previous {len(lines) / previous:,.0f} lines/s   "
+          f"tokenizer {len(lines) / current:,.0f} lines/s")
+
+
+def pathological():
+    tokenizer = StatementTokenizer(detect_layout("Date Description Debit Credit Balance"))
+    print(f"\n{'line':<10}{'length':>8}{'previous (ms)':>15}{'tokenizer (ms)':>16}")
+    for name, make in PATHOLOGICAL.items():
+        timings = []
+        for length in (250, 1000, 4000, 16000, 64000):
+            line = make(length)
+            previous = time_call(previous_line, line) * 1000 if length <= PREVIOUS_MAX[name] else None
+            current = min(time_call(tokenizer.parse_line, line) for _ in range(3)) * 1000
+            timings.append((length, current))
+            shown = f"{previous:15.1f}" if previous is not None else f"{'-':>15}"
+            print(f"{name:<10}{length:>8}{shown}{current:16.2f}")
+        (short, short_ms), (long, long_ms) = timings[-2], timings[-1]
+        assert long_ms <= max(short_ms, 0.05) * (long / short) * 2, f"{name}: tokenizer time grows faster than linear"
+
+
+def not_rows():
+    details = TABLE_HEADER_LINES + TABLE_FOOTER_LINES
+    dated = detect_layout("\n".join(["Date Description Amount Balance", "01/03/2024 Rent 15000 85000.00"] + details))
+    assert dated["dated"], dated
+    tokenizer = StatementTokenizer(dated)
+    for line in details:
+        assert tokenizer.parse_line(line) is None, (line, tokenizer.parse_line(line))
+    undated = StatementTokenizer()
+    for line in TABLE_HEADER_LINES:
+        assert undated.parse_line(line) is None, (line, undated.parse_line(line))
+    assert undated.parse_line("Rent Payment 15000")["debit"] == 15000
+    print(f"\naccount details: {len(details)} lines, none read as rows")
+
+
+def fuzz():
+    rng = random.Random(1)
+    layouts = [
+        detect_layout(""),
+        detect_layout("Date Description Amount Balance"),
+        detect_layout("Date        Narration        Debit        Credit        Balance"),
+    ]
+    worst = 0.0
+    for i in range(FUZZ_LINES):
+        tokenizer = StatementTokenizer(layouts[i % len(layouts)])
+        tokenizer.balance = rng.choice([None, 1000.0])
+        line = "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(1, 60)))
+        start = time.perf_counter()
+        row = tokenizer.parse_line(line)
+        worst = max(worst, time.perf_counter() - start)
+        if row is None:
+            continue
+        assert set(row) == {"date", "description", "debit", "credit", "balance"}, (line, row)
+        assert row["debit"] is not None or row["credit"] is not None, (line, row)
+        assert any(char.isalpha() for char in row["description"]), (line, row)
+        for key in ("debit", "credit", "balance"):
+            assert row[key] is None or isinstance(row[key], (int, float)), (line, row)
+        assert row["date"] is None or re.fullmatch(r"\d{4}-\d{2}-\d{2}", row["date"]), (line, row)
+    assert worst * 1000 <= FUZZ_MAX_MS, f"slowest fuzz line took {worst * 1000:.1f} ms"
+    print(f"\nfuzz: {FUZZ_LINES} lines OK, slowest {worst * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    throughput()
+    pathological()
+    not_rows()
+    fuzz()
@@ -0,0 +1,121 @@
+"""
+Benchmark: monthly/category trends at 10k analyses per user.
+
+Compares the old approach (fetch every full analysis document and sum in Python)
+with the server-side aggregation pipeline used by database.get_trends.
+
+Seeds a throwaway database on BENCH_MONGODB_URI (default: local mongod).
+    python -m benchmarks.bench_trends
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from database import _trends_pipeline, _merge_trends, _summarize_categories
+
+BENCH_MONGODB_URI = os.getenv("BENCH_MONGODB_URI", "mongodb://localhost:27017")
+ANALYSES_PER_USER = 10_000
+MONTHS = 6
+RUNS = 5
+
+CATEGORIES = ["Rent", "Food", "Transport", "Shopping", "Bills", "Entertainment", "Health", "Other"]
+# Roughly the size of the four LLM-generated markdown sections
+SECTION_TEXT = "**Analysis** " + "lorem ipsum dolor sit amet " * 120
+
+
+def seed(collection, user_id: str):
+    """Insert ANALYSES_PER_USER analyses spread over the last MONTHS months."""
+    collection.delete_many({})
+    collection.create_index([("user_id", 1), ("created_at", -1)])
+    now = datetime.utcnow()
+    batch = []
+    for i in range(ANALYSES_PER_USER):
+        batch.append({
+            "user_id": user_id,
+            "income": random.randint(20_000, 200_000),
+            "profile": "moderate",
+            "expenses": [
+                {"category": random.choice(CATEGORIES), "amount": random.randint(100, 20_000)}
+                for _ in range(random.randint(3, 12))
+            ],
+            "result": {
+                "expense_analysis": SECTION_TEXT,
+                "budget_plan": SECTION_TEXT,
+                "investment_plan": SECTION_TEXT,
+                "fraud_alerts": SECTION_TEXT
+            },
+            "created_at": now - timedelta(minutes=random.randint(0, MONTHS * 30 * 24 * 60 - 1))
+        })
+        if len(batch) == 1000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def python_trends(collection, user_id: str, cutoff_date: datetime) -> list:
+    """The previous implementation: pull whole documents and aggregate client-side."""
+    monthly_data = {}
+    for doc in collection.find({"user_id": user_id, "created_at": {"$gte": cutoff_date}}).sort("created_at", 1):
+        month_key = doc["created_at"].strftime("%Y-%m")
+        month = monthly_data.setdefault(month_key, {
+            "month": month_key, "total_income": 0, "total_expenses": 0,
+            "analyses_count": 0, "categories": {}
+        })
+        month["total_income"] += doc.get("income", 0)
+        month["analyses_count"] += 1
+        for exp in doc.get("expenses", []):
+            cat = exp.get("category", "Other")
+            amt = exp.get("amount", 0)
+            month["total_expenses"] += amt
+            month["categories"][cat] = month["categories"].get(cat, 0) + amt
+    return list(monthly_data.values())
+
+
+def pipeline_trends(collection, user_id: str, cutoff_date: datetime) -> dict:
+    """The aggregation pipeline used by database.get_trends."""
+    facets = next(collection.aggregate(_trends_pipeline(user_id, cutoff_date)), {})
+    monthly = _merge_trends(facets)
+    return {"categories": _summarize_categories(monthly), "monthly_breakdown": monthly}
+
+
+def best_of(fn, *args) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    client = MongoClient(BENCH_MONGODB_URI)
+    collection = client["finance_bench"]["analyses"]
+    user_id = "bench-user"
+
+    print(f"Seeding {ANALYSES_PER_USER:,} analyses...")
+    seed(collection, user_id)
+    cutoff_date = datetime.utcnow() - timedelta(days=MONTHS * 30)
+
+    # Both endpoints used to run the Python loop once each
+    old = best_of(lambda: (python_trends(collection, user_id, cutoff_date),
+                           python_trends(collection, user_id, cutoff_date)))
+    new = best_of(pipeline_trends, collection, user_id, cutoff_date)
+
+    expected = sorted(python_trends(collection, user_id, cutoff_date), key=lambda m: m["month"])
+    actual = pipeline_trends(collection, user_id, cutoff_date)["monthly_breakdown"]
+    assert [(m["month"], m["total_income"], m["total_expenses"]) for m in expected] == \
+           [(m["month"], m["total_income"], m["total_expenses"]) for m in actual]
+
+    print(f"Python loop (monthly + categories): {old * 1000:8.1f} ms")
+    print(f"Aggregation pipeline (one query):   {new * 1000:8.1f} ms")
+    print(f"Speedup: {old / new:.1f}x")
+
+    client.drop_database("finance_bench")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Synthetic bank statement PDFs for the parser benchmarks.
+
+Writes a plain PDF by hand (one content stream per page), so no PDF-authoring
+package is needed:
+- make_statement: Helvetica "Description Amount" lines
+- make_table_statement: a Courier table with Date / Description / Debit /
+  Credit / Balance columns, amounts right-aligned, as most banks lay them out
+  (or Date / Description / Amount / Balance, where only the balance tells a
+  debit from a credit)
+"""
+import random
+
+DESCRIPTIONS = [
+    "Rent Payment", "Grocery Store", "Electricity Bill", "Mobile Recharge", "Restaurant",
+    "Fuel Station", "Online Shopping", "Gym Membership", "Insurance Premium", "Salary Credit",
+    "Water Bill", "Movie Tickets", "Pharmacy", "Internet Bill", "Taxi Ride"
+]
+COURIER_WIDTH = 0.6  # every Courier glyph is 0.6 em wide
+# Account details above and below the table: numbers, but not transactions
+TABLE_HEADER_LINES = ["Account Number 50100123456789", "Customer ID: 88812345"]
+TABLE_FOOTER_LINES = ["Phone 1800 266 4332", "IFSC HDFC0001234 Branch code 1234"]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf(page_streams: list, font: bytes) -> bytes:
+    """A PDF with one page per content stream, all using `font` as /F1."""
+    objects = []  # object bodies; object number = index + 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font_ref = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s >>" % font)
+    pages_ref = add(b"")  # filled in below
+    kids = []
+    for stream in page_streams:
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_ref, font_ref, content)
+        ))
+    objects[pages_ref - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_ref)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def statement_lines(pages: int, lines_per_page: int = 40, seed: int = 7) -> list:
+    """The text lines of each page: a header, then "Description Amount" rows."""
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        lines = [f"Account Statement - page {page + 1}", "Date Description Amount"]
+        for _ in range(lines_per_page):
+            amount = rng.randint(50, 250000)
+            lines.append(f"{rng.choice(DESCRIPTIONS)} {amount:,}")
+        result.append(lines)
+    return result
+
+
+def make_statement(pages: int, lines_per_page: int = 40, seed: int = 7) -> bytes:
+    """A `pages`-page statement PDF as bytes."""
+    streams = []
+    for lines in statement_lines(pages, lines_per_page, seed):
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        streams.append("\n".join(ops).encode("latin-1"))
+    return _pdf(streams, b"Helvetica")
+
+
+def table_rows(pages: int, rows_per_page: int = 40, seed: int = 7, opening_balance: float = 250000.0) -> list:
+    """The transactions of each page of make_table_statement, as the tokenizer should read them."""
+    rng = random.Random(seed)
+    balance = opening_balance
+    result = []
+    for page in range(pages):
+        rows = []
+        for _ in range(rows_per_page):
+            description = rng.choice(DESCRIPTIONS)
+            amount = round(rng.randint(50, 90000) + rng.randint(0, 99) / 100, 2)
+            credit = description == "Salary Credit" or rng.random() < 0.1
+            balance = round(balance + amount if credit else balance - amount, 2)
+            rows.append({
+                "date": f"2024-03-{rng.randint(1, 28):02d}",
+                "description": description,
+                "debit": None if credit else amount,
+                "credit": amount if credit else None,
+                "balance": balance
+            })
+        result.append(rows)
+    return result
+
+
+def make_table_statement(pages: int, rows_per_page: int = 40, seed: int = 7, single_amount: bool = False) -> bytes:
+    """
+    A `pages`-page statement laid out as a Date/Description/Debit/Credit/Balance
+    table, or with `single_amount` a Date/Description/Amount/Balance one, between
+    account details (TABLE_HEADER_LINES, TABLE_FOOTER_LINES) that aren't rows.
+    """
+    size = 8
+    streams = []
+    for rows in table_rows(pages, rows_per_page, seed):
+        ops = ["BT", f"/F1 {size} Tf"]
+
+        def put(x: float, y: float, text: str, right: bool = False):
+            if right:
+                x -= len(text) * size * COURIER_WIDTH
+            ops.append(f"1 0 0 1 {x:.1f} {y} Tm ({_escape(text)}) Tj")
+
+        for i, line in enumerate(TABLE_HEADER_LINES):
+            put(40, 822 - 11 * i, line)
+        y = 800
+        put(40, y, "Date")
+        put(110, y, "Description")
+        if single_amount:
+            put(430, y, "Amount", right=True)
+        else:
+            put(390, y, "Debit", right=True)
+            put(470, y, "Credit", right=True)
+        put(555, y, "Balance", right=True)
+        for row in rows:
+            y -= 11
+            year, month, day = row["date"].split("-")
+            if single_amount:
+                # One text run: plain extraction, which this layout uses, joins separately placed cells
+                put(40, y, f"{day}/{month}/{year}  {row['description']}")
+            else:
+                put(40, y, f"{day}/{month}/{year}")
+                put(110, y, row["description"])
+            if single_amount:
+                put(430, y, f"{row['debit'] or row['credit']:,.2f}", right=True)
+            elif row["debit"] is not None:
+                put(390, y, f"{row['debit']:,.2f}", right=True)
+            else:
+                put(470, y, f"{row['credit']:,.2f}", right=True)
+            put(555, y, f"{row['balance']:,.2f}", right=True)
+        for line in TABLE_FOOTER_LINES:
+            y -= 22
+            put(40, y, line)
+        ops.append("ET")
+        streams.append("\n".join(ops).encode("latin-1"))
+    return _pdf(streams, b"Courier")
@@ -0,0 +1,196 @@
+"""
+Spending categories for statement descriptions, without an LLM.
+
+Rules are keyword phrases per category ("Food & Dining": "swiggy", "zomato",
+...). Their words go into an inverted index (word -> rules), so a description
+only looks at the rules sharing a word with it, however many rules there are. A
+rule matches when all of its words are in the description, plus the canonical
+merchant name from merchant_classifier ("NFLX*DIGITAL" -> "netflix"). The rule
+with the most words wins ("amazon prime" over "amazon"), then the one matching
+earliest. Results are memoized per normalized description.
+
+Corrections a user makes are saved as overrides for the description's merchant
+key (see merchant_classifier.merchant_key) and apply to all of that merchant's
+rows in their later uploads. Descriptions nothing matches are "Other"; with
+CATEGORY_LLM_FALLBACK=true, those are sent to Gemini in one batch per upload
+(at most CATEGORY_LLM_BATCH of them) and the answers are remembered.
+
+Extra rules can be supplied in a JSON file named by CATEGORY_RULES_FILE:
+    {"Groceries": ["nilgiris"], "Pets": ["petsy", "heads up for tails"]}
+which are merged into the defaults.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+from merchant_classifier import merchant_classifier, normalize
+
+CATEGORY_RULES_FILE = os.getenv("CATEGORY_RULES_FILE")
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "65536"))
+CATEGORY_LLM_FALLBACK = os.getenv("CATEGORY_LLM_FALLBACK", "false").lower() == "true"
+CATEGORY_LLM_BATCH = int(os.getenv("CATEGORY_LLM_BATCH", "200"))
+UNCATEGORIZED = "Other"
+
+# category -> keyword phrases
+DEFAULT_RULES = {
+    "Food & Dining": [
+        "swiggy", "zomato", "restaurant", "cafe", "coffee", "starbucks", "dominos", "pizza", "mcdonalds",
+        "kfc", "burger", "bakery", "food", "dining", "eats", "dunzo", "chaayos", "haldiram"
+    ],
+    "Groceries": [
+        "bigbasket", "blinkit", "zepto", "instamart", "dmart", "grocery", "groceries", "supermarket",
+        "reliance fresh", "reliance smart", "more retail", "spencers", "kirana", "natures basket", "jiomart"
+    ],
+    "Transport": [
+        "uber", "ola", "rapido", "metro", "irctc", "railway", "fuel", "petrol", "diesel", "indian oil",
+        "iocl", "hpcl", "bpcl", "shell", "parking", "fastag", "toll", "taxi", "cab", "redbus"
+    ],
+    "Shopping": [
+        "amazon", "flipkart", "myntra", "ajio", "nykaa", "meesho", "tata cliq", "decathlon", "ikea",
+        "croma", "reliance digital", "lifestyle", "shoppers stop", "mall"
+    ],
+    "Utilities": [
+        "electricity", "water", "gas", "power", "broadband", "internet", "jio", "airtel", "vodafone",
+        "bsnl", "recharge", "dth", "tata play", "indane", "bharat gas"
+    ],
+    "Rent & Housing": ["rent", "landlord", "society", "maintenance", "housing", "nobroker", "mortgage"],
+    "Entertainment": [
+        "netflix", "spotify", "hotstar", "amazon prime", "prime video", "youtube", "bookmyshow", "pvr",
+        "inox", "cinema", "movie", "gaming", "steam", "playstation", "xbox"
+    ],
+    "Health": [
+        "pharmacy", "apollo", "medplus", "hospital", "clinic", "1mg", "pharmeasy", "netmeds", "doctor",
+        "diagnostics", "lab", "dental", "chemist"
+    ],
+    "Insurance": ["insurance", "lic", "policy", "premium", "policybazaar"],
+    "Education": ["school", "college", "university", "tuition", "course", "udemy", "coursera", "byjus", "fees"],
+    "Travel": [
+        "makemytrip", "goibibo", "cleartrip", "yatra", "airlines", "airways", "indigo", "air india",
+        "vistara", "akasa", "hotel", "airbnb", "oyo", "booking com"
+    ],
+    "Fitness": ["gym", "fitness", "cult fit", "cultfit", "yoga"],
+    "Loans & EMI": ["emi", "loan", "home loan", "car loan", "bajaj finance", "credit card"],
+    "Cash": ["atm", "cash withdrawal", "cash wdl"],
+    "Investments": ["mutual fund", "sip", "zerodha", "groww", "upstox", "nps", "ppf"],
+}
+LLM_REPLY = re.compile(r"\{.*\}", re.DOTALL)
+
+
+class Categorizer:
+    """Keyword rules behind a word -> rule index: description -> category (None if no rule matches)."""
+
+    def __init__(self, rules: dict, cache_size: int = CATEGORY_CACHE_SIZE):
+        self.categories = list(rules) + [UNCATEGORIZED]
+        self._names = {category.lower(): category for category in self.categories}
+        self._rules = []  # (category, words)
+        self._index = {}  # word -> rule ids
+        for category, phrases in rules.items():
+            for phrase in phrases:
+                words = tuple(dict.fromkeys(normalize(phrase).split()))
+                if not words:
+                    continue
+                for word in words:
+                    self._index.setdefault(word, []).append(len(self._rules))
+                self._rules.append((category, words))
+        self.version = hashlib.sha256(json.dumps(self._rules).encode()).hexdigest()[:12]
+        self._match = lru_cache(maxsize=cache_size)(self._scan)
+        self._learned = {}  # normalized description -> category the LLM gave it
+        self.llm_calls = 0
+
+    def _scan(self, text: str) -> Optional[str]:
+        """Category of the best rule for a normalized description."""
+        merchant = merchant_classifier.classify(text)[0]
+        words = text.split() + (merchant.split() if merchant else [])
+        present = set(words)
+        best, best_rank = None, None
+        for position, word in enumerate(words):
+            for rule in self._index.get(word, ()):
+                category, rule_words = self._rules[rule]
+                if len(rule_words) > 1 and not present.issuperset(rule_words):
+                    continue
+                rank = (len(rule_words), -position)
+                if best_rank is None or rank > best_rank:
+                    best, best_rank = category, rank
+        return best
+
+    def _lookup(self, description: str, overrides: Optional[dict]) -> Optional[str]:
+        if overrides:
+            category = overrides.get(merchant_classifier.merchant_key(description))
+            if category:
+                return category
+        text = normalize(description)
+        return self._match(text) or self._learned.get(text)
+
+    def known(self, category: str) -> Optional[str]:
+        """The category named `category`, ignoring case and surrounding spaces, or None."""
+        return self._names.get(category.strip().lower())
+
+    def categorize(self, description: str, overrides: dict = None) -> str:
+        """The user's override for the merchant, else the best rule, else "Other"."""
+        return self._lookup(description, overrides) or UNCATEGORIZED
+
+    def categorize_all(self, descriptions: list, overrides: dict = None, llm: bool = False) -> list:
+        """categorize() for each description; with `llm`, what no rule matches goes to Gemini in one batch."""
+        categories = [self._lookup(description, overrides) for description in descriptions]
+        if llm:
+            unknown = list(dict.fromkeys(
+                normalize(description) for description, category in zip(descriptions, categories) if category is None
+            ))[:CATEGORY_LLM_BATCH]
+            if unknown:
+                self._ask_llm(unknown)
+                categories = [
+                    category or self._learned.get(normalize(description))
+                    for description, category in zip(descriptions, categories)
+                ]
+        return [category or UNCATEGORIZED for category in categories]
+
+    def _ask_llm(self, texts: list):
+        """Ask Gemini for the categories of `texts` (normalized descriptions) and remember its answers."""
+        from gemini_llm import gemini  # needs GEMINI_API_KEY, so only imported when the fallback is used
+
+        self.llm_calls += 1
+        listing = "\n".join(f"{i}. {text}" for i, text in enumerate(texts))
+        reply = gemini(
+            "Categorize these bank statement descriptions. Use only these categories: "
+            f"{', '.join(self.categories)}.\n{listing}\n"
+            'Reply with only a JSON object mapping each number to its category, like {"0": "Groceries"}.'
+        )
+        try:
+            answers = json.loads(LLM_REPLY.search(reply).group())
+        except (AttributeError, ValueError) as e:
+            print(f"⚠️ Could not read categories from Gemini: {e}")
+            return
+        if not isinstance(answers, dict):
+            print("⚠️ Could not read categories from Gemini: not a JSON object")
+            return
+        if len(self._learned) > CATEGORY_CACHE_SIZE:
+            self._learned.clear()
+        # Anything it didn't answer (or answered with an unknown category) stays "Other" without asking again
+        for i, text in enumerate(texts):
+            category = answers.get(str(i))
+            self._learned[text] = category if category in self.categories else UNCATEGORIZED
+
+    def stats(self) -> dict:
+        info = self._match.cache_info()
+        return {
+            "rules": len(self._rules), "hits": info.hits, "misses": info.misses, "size": info.currsize,
+            "llm_calls": self.llm_calls, "learned": len(self._learned)
+        }
+
+
+def _load_rules() -> dict:
+    rules = {category: list(phrases) for category, phrases in DEFAULT_RULES.items()}
+    if CATEGORY_RULES_FILE:
+        try:
+            with open(CATEGORY_RULES_FILE) as f:
+                for category, phrases in json.load(f).items():
+                    rules.setdefault(category, []).extend(phrases)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Could not load category rules from {CATEGORY_RULES_FILE}: {e}")
+    return rules
+
+
+categorizer = Categorizer(_load_rules())
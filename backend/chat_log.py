@@ -0,0 +1,162 @@
+"""
+Write-behind writer for chat messages.
+
+Chat history is a non-critical log, so instead of one acknowledged insert_one per
+message we buffer messages in memory and flush them with a single ordered
+insert_many when the buffer reaches a size threshold or a time interval passes.
+
+- Ordering: documents get their _id and created_at when they are appended, and
+  batches are inserted in order, so a user message always sorts before its reply.
+- Read-your-writes: pending() exposes buffered (and in-flight) messages so readers
+  can merge them into what they get back from the database.
+- Durability: close() flushes whatever is left; it runs on app shutdown and at exit.
+  Buffers are per process, so read-your-writes holds within one worker.
+- Outages: a failed write is retried after a delay that doubles up to max_backoff,
+  and at most max_pending messages are kept meanwhile; past that the oldest are
+  dropped (and reported), so a long database outage can't exhaust memory.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+
+def parse_write_concern(value: str) -> WriteConcern:
+    """Parse "0", "1", "majority", ... into a WriteConcern."""
+    value = (value or "1").strip()
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class ChatLogWriter:
+    def __init__(self, collection, batch_size: int = 50, flush_interval: float = 1.0,
+                 write_concern: WriteConcern = None, max_pending: int = 10000, max_backoff: float = 30.0):
+        self._collection = collection
+        self.write_concern = write_concern or WriteConcern(w=1)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._backoff = 0.0  # current retry delay after failed writes, 0 when healthy
+        self._retry_at = 0.0
+        self.dropped = 0
+        self._unreported = 0  # dropped since the last log line
+
+        self._pending = []
+        self._in_flight = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one batch at a time keeps inserts in order
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        atexit.register(self.close)
+
+    def start(self):
+        """Start the background flush thread (idempotent)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+            self._thread.start()
+
+    def append(self, user_id: str, role: str, content: str) -> str:
+        """Buffer a chat message and return its ID."""
+        now = datetime.utcnow()
+        document = {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "role": role,  # "user" or "assistant"
+            "content": content,
+            # MongoDB stores milliseconds; truncate so buffered and stored copies compare equal
+            "created_at": now.replace(microsecond=now.microsecond // 1000 * 1000)
+        }
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            self._pending.append(document)
+            self._trim()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return str(document["_id"])
+
+    def pending(self, user_id: str) -> list:
+        """Copies of this user's messages that may not be in the database yet."""
+        with self._lock:
+            return [dict(doc) for doc in self._in_flight + self._pending if doc["user_id"] == user_id]
+
+    def discard(self, user_id: str):
+        """Drop a user's buffered messages (used when their history is cleared)."""
+        with self._flush_lock, self._lock:
+            self._pending = [doc for doc in self._pending if doc["user_id"] != user_id]
+
+    def flush(self) -> int:
+        """Write all buffered messages now. Returns the number inserted."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+            if not batch:
+                return 0
+
+            inserted = 0
+            try:
+                collection = self._collection.with_options(write_concern=self.write_concern)
+                collection.insert_many(batch, ordered=True)
+                inserted = len(batch)
+            except BulkWriteError as e:
+                # Ordered insert stops at the first error. Drop that message (a duplicate
+                # _id means it already made it in) and retry everything after it.
+                inserted = e.details.get("nInserted", 0)
+                failed = e.details["writeErrors"][0]
+                self._requeue(batch[inserted + 1:])
+                self._backoff = 0.0  # the database is answering
+                print(f"⚠️ Chat log flush skipped a message: {failed.get('errmsg')}")
+            except Exception as e:
+                self._requeue(batch)
+                self._backoff = min(max(self._backoff * 2, self.flush_interval), self.max_backoff)
+                self._retry_at = time.monotonic() + self._backoff
+                print(f"⚠️ Chat log flush failed, retrying in {self._backoff:.1f}s: {e}")
+            else:
+                self._backoff = 0.0
+            finally:
+                with self._lock:
+                    self._in_flight = []
+                    unreported, self._unreported = self._unreported, 0
+            if unreported:
+                print(f"⚠️ Chat log buffer full ({self.max_pending} messages): dropped the {unreported} oldest")
+            return inserted
+
+    def close(self):
+        """Stop the flush thread and write out anything still buffered."""
+        self._stopped.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+    def _requeue(self, documents: list):
+        with self._lock:
+            self._pending = documents + self._pending
+            self._trim()
+
+    def _trim(self):
+        """Drop the oldest buffered messages past max_pending. Call with the lock held."""
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+            self._unreported += excess
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if time.monotonic() < self._retry_at:
+                continue  # backing off after a failed write
+            self.flush()
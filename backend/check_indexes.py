@@ -0,0 +1,32 @@
+"""
+Script to create and verify the MongoDB indexes, then check that the hot
+per-user queries are served by an index (no COLLSCAN or in-memory SORT).
+"""
+import sys
+
+from database import ensure_indexes, verify_indexes, explain_hot_queries
+
+
+def check_indexes() -> bool:
+    """Bootstrap indexes and explain the hot queries. Returns True if all are covered."""
+    print("🔧 Ensuring indexes...")
+    for name in ensure_indexes():
+        print(f"   - {name}")
+
+    ok = True
+    problems = verify_indexes()
+    for problem in problems:
+        print(f"❌ {problem}")
+        ok = False
+
+    print("🔍 Explaining hot queries...")
+    for name, info in explain_hot_queries().items():
+        marker = "✅" if info["uses_index"] else "❌"
+        print(f"   {marker} {name}: {' -> '.join(info['stages'])}")
+        ok = ok and info["uses_index"]
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_indexes() else 1)
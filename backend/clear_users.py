@@ -2,7 +2,11 @@
 Script to clear all user data from the database.
 Run this script to reset all users and start fresh.
 """
-from database import users_collection, analyses_collection, goals_collection, chat_history_collection
+from database import (
+    users_collection, analyses_collection, sections_collection, rollups_collection,
+    goals_collection, chat_history_collection, transactions_collection, recurring_collection,
+    category_overrides_collection
+)
 
 def clear_all_user_data():
     """Clear all user-related data from the database."""
@@ -15,6 +19,8 @@ def clear_all_user_data():
     # Delete all analyses
     analyses_result = analyses_collection.delete_many({})
     print(f"   - Deleted {analyses_result.deleted_count} analyses")
+    sections_collection.delete_many({})
+    rollups_collection.delete_many({})
     
     # Delete all goals
     goals_result = goals_collection.delete_many({})
@@ -24,6 +30,12 @@ def clear_all_user_data():
     chat_result = chat_history_collection.delete_many({})
     print(f"   - Deleted {chat_result.deleted_count} chat messages")
     
+    # Delete imported transactions and the recurring series built from them
+    transactions_result = transactions_collection.delete_many({})
+    print(f"   - Deleted {transactions_result.deleted_count} transactions")
+    recurring_collection.delete_many({})
+    category_overrides_collection.delete_many({})
+    
     print("✅ All user data cleared successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+"""
+Compression helpers for large stored blobs (LLM result sections, archives).
+
+Uses zstd when the `zstandard` package is installed and zlib otherwise. The codec
+name is stored next to every blob so either can always be read back.
+"""
+import os
+import zlib
+
+import bson
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("zstd", "zlib") if zstandard else ("zlib",)
+DEFAULT_CODEC = os.getenv("COMPRESSION_CODEC", CODECS[0])
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "10"))
+ZLIB_LEVEL = int(os.getenv("ZLIB_LEVEL", "6"))
+
+
+def compress(data: bytes, codec: str = None) -> bytes:
+    codec = codec or DEFAULT_CODEC
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd codec requested but the zstandard package is not installed")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, ZLIB_LEVEL)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed data but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def pack(obj, codec: str = None) -> tuple:
+    """
+    BSON-encode and compress `obj` (datetimes and ObjectIds round-trip exactly).
+    Returns (codec, compressed bytes, raw size).
+    """
+    codec = codec or DEFAULT_CODEC
+    raw = bson.encode({"value": obj})
+    return codec, compress(raw, codec), len(raw)
+
+
+def unpack(data: bytes, codec: str):
+    return bson.decode(decompress(data, codec))["value"]
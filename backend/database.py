@@ -1,39 +1,240 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
 import os
+import threading
 from datetime import datetime
 from typing import Optional
 
+from chat_log import ChatLogWriter, parse_write_concern
+from compression import pack, unpack
+from user_cache import user_cache
+
 load_dotenv()
 
-# MongoDB connection with SSL fix for Render
 MONGODB_URI = os.getenv("MONGODB_URI")
+DATABASE_NAME = os.getenv("MONGODB_DATABASE", "finance_db")
 
-try:
-    import certifi
-    client = MongoClient(
-        MONGODB_URI,
-        server_api=ServerApi('1'),
-        tls=True,
-        tlsCAFile=certifi.where()
-    )
-except:
-    # Fallback: allow invalid certificates (for platforms with SSL issues)
-    client = MongoClient(
-        MONGODB_URI,
-        server_api=ServerApi('1'),
-        tls=True,
-        tlsAllowInvalidCertificates=True
-    )
 
-db = client["finance_db"]
+# ===== CONNECTION =====
+# The client is created on first use (or in the FastAPI lifespan), not at import,
+# so importing this module does no TLS, DNS or server-selection work.
+
+def _client_options() -> dict:
+    """MongoClient/Motor options, tunable through the environment."""
+    options = {
+        "server_api": ServerApi('1'),
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None,
+        "compressors": os.getenv("MONGO_COMPRESSORS", "zstd,zlib"),
+    }
+    if os.getenv("MONGO_TLS", "true").lower() == "true":
+        options["tls"] = True
+        try:
+            import certifi
+            options["tlsCAFile"] = certifi.where()
+        except ImportError:
+            # Fallback: allow invalid certificates (for platforms with SSL issues)
+            print("⚠️ certifi not installed; MongoDB TLS certificates will not be verified")
+            options["tlsAllowInvalidCertificates"] = True
+    return options
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    """Return the shared MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGODB_URI, **_client_options())
+    return _client
+
+
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+def close_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+class _Lazy:
+    """Stands in for a database or collection and resolves it on first use."""
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return _Lazy(lambda: self._resolve()[name])
+
+
+db = _Lazy(get_db)
 
 # Collections
 analyses_collection = db["analyses"]
 users_collection = db["users"]
 goals_collection = db["savings_goals"]
 chat_history_collection = db["chat_history"]
+rollups_collection = db["monthly_rollups"]
+sections_collection = db["analysis_sections"]  # compressed LLM result text, _id = analysis _id
+archives_collection = db["archives"]  # compressed per-user, per-month bundle parts (see retention.py)
+outbox_collection = db["email_outbox"]  # queued emails (see email_service.py)
+parsed_statements_collection = db["parsed_statements"]  # PDF parse cache (see statement_cache.py)
+transactions_collection = db["transactions"]  # normalized per-user transactions (see transactions.py)
+recurring_collection = db["recurring_series"]  # _id = user_id (see recurring_state.py)
+category_overrides_collection = db["category_overrides"]  # user corrections (see categorizer.py)
+
+PARSE_CACHE_TTL_DAYS = int(os.getenv("PARSE_CACHE_TTL_DAYS", "30"))
+
+# Chat messages are written behind in batches (see chat_log.py)
+chat_log_writer = ChatLogWriter(
+    chat_history_collection,
+    batch_size=int(os.getenv("CHAT_LOG_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "1.0")),
+    write_concern=parse_write_concern(os.getenv("CHAT_LOG_WRITE_CONCERN", "1")),
+    max_pending=int(os.getenv("CHAT_LOG_MAX_PENDING", "10000")),
+    max_backoff=float(os.getenv("CHAT_LOG_MAX_BACKOFF", "30"))
+)
+
+
+# ===== INDEXES =====
+
+# (collection, keys, options) for every index the queries below rely on
+INDEX_SPECS = [
+    (users_collection, [("email", ASCENDING)], {"unique": True}),
+    # Databases from before this index was unique need migrate_google_ids.py first
+    (users_collection, [("google_id", ASCENDING)], {"unique": True, "sparse": True}),
+    (analyses_collection, [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    (goals_collection, [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    (chat_history_collection, [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+    (rollups_collection, [("user_id", ASCENDING), ("month", ASCENDING)], {"unique": True}),
+    (archives_collection, [("user_id", ASCENDING), ("kind", ASCENDING), ("month", ASCENDING), ("part", ASCENDING)], {
+        "unique": True
+    }),
+    (outbox_collection, [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+    (parsed_statements_collection, [("created_at", ASCENDING)], {"expireAfterSeconds": PARSE_CACHE_TTL_DAYS * 86400}),
+    (transactions_collection, [("user_id", ASCENDING), ("date", ASCENDING)], {}),
+    (transactions_collection, [("user_id", ASCENDING), ("category", ASCENDING), ("date", ASCENDING)], {}),
+    (transactions_collection, [("user_id", ASCENDING), ("fingerprint", ASCENDING)], {
+        "unique": True, "partialFilterExpression": {"fingerprint": {"$type": "string"}}
+    }),
+    (category_overrides_collection, [("user_id", ASCENDING), ("merchant", ASCENDING)], {"unique": True}),
+]
+
+# Indexes made redundant by a wider one in INDEX_SPECS (dropped by ensure_indexes)
+RETIRED_INDEXES = [
+    (analyses_collection, "user_id_1_created_at_-1"),
+    (chat_history_collection, "user_id_1_created_at_-1"),
+    (archives_collection, "user_id_1_kind_1_month_1"),  # one bundle per month, before parts
+]
+
+
+def ensure_indexes() -> list:
+    """
+    Create all indexes (no-op for ones that already exist) and return their names.
+    An index the data doesn't allow (e.g. duplicates under a unique one) is reported
+    and skipped, and verify_indexes() lists it as missing.
+    """
+    names = []
+    for collection, keys, options in INDEX_SPECS:
+        try:
+            names.append(collection.create_index(keys, **options))
+        except OperationFailure as e:
+            print(f"❌ Could not create index on {collection.name} {keys}: {e}")
+
+    for collection, name in RETIRED_INDEXES:
+        if name in collection.index_information():
+            collection.drop_index(name)
+    return names
+
+
+def verify_indexes() -> list:
+    """Return a list of problems with the indexes in INDEX_SPECS (empty if all are present)."""
+    problems = []
+    for collection, keys, options in INDEX_SPECS:
+        existing = {
+            tuple(info["key"]): info
+            for info in collection.index_information().values()
+        }
+        info = existing.get(tuple(keys))
+        if info is None:
+            problems.append(f"{collection.name}: missing index on {keys}")
+            continue
+        for option, value in options.items():
+            if info.get(option, False) != value:
+                problems.append(f"{collection.name}: index on {keys} is not {option}={value}")
+    return problems
+
+
+def _winning_stages(plan: dict) -> list:
+    """Flatten the stage names of a winning query plan."""
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += _winning_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += _winning_stages(child)
+    return stages
+
+
+def explain_hot_queries(user_id: str = "index-check", email: str = "index-check@example.com") -> dict:
+    """
+    Run explain() on the hot per-user queries and report whether each uses an index.
+
+    Returns { query_name: { "stages": [...], "uses_index": bool } }
+    A query that needs a COLLSCAN or an in-memory SORT is reported as not index-covered.
+    """
+    queries = {
+        "users_by_email": users_collection.find({"email": email}),
+        "users_by_google_id": users_collection.find({"google_id": "index-check"}),
+        "analyses_history": analyses_collection.find(
+            {"user_id": user_id}, SUMMARY_PROJECTION
+        ).sort(KEYSET_SORT).limit(10),
+        "analyses_trends": analyses_collection.find(
+            {"user_id": user_id, "created_at": {"$gte": datetime(1970, 1, 1)}}
+        ).sort("created_at", 1),
+        "rollups_trends": rollups_collection.find(
+            {"user_id": user_id, "month": {"$gte": "1970-01"}}
+        ).sort("month", 1).limit(6),
+        "goals_list": goals_collection.find({"user_id": user_id}).sort("created_at", -1),
+        "chat_history": chat_history_collection.find({"user_id": user_id}).sort(KEYSET_SORT).limit(50),
+        "transactions_range": transactions_collection.find(
+            _transaction_range(user_id, datetime(2024, 1, 1), datetime(2024, 4, 1))
+        ).sort("date", ASCENDING),
+        "transactions_category_range": transactions_collection.find(
+            _transaction_range(user_id, datetime(2024, 1, 1), datetime(2024, 4, 1), "Groceries")
+        ).sort("date", ASCENDING),
+    }
+
+    report = {}
+    for name, cursor in queries.items():
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = _winning_stages(plan)
+        report[name] = {
+            "stages": stages,
+            "uses_index": (
+                any("IXSCAN" in stage for stage in stages)
+                and "COLLSCAN" not in stages
+                and "SORT" not in stages
+            )
+        }
+    return report
 
 
 # ===== USER AUTHENTICATION =====
@@ -44,7 +245,6 @@ def create_user(email: str, password_hash: str, is_verified: bool = False) -> st
         "email": email.lower(),
         "password_hash": password_hash,
         "is_verified": is_verified,
-        "google_id": None,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
@@ -75,12 +275,27 @@ def get_user_by_id(user_id: str) -> Optional[dict]:
 def verify_user_email(email: str) -> bool:
     """Mark a user's email as verified."""
     print(f"🔍 Verifying email: {email.lower()}")
-    result = users_collection.update_one(
+    doc = users_collection.find_one_and_update(
         {"email": email.lower()},
-        {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}}
+        {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}},
+        projection={"_id": 1}
+    )
+    print(f"   Matched: {doc is not None}")
+    # A match counts as success even if the user was already verified
+    if doc is None:
+        return False
+    user_cache.invalidate(str(doc["_id"]))
+    return True
+
+
+def update_password_hash(user_id: str, password_hash: str) -> bool:
+    """Replace a user's password hash (e.g. after a bcrypt cost change)."""
+    from bson.objectid import ObjectId
+    result = users_collection.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"password_hash": password_hash, "updated_at": datetime.utcnow()}}
     )
-    print(f"   Matched: {result.matched_count}, Modified: {result.modified_count}")
-    # Use matched_count instead of modified_count so it works even if already verified
+    # Cached user records never contain password_hash, so there is nothing to invalidate
     return result.matched_count > 0
 
 
@@ -103,6 +318,7 @@ def create_or_update_google_user(google_id: str, email: str, name: str = "", pic
         )
         existing["name"] = name
         existing["picture"] = picture
+        user_cache.invalidate(existing["_id"])
         return existing
     
     # Check if email already exists (user signed up with email first)
@@ -121,6 +337,7 @@ def create_or_update_google_user(google_id: str, email: str, name: str = "", pic
         )
         email_user["google_id"] = google_id
         email_user["is_verified"] = True
+        user_cache.invalidate(email_user["_id"])
         return email_user
     
     # Create new user
@@ -139,30 +356,232 @@ def create_or_update_google_user(google_id: str, email: str, name: str = "", pic
     return document
 
 
+def unset_legacy_google_ids() -> int:
+    """
+    Remove the google_id: None placeholders email signups used to write. A sparse
+    index still indexes explicit nulls, so they block the unique google_id index.
+    Safe to re-run; returns the number of users updated.
+    """
+    return users_collection.update_many({"google_id": None}, {"$unset": {"google_id": ""}}).modified_count
+
+
 # ===== FINANCE ANALYSIS (Per-User) =====
 
-def save_analysis(user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
-    """Save an analysis to MongoDB and return the inserted ID."""
+# Newest first, with _id breaking ties between equal timestamps
+KEYSET_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+# What /history returns by default: enough to render the list, none of the LLM text
+SUMMARY_PROJECTION = {
+    "_id": 1,
+    "created_at": 1,
+    "income": 1,
+    "total_expenses": {"$ifNull": ["$total_expenses", {"$sum": "$expenses.amount"}]},
+    "health_rating": 1
+}
+
+# Fields a client may ask for explicitly with /history?fields=...
+HISTORY_FIELDS = {
+    "created_at", "income", "profile", "expenses", "total_expenses", "health_rating",
+    "result", "result.expense_analysis", "result.budget_plan",
+    "result.investment_plan", "result.fraud_alerts"
+}
+
+HEALTH_RATINGS = ["Needs Improvement", "Excellent", "Critical", "Good"]
+
+
+def _extract_health_rating(budget_plan) -> Optional[str]:
+    """Pull the health rating the budget agent is asked to give out of its markdown."""
+    import re
+
+    if not isinstance(budget_plan, str):
+        return None
+    alternatives = "|".join(HEALTH_RATINGS)
+    match = re.search(rf"rating\W{{0,20}}({alternatives})", budget_plan, re.IGNORECASE)
+    if not match:
+        match = re.search(rf"\b({alternatives})\b", budget_plan)
+    if not match:
+        return None
+    return next(r for r in HEALTH_RATINGS if r.lower() == match.group(1).lower())
+
+
+def encode_cursor(doc: dict) -> str:
+    """Build an opaque keyset cursor pointing just past `doc`."""
+    import base64
+
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_position(cursor: str) -> tuple:
+    """
+    The (created_at, _id) a cursor from encode_cursor points at.
+    Raises ValueError if the cursor is malformed.
+    """
+    import base64
+    from bson.objectid import ObjectId
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, doc_id = raw.split("|")
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Turn a cursor from encode_cursor into a filter for the next (older) page."""
+    created_at, doc_id = _cursor_position(cursor)
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": doc_id}}
+    ]}
+
+
+def _history_projection(fields: Optional[list]) -> dict:
+    """Projection for the requested fields, or the summary projection by default."""
+    if not fields:
+        return SUMMARY_PROJECTION
+    unknown = [f for f in fields if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    projection = {"_id": 1, "created_at": 1}
+    for field in fields:
+        projection[field] = SUMMARY_PROJECTION["total_expenses"] if field == "total_expenses" else 1
+    # A parent path and one of its children can't both be projected
+    if "result" in projection:
+        for field in list(projection):
+            if field.startswith("result."):
+                del projection[field]
+    if _wants_result(projection):
+        projection["result_ref"] = 1
+    return projection
+
+
+def _wants_result(projection: Optional[dict]) -> bool:
+    return bool(projection) and any(f == "result" or f.startswith("result.") for f in projection)
+
+
+def _attach_sections(docs: list, sections_docs: list, projection: Optional[dict] = None):
+    """
+    Decompress result sections into their analyses as doc["result"].
+    Only the sections named in `projection` are kept if it lists result.* fields.
+    """
+    keys = None
+    if projection and "result" not in projection:
+        keys = [f.split(".", 1)[1] for f in projection if f.startswith("result.")]
+
+    sections_by_id = {s["_id"]: s for s in sections_docs}
+    for doc in docs:
+        doc.pop("result_ref", None)
+        sections = sections_by_id.get(doc["_id"])
+        if sections is None:
+            continue  # legacy document with the result stored inline
+        result = unpack(bytes(sections["data"]), sections["codec"])
+        doc["result"] = result if keys is None else {k: result[k] for k in keys if k in result}
+
+
+def _section_ids(docs: list) -> list:
+    """IDs of the analyses whose result lives in the sections collection."""
+    return [doc["_id"] for doc in docs if "result_ref" in doc]
+
+
+def _keyset_page(collection, query: dict, limit: int, cursor: Optional[str], projection: dict = None) -> dict:
+    """Fetch one newest-first page and the cursor for the page after it."""
+    query, projection = _keyset_query(query, cursor, projection)
+    docs = list(collection.find(query, projection).sort(KEYSET_SORT).limit(limit + 1))
+    if _wants_result(projection):
+        ids = _section_ids(docs)
+        sections = list(sections_collection.find({"_id": {"$in": ids}})) if ids else []
+        _attach_sections(docs, sections, projection)
+    return _keyset_result(docs, limit)
+
+
+def _keyset_query(query: dict, cursor: Optional[str], projection: Optional[dict]) -> tuple:
+    if cursor:
+        query = {**query, **decode_cursor(cursor)}
+    if projection:
+        projection = {**projection, "created_at": 1}  # needed to build the next cursor
+    return query, projection
+
+
+def _keyset_result(docs: list, limit: int) -> dict:
+    """Trim the extra look-ahead document and turn it into next_cursor."""
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return {"items": docs, "next_cursor": next_cursor}
+
+
+def _sections_document(analysis_id, user_id: str, result: dict) -> dict:
+    """Compress the LLM result sections into their own document."""
+    from bson.binary import Binary
+
+    codec, data, raw_size = pack(result)
+    return {
+        "_id": analysis_id,
+        "user_id": user_id,
+        "codec": codec,
+        "data": Binary(data),
+        "raw_size": raw_size
+    }
+
+
+def _analysis_documents(user_id: str, income: float, profile: str, expenses: list, result: dict) -> tuple:
+    """
+    Build the (analysis, sections) document pair for a new analysis.
+
+    The analyses document keeps only numbers and summaries; the LLM text goes to
+    sections_collection compressed and is loaded only by /history/{id}.
+    """
+    from bson.objectid import ObjectId
+
+    analysis_id = ObjectId()
+    sections = _sections_document(analysis_id, user_id, result)
     document = {
+        "_id": analysis_id,
         "user_id": user_id,
         "income": income,
         "profile": profile,
         "expenses": expenses,
-        "result": result,
+        "total_expenses": sum(_as_number(exp.get("amount", 0)) for exp in expenses),
+        "health_rating": _extract_health_rating(result.get("budget_plan")),
+        "result_ref": {
+            "codec": sections["codec"],
+            "raw_size": sections["raw_size"],
+            "compressed_size": len(sections["data"])
+        },
         "created_at": datetime.utcnow()
     }
+    return document, sections
+
+
+def save_analysis(user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
+    """Save an analysis to MongoDB and return the inserted ID."""
+    document, sections = _analysis_documents(user_id, income, profile, expenses, result)
+    # Sections first, so an analysis never points at text that isn't there
+    sections_collection.insert_one(sections)
     inserted = analyses_collection.insert_one(document)
+    update_rollup(user_id, document["created_at"], income, expenses)
     return str(inserted.inserted_id)
 
 
+def get_analyses_page(user_id: str, limit: int = 10, cursor: str = None, fields: list = None) -> dict:
+    """
+    Get one page of a user's analyses, newest first.
+
+    Returns summaries (id, created_at, income, total_expenses, health_rating) unless
+    specific `fields` are requested. Pass the returned next_cursor to get older items.
+    Returns { items: [...], next_cursor: str | None }
+    """
+    return _keyset_page(
+        analyses_collection, {"user_id": user_id}, limit, cursor, _history_projection(fields)
+    )
+
+
 def get_all_analyses(user_id: str, limit: int = 10) -> list:
-    """Get recent analyses from MongoDB for a specific user."""
-    cursor = analyses_collection.find({"user_id": user_id}).sort("created_at", -1).limit(limit)
-    analyses = []
-    for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        analyses.append(doc)
-    return analyses
+    """Get summaries of the most recent analyses for a specific user."""
+    return get_analyses_page(user_id, limit)["items"]
 
 
 def get_analysis_by_id(user_id: str, analysis_id: str) -> dict:
@@ -170,10 +589,45 @@ def get_analysis_by_id(user_id: str, analysis_id: str) -> dict:
     from bson.objectid import ObjectId
     doc = analyses_collection.find_one({"_id": ObjectId(analysis_id), "user_id": user_id})
     if doc:
+        sections = sections_collection.find_one({"_id": doc["_id"]}) if "result_ref" in doc else None
+        _attach_sections([doc], [sections] if sections else [])
         doc["_id"] = str(doc["_id"])
     return doc
 
 
+def compress_legacy_results(batch_size: int = 500) -> int:
+    """
+    Move inline `result` text of older analyses into sections_collection.
+    Safe to re-run; returns the number of analyses migrated.
+    """
+    from pymongo import ReplaceOne, UpdateOne
+
+    migrated = 0
+    while True:
+        docs = list(analyses_collection.find(
+            {"result": {"$exists": True}, "result_ref": {"$exists": False}},
+            {"user_id": 1, "result": 1}
+        ).limit(batch_size))
+        if not docs:
+            return migrated
+
+        section_writes, analysis_writes = [], []
+        for doc in docs:
+            sections = _sections_document(doc["_id"], doc["user_id"], doc["result"])
+            section_writes.append(ReplaceOne({"_id": doc["_id"]}, sections, upsert=True))
+            analysis_writes.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$unset": {"result": ""}, "$set": {"result_ref": {
+                    "codec": sections["codec"],
+                    "raw_size": sections["raw_size"],
+                    "compressed_size": len(sections["data"])
+                }}}
+            ))
+        sections_collection.bulk_write(section_writes, ordered=False)
+        analyses_collection.bulk_write(analysis_writes, ordered=False)
+        migrated += len(docs)
+
+
 # ===== SAVINGS GOALS (Per-User) =====
 
 def save_goal(user_id: str, name: str, target: float, current: float = 0, deadline: str = None) -> str:
@@ -231,94 +685,526 @@ def get_goal_by_id(user_id: str, goal_id: str) -> dict:
 # ===== CHAT HISTORY (Per-User) =====
 
 def save_chat_message(user_id: str, role: str, content: str) -> str:
-    """Save a chat message for a user."""
-    document = {
-        "user_id": user_id,
-        "role": role,  # "user" or "assistant"
-        "content": content,
-        "created_at": datetime.utcnow()
-    }
-    inserted = chat_history_collection.insert_one(document)
-    return str(inserted.inserted_id)
+    """Queue a chat message for a user; it is written in the next batch."""
+    return chat_log_writer.append(user_id, role, content)
+
+
+def _with_buffered_messages(docs: list, user_id: str, cursor: Optional[str]) -> list:
+    """Merge not-yet-flushed messages into a newest-first page so readers see their own writes."""
+    seen = {doc["_id"] for doc in docs}
+    before = _cursor_position(cursor) if cursor else None
+    buffered = [
+        doc for doc in chat_log_writer.pending(user_id)
+        if doc["_id"] not in seen and (before is None or (doc["created_at"], doc["_id"]) < before)
+    ]
+    if not buffered:
+        return docs
+    return sorted(docs + buffered, key=lambda doc: (doc["created_at"], doc["_id"]), reverse=True)
+
+
+def get_chat_history_page(user_id: str, limit: int = 50, cursor: str = None) -> dict:
+    """
+    Get a page of chat history in chronological order.
+    Pass the returned next_cursor to page further back in time.
+    Returns { items: [...], next_cursor: str | None }
+    """
+    query, _ = _keyset_query({"user_id": user_id}, cursor, None)
+    docs = list(chat_history_collection.find(query).sort(KEYSET_SORT).limit(limit + 1))
+    page = _keyset_result(_with_buffered_messages(docs, user_id, cursor), limit)
+    page["items"].reverse()  # Return in chronological order
+    return page
 
 
 def get_chat_history(user_id: str, limit: int = 50) -> list:
     """Get chat history for a user."""
-    cursor = chat_history_collection.find({"user_id": user_id}).sort("created_at", -1).limit(limit)
-    messages = []
-    for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        messages.append(doc)
-    return list(reversed(messages))  # Return in chronological order
+    return get_chat_history_page(user_id, limit)["items"]
 
 
 def clear_chat_history(user_id: str) -> bool:
     """Clear all chat history for a user."""
+    chat_log_writer.discard(user_id)
     result = chat_history_collection.delete_many({"user_id": user_id})
     return result.deleted_count > 0
 
 
-# ===== TRENDS & ANALYTICS (Per-User) =====
+# ===== EMAIL OUTBOX =====
+# Messages wait here until the email worker delivers them; sent ones are deleted,
+# ones that ran out of attempts stay with status "failed".
 
-def get_monthly_trends(user_id: str, months: int = 6) -> list:
-    """Get monthly spending trends from analysis history for a specific user."""
+def enqueue_email(recipient: str, subject: str, text: str, html: str) -> str:
+    """Queue an email for the background worker and return its ID."""
+    now = datetime.utcnow()
+    inserted = outbox_collection.insert_one({
+        "recipient": recipient,
+        "subject": subject,
+        "text": text,
+        "html": html,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    })
+    return str(inserted.inserted_id)
+
+
+def claim_emails(limit: int, lease_seconds: float) -> list:
+    """
+    Take up to `limit` due emails for delivery. Each claim counts as an attempt and
+    hides the email for `lease_seconds`, so a worker that dies mid-send only delays it.
+    """
     from datetime import timedelta
-    
-    # Get analyses from the last N months
-    cutoff_date = datetime.utcnow() - timedelta(days=months * 30)
-    cursor = analyses_collection.find(
-        {"user_id": user_id, "created_at": {"$gte": cutoff_date}}
-    ).sort("created_at", 1)
-    
+    from pymongo import ReturnDocument
+
+    now = datetime.utcnow()
+    claimed = []
+    for _ in range(limit):
+        doc = outbox_collection.find_one_and_update(
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"$set": {"next_attempt_at": now + timedelta(seconds=lease_seconds)}, "$inc": {"attempts": 1}},
+            sort=[("next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            break
+        doc["_id"] = str(doc["_id"])
+        claimed.append(doc)
+    return claimed
+
+
+def mark_email_sent(email_id: str):
+    from bson.objectid import ObjectId
+    outbox_collection.delete_one({"_id": ObjectId(email_id)})
+
+
+def mark_email_failed(email_id: str, error: str, retry_at: Optional[datetime] = None):
+    """Schedule another attempt at `retry_at`, or give up if it is None."""
+    from bson.objectid import ObjectId
+    update = {"last_error": error}
+    if retry_at is None:
+        update["status"] = "failed"
+    else:
+        update["next_attempt_at"] = retry_at
+    outbox_collection.update_one({"_id": ObjectId(email_id)}, {"$set": update})
+
+
+# ===== PARSED STATEMENTS =====
+# Compressed parse results keyed by parser version + PDF content hash; a TTL
+# index removes them PARSE_CACHE_TTL_DAYS after they were stored.
+
+def get_parsed_statement(key: str) -> Optional[dict]:
+    doc = parsed_statements_collection.find_one({"_id": key})
+    return unpack(bytes(doc["data"]), doc["codec"]) if doc else None
+
+
+def save_parsed_statement(key: str, statement: dict):
+    codec, data, raw_size = pack(statement)
+    parsed_statements_collection.replace_one(
+        {"_id": key},
+        {"codec": codec, "data": data, "raw_size": raw_size, "created_at": datetime.utcnow()},
+        upsert=True
+    )
+
+
+# ===== TRANSACTIONS (Per-User) =====
+# Normalized records (see transactions.py), one document per transaction, written
+# as upserts on (user_id, fingerprint) so the same rows imported twice are stored once.
+
+TRANSACTION_PROJECTION = {"_id": 0, "user_id": 0, "created_at": 0}
+
+
+def _transaction_date(value) -> Optional[datetime]:
+    """A "YYYY-MM-DD" string or a date as the datetime Mongo stores."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime(value.year, value.month, value.day)
+
+
+def upsert_transactions(user_id: str, records: list, source: str, import_id: str) -> list:
+    """Store a batch of transaction records for a user; returns the ones that weren't stored already."""
+    if not records:
+        return []
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"user_id": user_id, "fingerprint": record["fingerprint"]},
+            {"$setOnInsert": {
+                **{key: value for key, value in record.items() if key != "fingerprint"},
+                "date": _transaction_date(record["date"]), "source": source, "import_id": import_id, "created_at": now
+            }},
+            upsert=True
+        )
+        for record in records
+    ]
+    result = transactions_collection.bulk_write(operations, ordered=False)
+    return [records[index] for index in sorted(result.upserted_ids)]
+
+
+def _transaction_range(user_id: str, start, end=None, category: str = None) -> dict:
+    query = {"user_id": user_id, "date": {"$gte": _transaction_date(start)}}
+    if end:
+        query["date"]["$lt"] = _transaction_date(end)
+    if category:
+        query["category"] = category
+    return query
+
+
+def _transaction_document(doc: dict) -> dict:
+    doc["date"] = doc["date"].date().isoformat()
+    return doc
+
+
+def get_transactions(user_id: str, start, end=None, category: str = None) -> list:
+    """The user's transactions dated from `start` up to (not including) `end`, oldest first."""
+    cursor = transactions_collection.find(
+        _transaction_range(user_id, start, end, category), TRANSACTION_PROJECTION
+    ).sort("date", ASCENDING)
+    return [_transaction_document(doc) for doc in cursor]
+
+
+def count_transactions(user_id: str) -> int:
+    return transactions_collection.count_documents({"user_id": user_id})
+
+
+def _transaction_trends_pipeline(user_id: str, start) -> list:
+    """Per (month, category) spending, income and counts for transactions dated from `start`."""
+    return [
+        {"$match": _transaction_range(user_id, start)},
+        {"$group": {
+            "_id": {"month": {"$dateToString": {"format": "%Y-%m", "date": "$date"}}, "category": "$category"},
+            "spent": {"$sum": {"$cond": [{"$gt": ["$amount", 0]}, "$amount", 0]}},
+            "received": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, {"$subtract": [0, "$amount"]}, 0]}},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+
+def _transaction_trends(rows: list) -> dict:
+    """Fold (month, category) rows into the get_trends shape, with transaction counts per month."""
     monthly_data = {}
-    
-    for doc in cursor:
-        date = doc.get("created_at", datetime.utcnow())
-        month_key = date.strftime("%Y-%m")
-        
-        if month_key not in monthly_data:
-            monthly_data[month_key] = {
-                "month": month_key,
-                "total_income": 0,
-                "total_expenses": 0,
-                "analyses_count": 0,
-                "categories": {}
-            }
-        
-        monthly_data[month_key]["total_income"] += doc.get("income", 0)
-        monthly_data[month_key]["analyses_count"] += 1
-        
-        for exp in doc.get("expenses", []):
-            cat = exp.get("category", "Other")
-            amt = exp.get("amount", 0)
-            monthly_data[month_key]["total_expenses"] += amt
-            
-            if cat not in monthly_data[month_key]["categories"]:
-                monthly_data[month_key]["categories"][cat] = 0
-            monthly_data[month_key]["categories"][cat] += amt
-    
-    return list(monthly_data.values())
+    for row in rows:
+        month_key, category = row["_id"]["month"], row["_id"]["category"]
+        month = monthly_data.setdefault(month_key, {
+            "month": month_key, "total_income": 0, "total_expenses": 0, "transactions_count": 0, "categories": {}
+        })
+        month["total_income"] += row["received"]
+        month["transactions_count"] += row["count"]
+        if row["spent"]:
+            month["categories"][category] = row["spent"]
+            month["total_expenses"] += row["spent"]
+    monthly = [monthly_data[key] for key in sorted(monthly_data)]
+    return {
+        "categories": _summarize_categories(monthly),
+        "monthly_breakdown": monthly
+    }
 
 
-def get_category_trends(user_id: str, months: int = 6) -> dict:
-    """Get spending by category over time for a specific user."""
-    trends = get_monthly_trends(user_id, months)
-    
+def get_transaction_trends(user_id: str, months: int = 6) -> dict:
+    """get_trends over the user's stored transactions for the last `months` calendar months."""
+    start = datetime.strptime(_first_month(months), "%Y-%m")
+    return _transaction_trends(list(transactions_collection.aggregate(_transaction_trends_pipeline(user_id, start))))
+
+
+# ===== RECURRING STATE (Per-User) =====
+# One document per user: the compressed series state (see recurring_state.py) and,
+# uncompressed next to it, the series it reports, which is all GET /recurring reads.
+
+RECURRING_PROJECTION = {"_id": 0, "recurring": 1, "updated_at": 1}
+
+
+def get_recurring(user_id: str) -> Optional[dict]:
+    return recurring_collection.find_one({"_id": user_id}, RECURRING_PROJECTION)
+
+
+def get_recurring_state(user_id: str) -> Optional[dict]:
+    doc = recurring_collection.find_one({"_id": user_id}, {"codec": 1, "data": 1, "version": 1})
+    return {"state": unpack(bytes(doc["data"]), doc["codec"]), "version": doc["version"]} if doc else None
+
+
+def save_recurring_state(user_id: str, state: dict, version: int, recurring: list) -> bool:
+    """Compare-and-set on the version; False if the state changed since it was read."""
+    codec, data, raw_size = pack(state)
+    fields = {"codec": codec, "data": data, "raw_size": raw_size, "recurring": recurring, "updated_at": datetime.utcnow()}
+    if not version:
+        try:
+            recurring_collection.insert_one({"_id": user_id, **fields, "version": 1})
+            return True
+        except DuplicateKeyError:
+            return False
+    result = recurring_collection.update_one({"_id": user_id, "version": version}, {"$set": fields, "$inc": {"version": 1}})
+    return result.matched_count == 1
+
+
+# ===== CATEGORY OVERRIDES (Per-User) =====
+
+def get_category_overrides(user_id: str) -> dict:
+    """{merchant key: category} the user has corrected."""
+    return {
+        doc["merchant"]: doc["category"]
+        for doc in category_overrides_collection.find({"user_id": user_id}, {"_id": 0, "merchant": 1, "category": 1})
+    }
+
+
+def set_category_override(user_id: str, merchant: str, category: str):
+    """Save the correction and apply it to the merchant's stored spending."""
+    category_overrides_collection.update_one(
+        {"user_id": user_id, "merchant": merchant},
+        {"$set": {"category": category, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    transactions_collection.update_many(
+        {"user_id": user_id, "merchant": merchant, "amount": {"$gt": 0}}, {"$set": {"category": category}}
+    )
+
+
+# ===== TRENDS & ANALYTICS (Per-User) =====
+
+# _category_name in the pipeline: missing, null and blank categories are "Other"
+CATEGORY_NAME = {"$let": {
+    "vars": {"name": {"$trim": {"input": {"$toString": {"$ifNull": ["$expenses.category", ""]}}}}},
+    "in": {"$cond": [{"$eq": ["$$name", ""]}, "Other", "$$name"]}
+}}
+
+
+def _trends_pipeline(user_id: str, cutoff_date: datetime) -> list:
+    """
+    Aggregation pipeline for per-month income/expense totals.
+
+    Only the small numeric summary leaves the server: one row per month with the
+    income total and analyses count, plus one row per (month, category) pair.
+    """
+    return [
+        {"$match": {"user_id": user_id, "created_at": {"$gte": cutoff_date}}},
+        {"$project": {
+            "_id": 0,
+            "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            "income": {"$ifNull": ["$income", 0]},
+            "expenses": {"$ifNull": ["$expenses", []]}
+        }},
+        {"$facet": {
+            "months": [
+                {"$group": {
+                    "_id": "$month",
+                    "total_income": {"$sum": "$income"},
+                    "analyses_count": {"$sum": 1}
+                }}
+            ],
+            "categories": [
+                {"$unwind": "$expenses"},
+                {"$group": {
+                    "_id": {
+                        "month": "$month",
+                        "category": CATEGORY_NAME
+                    },
+                    "amount": {"$sum": {"$ifNull": ["$expenses.amount", 0]}}
+                }}
+            ]
+        }}
+    ]
+
+
+def _merge_trends(facets: dict) -> list:
+    """Combine the month and category facets into the monthly trends shape."""
+    monthly_data = {}
+    for row in facets.get("months", []):
+        monthly_data[row["_id"]] = {
+            "month": row["_id"],
+            "total_income": row["total_income"],
+            "total_expenses": 0,
+            "analyses_count": row["analyses_count"],
+            "categories": {}
+        }
+
+    for row in facets.get("categories", []):
+        month = monthly_data[row["_id"]["month"]]
+        month["categories"][row["_id"]["category"]] = row["amount"]
+        month["total_expenses"] += row["amount"]
+
+    return [monthly_data[key] for key in sorted(monthly_data)]
+
+
+def _summarize_categories(monthly: list) -> dict:
+    """Total each category across months, highest spending first."""
     category_totals = {}
-    for month in trends:
+    for month in monthly:
         for cat, amount in month.get("categories", {}).items():
-            if cat not in category_totals:
-                category_totals[cat] = 0
-            category_totals[cat] += amount
-    
-    # Sort by total spending
-    sorted_categories = sorted(
-        category_totals.items(), 
-        key=lambda x: x[1], 
-        reverse=True
+            category_totals[cat] = category_totals.get(cat, 0) + amount
+
+    return dict(sorted(category_totals.items(), key=lambda x: x[1], reverse=True))
+
+
+# ===== MONTHLY ROLLUPS =====
+# One small document per (user_id, month) kept up to date by save_analysis, so the
+# trend endpoints never have to re-aggregate raw analysis history.
+
+def _as_number(value) -> float:
+    """Treat non-numeric amounts as 0, like $sum does ($inc would reject them)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+def _category_name(category) -> str:
+    """An expense's category as trends count it: missing, null and blank are "Other"."""
+    if category is None:
+        return "Other"
+    return str(category).strip() or "Other"
+
+
+def _encode_category(category: str) -> str:
+    """Make a category name safe to use as a field name ('.' and '$' are reserved)."""
+    return str(category).replace(".", "\uff0e").replace("$", "\uff04")
+
+
+def _decode_category(key: str) -> str:
+    return key.replace("\uff0e", ".").replace("\uff04", "$")
+
+
+def _rollup_update(user_id: str, created_at: datetime, income: float, expenses: list) -> tuple:
+    """The (filter, update) pair that adds one analysis to its month's rollup."""
+    increments = {"total_income": _as_number(income), "total_expenses": 0, "analyses_count": 1}
+    for exp in expenses:
+        amount = _as_number(exp.get("amount", 0))
+        key = "categories." + _encode_category(_category_name(exp.get("category")))
+        increments[key] = increments.get(key, 0) + amount
+        increments["total_expenses"] += amount
+
+    return (
+        {"user_id": user_id, "month": created_at.strftime("%Y-%m")},
+        {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}}
     )
-    
+
+
+def update_rollup(user_id: str, created_at: datetime, income: float, expenses: list):
+    """Atomically add one analysis to its month's rollup document."""
+    query, update = _rollup_update(user_id, created_at, income, expenses)
+    rollups_collection.update_one(query, update, upsert=True)
+
+
+def _rollup_to_month(doc: dict) -> dict:
+    """Convert a rollup document to the monthly trends shape."""
     return {
-        "categories": dict(sorted_categories),
-        "monthly_breakdown": trends
+        "month": doc["month"],
+        "total_income": doc.get("total_income", 0),
+        "total_expenses": doc.get("total_expenses", 0),
+        "analyses_count": doc.get("analyses_count", 0),
+        "categories": {
+            _decode_category(key): amount
+            for key, amount in doc.get("categories", {}).items()
+        }
+    }
+
+
+def _first_month(months: int) -> str:
+    """The "YYYY-MM" key of the oldest month in a window of `months` calendar months."""
+    now = datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - (max(months, 1) - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _history_months(user_id: str) -> list:
+    """Per-month totals over a user's whole history: hot analyses plus archived ones."""
+    facets = next(analyses_collection.aggregate(_trends_pipeline(user_id, datetime(1970, 1, 1))), {})
+    monthly = {month["month"]: month for month in _merge_trends(facets)}
+
+    for archive in archives_collection.find({"user_id": user_id, "kind": "analyses"}, {"month": 1, "summary": 1}):
+        archived = _rollup_to_month({"month": archive["month"], **archive.get("summary", {})})
+        month = monthly.setdefault(archive["month"], {
+            "month": archive["month"], "total_income": 0, "total_expenses": 0,
+            "analyses_count": 0, "categories": {}
+        })
+        for field in ("total_income", "total_expenses", "analyses_count"):
+            month[field] += archived[field]
+        for cat, amount in archived["categories"].items():
+            month["categories"][cat] = month["categories"].get(cat, 0) + amount
+
+    return [monthly[key] for key in sorted(monthly)]
+
+
+def rebuild_rollups(user_id: str) -> int:
+    """Recompute a user's rollups from analyses history (including archives). Returns months written."""
+    from pymongo import ReplaceOne
+
+    history = _history_months(user_id)
+    requests = []
+    for month in history:
+        requests.append(ReplaceOne(
+            {"user_id": user_id, "month": month["month"]},
+            {
+                "user_id": user_id,
+                "month": month["month"],
+                "total_income": month["total_income"],
+                "total_expenses": month["total_expenses"],
+                "analyses_count": month["analyses_count"],
+                "categories": {
+                    _encode_category(cat): amount
+                    for cat, amount in month["categories"].items()
+                },
+                "updated_at": datetime.utcnow()
+            },
+            upsert=True
+        ))
+    if requests:
+        rollups_collection.bulk_write(requests, ordered=False)
+    # Months with no history left (e.g. rollups written for since-deleted analyses)
+    rollups_collection.delete_many({
+        "user_id": user_id,
+        "month": {"$nin": [month["month"] for month in history]}
+    })
+    return len(requests)
+
+
+def check_rollups(user_id: str, tolerance: float = 0.01) -> list:
+    """Compare a user's rollups against analyses history (including archives) and return the mismatches."""
+    expected = {month["month"]: month for month in _history_months(user_id)}
+    actual = {
+        doc["month"]: _rollup_to_month(doc)
+        for doc in rollups_collection.find({"user_id": user_id})
     }
+
+    mismatches = []
+    for month_key in sorted(set(expected) | set(actual)):
+        want, got = expected.get(month_key), actual.get(month_key)
+        if want is None or got is None:
+            mismatches.append({"month": month_key, "expected": want, "actual": got})
+            continue
+        fields = ["total_income", "total_expenses", "analyses_count"]
+        categories = set(want["categories"]) | set(got["categories"])
+        if any(abs(want[f] - got[f]) > tolerance for f in fields) or any(
+            abs(want["categories"].get(c, 0) - got["categories"].get(c, 0)) > tolerance
+            for c in categories
+        ):
+            mismatches.append({"month": month_key, "expected": want, "actual": got})
+    return mismatches
+
+
+def get_trends(user_id: str, months: int = 6) -> dict:
+    """
+    Get monthly and per-category spending trends for the last `months` calendar months.
+
+    Reads at most `months` rollup documents.
+    Returns { categories: {cat: total}, monthly_breakdown: [month, ...] }
+    """
+    cursor = rollups_collection.find(
+        {"user_id": user_id, "month": {"$gte": _first_month(months)}}
+    ).sort("month", 1).limit(max(months, 1))
+    return _trends_from_rollups(list(cursor))
+
+
+def _trends_from_rollups(docs: list) -> dict:
+    monthly = [_rollup_to_month(doc) for doc in docs]
+    return {
+        "categories": _summarize_categories(monthly),
+        "monthly_breakdown": monthly
+    }
+
+
+def get_monthly_trends(user_id: str, months: int = 6) -> list:
+    """Get monthly spending trends from analysis history for a specific user."""
+    return get_trends(user_id, months)["monthly_breakdown"]
+
+
+def get_category_trends(user_id: str, months: int = 6) -> dict:
+    """Get spending by category over time for a specific user."""
+    return get_trends(user_id, months)
@@ -1,12 +1,24 @@
 """
 Email service for sending verification emails.
+
+Emails are not sent inside the request. send_verification_email() puts the message
+in the outbox (a persisted queue in the storage backend) and returns; the
+EmailOutbox worker thread delivers queued messages in batches over one SMTP
+connection that it keeps open between batches and reopens when it drops.
+Failed sends are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS times.
 """
 import os
 import smtplib
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+from storage import storage
+
 load_dotenv()
 
 # SMTP Configuration
@@ -14,27 +26,38 @@ SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_LOGIN = os.getenv("SMTP_LOGIN", "true").lower() == "true"  # false for relays without auth
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))  # close the connection after this long unused
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# Outbox worker
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "120"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "30"))  # seconds; doubles every attempt
+EMAIL_RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX", "3600"))
+
+
+def smtp_configured() -> bool:
+    return bool(SMTP_FROM) and (not SMTP_LOGIN or bool(SMTP_USER and SMTP_PASSWORD))
+
 
 def send_verification_email(to_email: str, verification_token: str) -> bool:
     """
-    Send a verification email to the user.
-    Returns True if successful, False otherwise.
+    Queue a verification email for the user.
+    Returns True once the message is queued (or printed, in dev mode).
     """
-    if not SMTP_USER or not SMTP_PASSWORD:
+    if not smtp_configured():
         print("⚠️ SMTP not configured. Verification email not sent.")
         print(f"📧 Verification link: {FRONTEND_URL}/verify/{verification_token}")
         return True  # Return True in dev mode so signup can proceed
     
     verification_link = f"{FRONTEND_URL}/verify/{verification_token}"
     
-    # Create email
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = "Verify your Agentic Finance AI account"
-    msg["From"] = SMTP_USER
-    msg["To"] = to_email
-    
     # Plain text version
     text = f"""
 Welcome to Agentic Finance AI!
@@ -92,21 +115,167 @@ Agentic Finance AI Team
 </html>
     """
     
-    msg.attach(MIMEText(text, "plain"))
-    msg.attach(MIMEText(html, "html"))
-    
     try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.sendmail(SMTP_USER, to_email, msg.as_string())
-        print(f"✅ Verification email sent to {to_email}")
+        storage.enqueue_email(to_email, "Verify your Agentic Finance AI account", text, html)
+        outbox.wake()
         return True
     except Exception as e:
-        print(f"❌ Failed to send email: {e}")
+        print(f"❌ Failed to queue email: {e}")
         print(f"")
         print(f"📧📧📧 COPY THIS VERIFICATION LINK 📧📧📧")
         print(f"👉 {verification_link}")
         print(f"📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧📧")
         print(f"")
         return True  # Return True so signup succeeds
+
+
+def _mime_message(email: dict) -> MIMEMultipart:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = email["subject"]
+    msg["From"] = SMTP_FROM
+    msg["To"] = email["recipient"]
+    msg.attach(MIMEText(email["text"], "plain"))
+    msg.attach(MIMEText(email["html"], "html"))
+    return msg
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(EMAIL_RETRY_BASE * 2 ** max(attempts - 1, 0), EMAIL_RETRY_MAX)
+
+
+class EmailOutbox:
+    """Background worker that delivers queued emails over a reused SMTP connection."""
+
+    def __init__(self, store):
+        self.store = store
+        self._smtp = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.connections = 0
+
+    def start(self):
+        """Start the worker thread (idempotent). Does nothing without SMTP configured."""
+        if self._thread is not None or not smtp_configured():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=SMTP_TIMEOUT)
+
+    def wake(self):
+        """Deliver now instead of at the next poll."""
+        self._wake.set()
+
+    # ===== SMTP CONNECTION =====
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+            if SMTP_STARTTLS:
+                smtp.starttls(context=ssl.create_default_context())
+            if SMTP_LOGIN:
+                smtp.login(SMTP_USER, SMTP_PASSWORD)
+            self._smtp = smtp
+            self.connections += 1
+        return self._smtp
+
+    def _disconnect(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+
+    def _send(self, email: dict):
+        message = _mime_message(email).as_string()
+        try:
+            self._connection().sendmail(SMTP_FROM, [email["recipient"]], message)
+        except smtplib.SMTPServerDisconnected:
+            self._resend(email, message)
+        except smtplib.SMTPException:
+            raise  # the server answered; a new connection won't change that
+        except OSError:
+            self._resend(email, message)
+        self._last_used = time.monotonic()
+
+    def _resend(self, email: dict, message: str):
+        # The kept-open connection went stale: reconnect once and try again
+        self._disconnect()
+        self._connection().sendmail(SMTP_FROM, [email["recipient"]], message)
+
+    # ===== DELIVERY =====
+
+    def _failed(self, email: dict, error: Exception, permanent: bool = False):
+        if permanent or email["attempts"] >= EMAIL_MAX_ATTEMPTS:
+            self.store.mark_email_failed(email["_id"], str(error))
+            self.failed += 1
+            print(f"❌ Giving up on email to {email['recipient']}: {error}")
+        else:
+            retry_at = datetime.utcnow() + timedelta(seconds=_retry_delay(email["attempts"]))
+            self.store.mark_email_failed(email["_id"], str(error), retry_at)
+            self.retried += 1
+
+    def _unreachable(self, emails: list, error: Exception):
+        """The server can't be reached: back off this email and the rest of the batch."""
+        self._disconnect()
+        for email in emails:
+            self._failed(email, error)
+
+    def deliver_batch(self) -> int:
+        """Send one batch of due emails. Returns how many were claimed."""
+        batch = self.store.claim_emails(EMAIL_BATCH_SIZE, EMAIL_LEASE_SECONDS)
+        for index, email in enumerate(batch):
+            try:
+                self._send(email)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+                self._failed(email, e, permanent=True)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                self._unreachable(batch[index:], e)
+                break
+            except smtplib.SMTPException as e:
+                self._failed(email, e)
+            except OSError as e:
+                self._unreachable(batch[index:], e)
+                break
+            except Exception as e:
+                self._failed(email, e)
+            else:
+                self.store.mark_email_sent(email["_id"])
+                self.sent += 1
+        return len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.deliver_batch() == EMAIL_BATCH_SIZE:
+                    continue  # a full batch: there may be more waiting
+            except Exception as e:
+                print(f"⚠️ Email outbox run failed: {e}")
+            self._wake.wait(EMAIL_POLL_INTERVAL)
+            self._wake.clear()
+            if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+                self._disconnect()
+        self._disconnect()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "connections": self.connections
+        }
+
+
+outbox = EmailOutbox(storage)
@@ -10,7 +10,7 @@ class ControllerAgent:
         self.investment_agent = InvestmentAgent()
         self.fraud_agent = FraudAgent()
 
-    def run(self, data):
+    def run(self, data, baseline=None):
         try:
             expense_report = self.expense_agent.run(data["expenses"])
             budget_report = self.budget_agent.run(
@@ -19,7 +19,7 @@ class ControllerAgent:
             investment_report = self.investment_agent.run(
                 data["profile"], budget_report
             )
-            fraud_report = self.fraud_agent.run(data["expenses"])
+            fraud_report = self.fraud_agent.run(data["expenses"], baseline)
 
             return {
                 "expense_analysis": expense_report,
@@ -1,18 +1,31 @@
 from gemini_llm import gemini
 
 class FraudAgent:
-    def run(self, expenses):
+    def run(self, expenses, baseline=None):
         # Format expenses in a readable way instead of raw JSON
         formatted_expenses = "\n".join([
             f"• {exp.get('category', 'Unknown')}: ₹{exp.get('amount', 0):,}" 
             for exp in expenses
         ])
+
+        # The user's usual spending per category (transactions.category_baseline), when they have history
+        usual_spending = ""
+        if baseline:
+            lines = "\n".join([
+                f"• {category}: {stats['count']} payments, typically ₹{stats['median']:,}, "
+                f"90% under ₹{stats['high']:,}, largest ₹{stats['max']:,}"
+                for category, stats in sorted(baseline.items())
+            ])
+            usual_spending = f"""
+**The user's usual spending over the last months (compare against this):**
+{lines}
+"""
         
         prompt = f"""You are a financial fraud detection expert. Analyze the following transactions for anomalies or potential fraud.
 
 **Transactions to analyze:**
 {formatted_expenses}
-
+{usual_spending}
 **Your task:**
 1. Identify any suspicious transactions
 2. Explain why each flagged transaction is concerning
@@ -0,0 +1,90 @@
+"""
+Cached transport for verifying Google ID tokens.
+
+google-auth fetches Google's public signing certificates on every verification
+unless its transport caches them. CachingRequest is a google-auth transport that
+keeps GET responses for as long as their Cache-Control max-age allows (Google
+serves the certs with several hours), over one pooled requests.Session. After the
+first sign-in, verify_google_token is local signature checking only.
+
+GOOGLE_CERTS_URL can point at another cert endpoint (e.g. a local stub serving
+certs for a test key pair).
+"""
+import os
+import re
+import threading
+import time
+
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_CERTS_TIMEOUT = float(os.getenv("GOOGLE_CERTS_TIMEOUT", "10"))
+
+
+def _max_age(headers) -> int:
+    """Seconds a response may be cached for, from its Cache-Control header (0 = don't cache)."""
+    cache_control = (headers or {}).get("Cache-Control", "") or (headers or {}).get("cache-control", "")
+    if re.search(r"no-store|no-cache", cache_control):
+        return 0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return int(match.group(1)) if match else 0
+
+
+class CachingRequest:
+    """google.auth.transport.Request that caches successful GETs per URL for their max-age."""
+
+    def __init__(self, session=None):
+        import requests
+        from google.auth.transport import requests as google_requests
+
+        self._request = google_requests.Request(session=session or requests.Session())
+        self._cache = {}  # url -> (expires_at, response)
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # concurrent misses wait for one fetch
+        self.hits = 0
+        self.fetches = 0
+
+    def _cached(self, url: str):
+        with self._lock:
+            entry = self._cache.get(url)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        timeout = timeout or GOOGLE_CERTS_TIMEOUT
+        if method != "GET" or body is not None:
+            return self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+        response = self._cached(url)
+        if response is None:
+            with self._fetch_lock:
+                response = self._cached(url)
+                if response is None:
+                    response = self._request(url, method="GET", headers=headers, timeout=timeout, **kwargs)
+                    self.fetches += 1
+                    max_age = _max_age(response.headers)
+                    if response.status == 200 and max_age:
+                        with self._lock:
+                            self._cache[url] = (time.monotonic() + max_age, response)
+                    return response
+        self.hits += 1
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "fetches": self.fetches, "cached_urls": len(self._cache)}
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def google_request() -> CachingRequest:
+    """The shared transport, created on first use."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = CachingRequest()
+        return _transport
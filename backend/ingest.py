@@ -0,0 +1,266 @@
+"""
+Statement ingestion for /upload-pdf and /import.
+
+Uploads are read from the request stream into a spooled temporary file (memory
+up to 1 MiB, then disk) and rejected as soon as they pass the size limit, so an
+oversized body is never buffered whole. Parsing never runs on the event loop:
+statements of up to PDF_SYNC_MAX_PAGES pages are parsed on a thread and returned
+in the response; longer ones, and CSV/OFX/QIF imports (see statement_import.py),
+become ingestion jobs that run on a small thread pool and report progress. PDF
+results are cached by content hash (see statement_cache.py), so a re-upload of
+the same statement returns straight away. Parsed and imported rows are stored
+in the user's transactions (see transactions.py), the new ones update the user's
+recurring series (see recurring_state.py), and PDF debits are categorized with
+the user's corrections (see categorizer.py).
+
+Jobs are kept in memory by the worker process that accepted the upload, for
+PDF_JOB_TTL seconds after they finish. Jobs still queued at shutdown fail, so
+their clients stop waiting.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser
+
+import recurring_state
+from categorizer import CATEGORY_LLM_FALLBACK
+from pdf_parser import PDF_MAX_BYTES, iter_pages, open_statement, to_expenses
+from statement_cache import content_hash, statement_cache
+from statement_import import IMPORT_MAX_BYTES, detect_format, import_statement
+from storage import storage
+from transactions import to_records
+
+PDF_SYNC_MAX_PAGES = int(os.getenv("PDF_SYNC_MAX_PAGES", "20"))
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", "2"))
+PDF_JOB_TTL = float(os.getenv("PDF_JOB_TTL", "900"))
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """The request body is over the upload size limit."""
+
+
+async def _limited(stream, limit: int):
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit + MULTIPART_OVERHEAD:
+            raise UploadTooLarge(f"Upload is over the {limit} byte limit")
+        yield chunk
+
+
+async def read_upload(request, limit: int, field: str = "file") -> UploadFile:
+    """Spool the uploaded file from a multipart request, enforcing `limit` bytes while reading."""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+        raise UploadTooLarge(f"Upload is {length} bytes; the limit is {limit}")
+    parser = MultiPartParser(request.headers, _limited(request.stream(), limit), max_files=1, max_fields=10)
+    form = await parser.parse()
+    upload = form.get(field)
+    if not isinstance(upload, UploadFile):
+        for value in form.values():
+            if isinstance(value, UploadFile):
+                await value.close()
+        raise ValueError(f"Expected a file in the '{field}' form field")
+    return upload
+
+
+async def read_pdf_upload(request, field: str = "file") -> UploadFile:
+    return await read_upload(request, PDF_MAX_BYTES, field)
+
+
+def _result(user_id: str, digest: str, transactions: list) -> dict:
+    """
+    The parsed statement for the response, categorized with the user's overrides.
+    Stores its rows in the user's transactions and records the new ones' recurring charges.
+    """
+    overrides = storage.get_category_overrides(user_id)
+    expenses = to_expenses(transactions, overrides, CATEGORY_LLM_FALLBACK)
+    new = storage.upsert_transactions(user_id, to_records(transactions, overrides), "pdf", digest)
+    recurring_state.record(storage, user_id, new)
+    return {"transactions": transactions, "expenses": expenses}
+
+
+def _job_view(job: dict) -> dict:
+    view = {key: value for key, value in job.items() if key not in ("user_id", "result", "file", "future", "version")}
+    if job["status"] == "done":
+        view.update(job["result"])
+    return view
+
+
+class IngestJobs:
+    """Background ingestion jobs (long PDFs, imports) with progress."""
+
+    def __init__(self, workers: int, ttl: float):
+        self.workers = workers
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Queued jobs were cancelled and will never run: fail them and release their uploads
+        with self._lock:
+            cancelled = [job for job in self._jobs.values() if job["future"] and job["future"].cancelled()]
+        for job in cancelled:
+            job["file"].close()
+            self._update(
+                job, status="failed", error="Server shutting down", finished_at=time.time(), file=None, future=None
+            )
+            self.failed += 1
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            for job_id in [j["id"] for j in self._jobs.values() if j["finished_at"] and j["finished_at"] + self.ttl < now]:
+                del self._jobs[job_id]
+
+    def _update(self, job: dict, **changes):
+        with self._lock:
+            job.update(changes)
+            job["version"] += 1
+
+    def submit(self, user_id: str, kind: str, file, work, **progress) -> dict:
+        """
+        Queue work(file, update) for `file`, which the job then owns and closes.
+        work reports progress with update(**fields) and returns the job's result;
+        `progress` holds the initial progress fields.
+        """
+        self._expire()
+        self.start()
+        job = {
+            "id": uuid.uuid4().hex, "user_id": user_id, "kind": kind, "status": "queued", **progress,
+            "error": None, "result": None, "created_at": time.time(), "finished_at": None, "file": file, "future": None,
+            "version": 0
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            job["future"] = self._executor.submit(self._run, job, work)
+        return _job_view(job)
+
+    def _run(self, job: dict, work):
+        file = job["file"]
+        try:
+            self._update(job, status="running")
+            result = work(file, lambda **fields: self._update(job, **fields))
+            self._update(job, status="done", result=result, finished_at=time.time(), file=None, future=None)
+            self.completed += 1
+        except Exception as e:
+            self._update(job, status="failed", error=str(e), finished_at=time.time(), file=None, future=None)
+            self.failed += 1
+        finally:
+            file.close()
+
+    def get(self, job_id: str, user_id: str) -> Optional[dict]:
+        """The job as the API shows it, or None if it isn't this user's (or has expired)."""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["user_id"] != user_id:
+                return None
+            return _job_view(job)
+
+    async def watch(self, job_id: str, user_id: str, interval: float = 0.25):
+        """Yield the job each time its progress changes, until it finishes."""
+        version = -1
+        while True:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["user_id"] != user_id:
+                    return
+                changed = job["version"] != version
+                version = job["version"]
+                view = _job_view(job) if changed else None
+            if view is not None:
+                yield view
+                if view["status"] in ("done", "failed"):
+                    return
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            return {"jobs": len(self._jobs), "active": active, "completed": self.completed, "failed": self.failed}
+
+
+ingest_jobs = IngestJobs(PDF_INGEST_WORKERS, PDF_JOB_TTL)
+
+
+def _parse_job(user_id: str, digest: str, pages: int, file, update) -> dict:
+    transactions = []
+    for number, page_transactions in iter_pages(file):
+        transactions.extend(page_transactions)
+        update(pages_done=number, found=len(transactions))
+    statement_cache.set(digest, pages, transactions)
+    return _result(user_id, digest, transactions)
+
+
+def _parse_if_small(file) -> tuple:
+    """
+    (digest, pages, transactions, cached). transactions is None when the statement
+    isn't cached and is too long to parse inline.
+    """
+    digest = content_hash(file)
+    statement = statement_cache.get(digest)
+    if statement is not None:
+        return digest, statement["pages"], statement["transactions"], True
+    pages = len(open_statement(file).pages)
+    if pages > PDF_SYNC_MAX_PAGES:
+        return digest, pages, None, False
+    file.seek(0)
+    transactions = []
+    for _, page_transactions in iter_pages(file):
+        transactions.extend(page_transactions)
+    statement_cache.set(digest, pages, transactions)
+    return digest, pages, transactions, False
+
+
+async def ingest_pdf(user_id: str, upload: UploadFile) -> tuple:
+    """Parse a short statement now, or start a job for a long one. Returns (status_code, body)."""
+    try:
+        digest, pages, transactions, cached = await asyncio.to_thread(_parse_if_small, upload.file)
+    except Exception:
+        await upload.close()
+        raise
+    if transactions is not None:
+        await upload.close()
+        result = await asyncio.to_thread(_result, user_id, digest, transactions)
+        return 200, {**result, "pages": pages, "cached": cached}
+    upload.file.seek(0)
+    work = functools.partial(_parse_job, user_id, digest, pages)
+    job = ingest_jobs.submit(user_id, "pdf", upload.file, work, pages=pages, pages_done=0, found=0)
+    return 202, {"job": job}
+
+
+async def read_import_upload(request, field: str = "file") -> UploadFile:
+    return await read_upload(request, IMPORT_MAX_BYTES, field)
+
+
+def start_import(user_id: str, upload: UploadFile) -> dict:
+    """Start importing a CSV/OFX/QIF upload into the user's transactions; returns the job."""
+    source = detect_format(upload.file, upload.filename)
+    import_id = uuid.uuid4().hex
+    work = functools.partial(import_statement, storage, user_id, source, import_id)
+    return ingest_jobs.submit(
+        user_id, "import", upload.file, work, format=source, import_id=import_id, rows=0, skipped=0, rows_per_second=0
+    )
@@ -1,31 +1,67 @@
-from fastapi import FastAPI, UploadFile, Depends, HTTPException, status
+from fastapi import FastAPI, Request, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from finance_agents.controller import ControllerAgent
 from finance_agents.savings_agent import SavingsGoalAgent
 from finance_agents.chat_agent import ChatAgent
-from pdf_parser import parse_bank_pdf
+from pdf_parser import PdfTooLarge, stop_parse_pool
+from ingest import UploadTooLarge, read_pdf_upload, read_import_upload, ingest_pdf, start_import, ingest_jobs
+from statement_cache import statement_cache
+from merchant_classifier import merchant_classifier
+from categorizer import categorizer
 from recurring_detector import detect_recurring_expenses
+import recurring_state
+import transactions
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import os
+import json
 
-from database import (
-    save_analysis, get_all_analyses, get_analysis_by_id,
-    save_goal, get_all_goals, update_goal, delete_goal, get_goal_by_id,
-    get_monthly_trends, get_category_trends,
-    create_user, get_user_by_email, verify_user_email, get_user_by_id,
-    create_or_update_google_user, save_chat_message, get_chat_history, clear_chat_history
-)
+from database import ensure_indexes, verify_indexes
+from storage import storage
 
 from auth import (
-    hash_password, verify_password, create_access_token, decode_access_token,
+    ahash_password, averify_password, needs_rehash, start_password_pool, stop_password_pool,
+    create_access_token, decode_access_token,
     create_email_verification_token, verify_email_token, verify_google_token
 )
 
-from email_service import send_verification_email
-
-app = FastAPI()
+from email_service import send_verification_email, outbox
+from user_cache import user_cache
+from google_certs import google_request
+import retention
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    storage.connect()
+    start_password_pool()
+    outbox.start()
+    index_task = None
+    if storage.name == "mongo":
+        # Index builds can take a while (or wait on an unreachable server); don't hold up serving.
+        index_task = asyncio.create_task(asyncio.to_thread(bootstrap_indexes))
+        if retention.RETENTION_INTERVAL_HOURS > 0:
+            # Archive old chat/analyses in the background
+            retention.start_retention_thread(retention_stop)
+
+    yield
+
+    retention_stop.set()
+    if index_task is not None:
+        index_task.cancel()
+    stop_password_pool()
+    ingest_jobs.stop()
+    stop_parse_pool()
+    outbox.stop()
+    storage.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Security
 security = HTTPBearer(auto_error=False)
@@ -46,6 +82,24 @@ chat_agent = ChatAgent()
 
 # Environment
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "2"))
+
+
+retention_stop = threading.Event()
+
+
+def bootstrap_indexes():
+    """Create missing MongoDB indexes and report any that could not be verified."""
+    try:
+        ensure_indexes()
+        problems = verify_indexes()
+        if problems:
+            for problem in problems:
+                print(f"⚠️ Index check: {problem}")
+        else:
+            print("✅ MongoDB indexes verified")
+    except Exception as e:
+        print(f"❌ Index bootstrap failed: {e}")
 
 
 # ===== PYDANTIC MODELS =====
@@ -61,6 +115,10 @@ class LoginRequest(BaseModel):
 class GoogleLoginRequest(BaseModel):
     token: str
 
+class CategoryCorrection(BaseModel):
+    description: str
+    category: str
+
 
 # ===== AUTH DEPENDENCY =====
 
@@ -84,7 +142,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     
     user_id = payload.get("sub")
-    user = get_user_by_id(user_id)
+    user = await user_cache.aget(user_id, storage.aio.get_user_by_id)
     
     if not user:
         raise HTTPException(
@@ -105,7 +163,7 @@ async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(
         payload = decode_access_token(token)
         if payload:
             user_id = payload.get("sub")
-            return get_user_by_id(user_id)
+            return await user_cache.aget(user_id, storage.aio.get_user_by_id)
     except:
         pass
     return None
@@ -116,16 +174,40 @@ def root():
     return {"status": "Agentic Finance AI Backend Running", "version": "3.0", "auth": "enabled"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the database answers a ping, 503 otherwise."""
+    try:
+        await asyncio.wait_for(storage.aio.ping(), READY_TIMEOUT_SECONDS)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Database unavailable: {e}")
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def metrics():
+    """In-process cache and queue statistics for this worker."""
+    return {
+        "user_cache": user_cache.stats(),
+        "google_certs": google_request().stats(),
+        "email_outbox": outbox.stats(),
+        "pdf_ingest": ingest_jobs.stats(),
+        "statement_cache": statement_cache.stats(),
+        "merchant_classifier": merchant_classifier.stats(),
+        "categorizer": categorizer.stats()
+    }
+
+
 # ===== AUTHENTICATION ENDPOINTS =====
 
 @app.post("/auth/signup")
-def signup(data: SignupRequest):
+async def signup(data: SignupRequest):
     """
     Sign up with email and password.
     Sends verification email to the user.
     """
     # Check if user already exists
-    existing_user = get_user_by_email(data.email)
+    existing_user = await storage.aio.get_user_by_email(data.email)
     if existing_user:
         if existing_user.get("is_verified"):
             raise HTTPException(
@@ -135,7 +217,7 @@ def signup(data: SignupRequest):
         else:
             # Resend verification email
             token = create_email_verification_token(data.email)
-            send_verification_email(data.email, token)
+            await asyncio.to_thread(send_verification_email, data.email, token)
             return {"message": "Verification email resent. Please check your inbox."}
     
     # Validate password
@@ -146,12 +228,12 @@ def signup(data: SignupRequest):
         )
     
     # Create user
-    password_hash = hash_password(data.password)
-    user_id = create_user(data.email, password_hash, is_verified=False)
+    password_hash = await ahash_password(data.password)
+    user_id = await storage.aio.create_user(data.email, password_hash, is_verified=False)
     
     # Send verification email
     token = create_email_verification_token(data.email)
-    email_sent = send_verification_email(data.email, token)
+    email_sent = await asyncio.to_thread(send_verification_email, data.email, token)
     
     return {
         "message": "Account created! Please check your email to verify your account.",
@@ -162,7 +244,7 @@ def signup(data: SignupRequest):
 
 
 @app.get("/auth/verify/{token}")
-def verify_email(token: str):
+async def verify_email(token: str):
     """Verify email from the verification link."""
     print(f"📧 Verification request received")
     print(f"   Token (first 50 chars): {token[:50]}...")
@@ -177,7 +259,7 @@ def verify_email(token: str):
             detail="Invalid or expired verification link"
         )
     
-    success = verify_user_email(email)
+    success = await storage.aio.verify_user_email(email)
     print(f"   Verification success: {success}")
     
     if not success:
@@ -192,10 +274,10 @@ def verify_email(token: str):
 
 
 @app.post("/auth/login")
-def login(data: LoginRequest):
+async def login(data: LoginRequest):
     """Login with email and password."""
     print(f"🔐 Login attempt for: {data.email}")
-    user = get_user_by_email(data.email)
+    user = await storage.aio.get_user_by_email(data.email)
     
     if not user:
         print(f"❌ User not found: {data.email}")
@@ -217,7 +299,7 @@ def login(data: LoginRequest):
             detail="This account uses Google Sign-In. Please login with Google."
         )
     
-    if not verify_password(data.password, user["password_hash"]):
+    if not await averify_password(data.password, user["password_hash"]):
         print(f"❌ Password verification failed for: {data.email}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -225,6 +307,10 @@ def login(data: LoginRequest):
         )
     print(f"✅ Password verified for: {data.email}")
     
+    # Upgrade the hash if BCRYPT_ROUNDS changed since it was made
+    if needs_rehash(user["password_hash"]):
+        await storage.aio.update_password_hash(user["_id"], await ahash_password(data.password))
+    
     # Create JWT token
     token = create_access_token(user["_id"], user["email"])
     
@@ -258,7 +344,7 @@ def google_login(data: GoogleLoginRequest):
         )
     
     # Create or update user
-    user = create_or_update_google_user(
+    user = storage.create_or_update_google_user(
         google_id=google_user["google_id"],
         email=google_user["email"],
         name=google_user.get("name", ""),
@@ -281,7 +367,7 @@ def google_login(data: GoogleLoginRequest):
 
 
 @app.get("/auth/me")
-def get_current_user_info(user: dict = Depends(get_current_user)):
+async def get_current_user_info(user: dict = Depends(get_current_user)):
     """Get current authenticated user info."""
     return {
         "id": user["_id"],
@@ -304,11 +390,19 @@ def analyze_finance(data: dict, user: dict = Depends(get_current_user)):
       expenses: [{ category, amount }]
     }
     """
-    result = controller.run(data)
+    # Typical spending per category from the user's recent transactions, for the fraud agent
+    try:
+        baseline = transactions.category_baseline(
+            transactions.recent(storage, user["_id"], transactions.FRAUD_BASELINE_MONTHS)
+        )
+    except Exception as e:
+        print(f"⚠️ Spending baseline unavailable: {e}")
+        baseline = None
+    result = controller.run(data, baseline)
     
-    # 💾 Save to MongoDB with user_id
+    # 💾 Save with user_id
     try:
-        analysis_id = save_analysis(
+        analysis_id = storage.save_analysis(
             user_id=user["_id"],
             income=data.get("income", 0),
             profile=data.get("profile", ""),
@@ -322,21 +416,46 @@ def analyze_finance(data: dict, user: dict = Depends(get_current_user)):
     return result
 
 
+MAX_PAGE_SIZE = 100
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[list]:
+    """Split a comma-separated ?fields= parameter."""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()]
+
+
 @app.get("/history")
-def get_history(limit: int = 10, user: dict = Depends(get_current_user)):
-    """Get recent analysis history from MongoDB."""
+async def get_history(
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Get analysis history, newest first.
+
+    Returns summaries (id, created_at, income, total_expenses, health_rating) unless
+    ?fields=income,result.budget_plan,... is given. Pass next_cursor back as ?cursor=
+    for the next page; load the full analysis with /history/{id}.
+    """
     try:
-        analyses = get_all_analyses(user["_id"], limit)
-        return {"history": analyses}
+        page = await storage.aio.get_analyses_page(
+            user["_id"], min(max(limit, 1), MAX_PAGE_SIZE), cursor, _parse_fields(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
+    return {"history": page["items"], "next_cursor": page["next_cursor"]}
 
 
 @app.get("/history/{analysis_id}")
-def get_single_analysis(analysis_id: str, user: dict = Depends(get_current_user)):
+async def get_single_analysis(analysis_id: str, user: dict = Depends(get_current_user)):
     """Get a specific analysis by ID."""
     try:
-        analysis = get_analysis_by_id(user["_id"], analysis_id)
+        analysis = await storage.aio.get_analysis_by_id(user["_id"], analysis_id)
         if analysis:
             return analysis
         return {"error": "Analysis not found"}
@@ -345,18 +464,71 @@ def get_single_analysis(analysis_id: str, user: dict = Depends(get_current_user)
 
 
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile):
-    expenses = parse_bank_pdf(file.file)
-    return {"expenses": expenses}
+async def upload_pdf(request: Request, user: dict = Depends(get_current_user)):
+    """Parse a bank statement PDF (multipart field "file").
+
+    Short statements are parsed straight away: {"transactions": [...] (typed rows),
+    "expenses": [...] (the debits)}. Longer ones return 202 with a job to poll at
+    /upload-pdf/jobs/{id} (or stream from /upload-pdf/jobs/{id}/events) until it is done.
+    """
+    try:
+        upload = await read_pdf_upload(request)
+        status_code, body = await ingest_pdf(user["_id"], upload)
+    except (PdfTooLarge, UploadTooLarge) as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read PDF: {e}")
+    return JSONResponse(body, status_code=status_code)
+
+
+@app.post("/import")
+async def import_transactions(request: Request, user: dict = Depends(get_current_user)):
+    """Import a CSV, OFX/QFX or QIF export (multipart field "file") into the user's transactions.
+
+    Always returns 202 with a job to poll at /import/jobs/{id}; when it is done the
+    job has {imported, skipped, seconds, rows_per_second}.
+    """
+    try:
+        upload = await read_import_upload(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read upload: {e}")
+    return JSONResponse({"job": start_import(user["_id"], upload)}, status_code=status.HTTP_202_ACCEPTED)
+
+
+@app.get("/upload-pdf/jobs/{job_id}")
+@app.get("/import/jobs/{job_id}")
+async def get_upload_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Progress of an ingestion job, with the expenses (or import counts) once it is done."""
+    job = ingest_jobs.get(job_id, user["_id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Plain JSON already; skip jsonable_encoder, which is slow on a long expense list
+    return JSONResponse(job)
+
+
+@app.get("/upload-pdf/jobs/{job_id}/events")
+@app.get("/import/jobs/{job_id}/events")
+async def stream_upload_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Server-sent events: the job each time its progress changes, ending when it finishes."""
+    if ingest_jobs.get(job_id, user["_id"]) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in ingest_jobs.watch(job_id, user["_id"]):
+            yield f"data: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 # ===== SAVINGS GOALS (Protected) =====
 
 @app.post("/goals")
-def create_goal(data: dict, user: dict = Depends(get_current_user)):
+async def create_goal(data: dict, user: dict = Depends(get_current_user)):
     """Create a new savings goal."""
     try:
-        goal_id = save_goal(
+        goal_id = await storage.aio.save_goal(
             user_id=user["_id"],
             name=data.get("name", "My Goal"),
             target=data.get("target", 0),
@@ -369,20 +541,20 @@ def create_goal(data: dict, user: dict = Depends(get_current_user)):
 
 
 @app.get("/goals")
-def list_goals(user: dict = Depends(get_current_user)):
+async def list_goals(user: dict = Depends(get_current_user)):
     """Get all savings goals for current user."""
     try:
-        goals = get_all_goals(user["_id"])
+        goals = await storage.aio.get_all_goals(user["_id"])
         return {"goals": goals}
     except Exception as e:
         return {"error": str(e)}
 
 
 @app.get("/goals/{goal_id}")
-def get_goal(goal_id: str, user: dict = Depends(get_current_user)):
+async def get_goal(goal_id: str, user: dict = Depends(get_current_user)):
     """Get a specific goal by ID."""
     try:
-        goal = get_goal_by_id(user["_id"], goal_id)
+        goal = await storage.aio.get_goal_by_id(user["_id"], goal_id)
         if goal:
             return goal
         return {"error": "Goal not found"}
@@ -391,10 +563,10 @@ def get_goal(goal_id: str, user: dict = Depends(get_current_user)):
 
 
 @app.put("/goals/{goal_id}")
-def modify_goal(goal_id: str, data: dict, user: dict = Depends(get_current_user)):
+async def modify_goal(goal_id: str, data: dict, user: dict = Depends(get_current_user)):
     """Update a savings goal."""
     try:
-        success = update_goal(user["_id"], goal_id, data)
+        success = await storage.aio.update_goal(user["_id"], goal_id, data)
         if success:
             return {"message": "Goal updated successfully"}
         return {"error": "Goal not found or no changes made"}
@@ -403,10 +575,10 @@ def modify_goal(goal_id: str, data: dict, user: dict = Depends(get_current_user)
 
 
 @app.delete("/goals/{goal_id}")
-def remove_goal(goal_id: str, user: dict = Depends(get_current_user)):
+async def remove_goal(goal_id: str, user: dict = Depends(get_current_user)):
     """Delete a savings goal."""
     try:
-        success = delete_goal(user["_id"], goal_id)
+        success = await storage.aio.delete_goal(user["_id"], goal_id)
         if success:
             return {"message": "Goal deleted successfully"}
         return {"error": "Goal not found"}
@@ -418,7 +590,7 @@ def remove_goal(goal_id: str, user: dict = Depends(get_current_user)):
 def get_goal_suggestions(goal_id: str, income: float = 0, user: dict = Depends(get_current_user)):
     """Get AI suggestions for reaching a savings goal."""
     try:
-        goal = get_goal_by_id(user["_id"], goal_id)
+        goal = storage.get_goal_by_id(user["_id"], goal_id)
         if not goal:
             return {"error": "Goal not found"}
         
@@ -444,12 +616,12 @@ def chat_endpoint(data: dict, user: dict = Depends(get_current_user)):
             return {"error": "Message is required"}
         
         # Save user message
-        save_chat_message(user["_id"], "user", message)
+        storage.save_chat_message(user["_id"], "user", message)
         
         response = chat_agent.chat(message, context)
         
         # Save assistant response
-        save_chat_message(user["_id"], "assistant", response)
+        storage.save_chat_message(user["_id"], "assistant", response)
         
         return {"response": response}
     except Exception as e:
@@ -457,20 +629,29 @@ def chat_endpoint(data: dict, user: dict = Depends(get_current_user)):
 
 
 @app.get("/chat/history")
-def get_chat_history_endpoint(limit: int = 50, user: dict = Depends(get_current_user)):
-    """Get chat history for current user."""
+async def get_chat_history_endpoint(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Get chat history for current user in chronological order.
+    Pass next_cursor back as ?cursor= to load older messages.
+    """
     try:
-        history = get_chat_history(user["_id"], limit)
-        return {"history": history}
+        page = await storage.aio.get_chat_history_page(user["_id"], min(max(limit, 1), MAX_PAGE_SIZE), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
+    return {"history": page["items"], "next_cursor": page["next_cursor"]}
 
 
 @app.post("/chat/clear")
-def clear_chat(user: dict = Depends(get_current_user)):
+async def clear_chat(user: dict = Depends(get_current_user)):
     """Clear chat history for current user."""
     chat_agent.clear_history()
-    clear_chat_history(user["_id"])
+    await storage.aio.clear_chat_history(user["_id"])
     return {"message": "Chat history cleared"}
 
 
@@ -480,33 +661,144 @@ def clear_chat(user: dict = Depends(get_current_user)):
 def detect_recurring(data: dict, user: dict = Depends(get_current_user)):
     """
     Detect recurring expenses from expense list.
-    Input: { expenses: [{ category, amount }] }
+    Input: { expenses: [{ category, amount, date? }] } or { transactions: [{ date, description, debit }] }.
+    With neither, uses the user's stored transactions from the last RECURRING_LOOKBACK_MONTHS months.
     """
     try:
-        expenses = data.get("expenses", [])
+        expenses = data.get("transactions") or data.get("expenses")
+        if not expenses:
+            expenses = transactions.recent(storage, user["_id"], transactions.RECURRING_LOOKBACK_MONTHS)
         result = detect_recurring_expenses(expenses)
         return result
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.get("/recurring")
+async def recurring(user: dict = Depends(get_current_user)):
+    """
+    Recurring expenses maintained from the user's uploaded statements and imports,
+    in the /detect-recurring shape plus updated_at (null before the first upload).
+    """
+    try:
+        return recurring_state.report(await storage.aio.get_recurring(user["_id"]))
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# ===== CATEGORIES =====
+
+@app.get("/categories")
+async def get_categories(user: dict = Depends(get_current_user)):
+    """The spending categories, and the user's corrections as { merchant: category }."""
+    return {
+        "categories": categorizer.categories,
+        "overrides": await storage.aio.get_category_overrides(user["_id"])
+    }
+
+
+@app.post("/categories/corrections")
+async def correct_category(data: CategoryCorrection, user: dict = Depends(get_current_user)):
+    """
+    Correct the category of a statement description. The correction applies to every
+    row from the same merchant in the user's later uploads. The category must be one
+    of GET /categories (case doesn't matter).
+    """
+    category = categorizer.known(data.category)
+    if category is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown category; use one of: {', '.join(categorizer.categories)}"
+        )
+    # Reference numbers and payment noise alone would make a key that matches unrelated rows
+    if not merchant_classifier.names_merchant(data.description):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Description has no merchant name")
+    merchant = merchant_classifier.merchant_key(data.description)
+    await storage.aio.set_category_override(user["_id"], merchant, category)
+    return {"merchant": merchant, "category": category}
+
+
 # ===== TRENDS & ANALYTICS (Protected) =====
 
+TREND_SOURCES = ("analyses", "transactions")
+
+
+def _check_trend_source(source: str):
+    if source not in TREND_SOURCES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="source must be analyses or transactions")
+
+
+async def _trends(user_id: str, months: int, source: str) -> dict:
+    """Trends from saved analyses, or from the user's stored transactions."""
+    if source == "transactions":
+        return await storage.aio.get_transaction_trends(user_id, months)
+    return await storage.aio.get_trends(user_id, months)
+
+
 @app.get("/trends/monthly")
-def monthly_trends(months: int = 6, user: dict = Depends(get_current_user)):
-    """Get monthly spending trends for current user."""
+async def monthly_trends(months: int = 6, source: str = "analyses", user: dict = Depends(get_current_user)):
+    """Get monthly spending trends for current user (source: "analyses" or "transactions")."""
+    _check_trend_source(source)
     try:
-        trends = get_monthly_trends(user["_id"], months)
-        return {"trends": trends}
+        trends = await _trends(user["_id"], months, source)
+        return {"trends": trends["monthly_breakdown"]}
     except Exception as e:
         return {"error": str(e)}
 
 
 @app.get("/trends/categories")
-def category_trends(months: int = 6, user: dict = Depends(get_current_user)):
-    """Get spending by category over time for current user."""
+async def category_trends(months: int = 6, source: str = "analyses", user: dict = Depends(get_current_user)):
+    """Get spending by category over time for current user (source: "analyses" or "transactions")."""
+    _check_trend_source(source)
     try:
-        trends = get_category_trends(user["_id"], months)
+        trends = await _trends(user["_id"], months, source)
         return trends
     except Exception as e:
         return {"error": str(e)}
+
+
+# ===== ARCHIVES (Protected) =====
+
+def _require_archives():
+    # Retention archives are a MongoDB feature (see retention.py)
+    if storage.name != "mongo":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Archives are not available with the {storage.name} storage backend"
+        )
+
+
+def _check_archive_kind(kind: str):
+    _require_archives()
+    if kind not in retention.KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown archive kind: {kind}"
+        )
+
+
+@app.get("/archives")
+def list_archives(user: dict = Depends(get_current_user)):
+    """List the current user's archived months of chat history and analyses."""
+    _require_archives()
+    return {"archives": retention.list_archives(user["_id"])}
+
+
+@app.get("/archives/{kind}/{month}")
+def get_archive(kind: str, month: str, user: dict = Depends(get_current_user)):
+    """Read an archived month ("YYYY-MM") of chat messages or analyses."""
+    _check_archive_kind(kind)
+    items = retention.load_archive(user["_id"], kind, month)
+    if items is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archive not found")
+    return {"kind": kind, "month": month, "items": items}
+
+
+@app.post("/archives/{kind}/{month}/restore")
+def restore_archive(kind: str, month: str, user: dict = Depends(get_current_user)):
+    """Move an archived month back into the live history."""
+    _check_archive_kind(kind)
+    restored = retention.restore_archive(user["_id"], kind, month)
+    if not restored:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archive not found")
+    return {"message": "Archive restored", "restored": restored}
@@ -0,0 +1,163 @@
+"""
+Merchant classification by keyword.
+
+Maps a transaction description to a canonical merchant ("netflix" for
+"NFLX*DIGITAL" or "UPI/NETFLIX/ref 123") and a set of labels ("subscription",
+"entertainment", "income"). The keyword and alias dictionary is compiled into a
+single word-anchored regex, so a description is scanned once however many
+keywords there are, and results are memoized per normalized description
+(lowercase words without reference numbers), which repeats far more often than
+the raw text does.
+
+Keywords match at the start of a word: "rent" matches "Rental" but not
+"Current A/c". Extra keywords and aliases can be supplied in a JSON file named by
+MERCHANT_KEYWORDS_FILE:
+    {"labels": {"subscription": ["zee5"]}, "aliases": {"zee5": ["zee 5"]}}
+which are merged into the defaults.
+
+Used by the recurring detector, the statement tokenizer (salary rows are
+credits) and the CSV importer.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+MERCHANT_KEYWORDS_FILE = os.getenv("MERCHANT_KEYWORDS_FILE")
+MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT_CACHE_SIZE", "65536"))
+
+# label -> keywords
+DEFAULT_LABELS = {
+    "subscription": [
+        "netflix", "spotify", "amazon", "prime", "hulu", "disney",
+        "subscription", "membership", "gym", "insurance", "phone",
+        "internet", "electricity", "water", "gas", "rent", "mortgage",
+        "youtube", "apple", "google", "microsoft", "adobe", "cloud"
+    ],
+    "entertainment": ["netflix", "spotify", "hulu", "disney", "youtube", "gaming"],
+    "income": ["salary"],
+}
+# canonical merchant -> other names it appears under in statements
+DEFAULT_ALIASES = {
+    "netflix": ["nflx"],
+    "spotify": ["spotify ab", "spotify india"],
+    "amazon prime": ["prime video", "amzn prime", "primevideo"],
+    "disney hotstar": ["hotstar", "disney plus hotstar"],
+    "youtube premium": ["youtube premium", "google youtube"],
+    "apple": ["apple com bill", "itunes"],
+    "microsoft": ["msft", "xbox"],
+}
+
+# Payment-rail and bank noise in statement descriptions ("UPI/NETFLIX/ref 123", "POS 4411 SPOTIFY")
+MERCHANT_NOISE = {
+    "upi", "pos", "ach", "nach", "neft", "imps", "rtgs", "ecs", "si", "emi", "ref", "txn", "trf", "transfer",
+    "payment", "paid", "to", "by", "from", "for", "debit", "card", "purchase", "autopay", "mandate", "bill",
+    "www", "com", "in", "co", "ltd", "pvt", "inc", "the", "india", "online", "recurring", "dr", "cr"
+}
+WORD = re.compile(r"[a-z0-9]+")
+REFERENCE = re.compile(r"\d{4}")  # card, account and reference numbers
+
+
+def normalize(description: str) -> str:
+    """Lowercase words of a description, without reference numbers or bare numbers."""
+    return " ".join([
+        w for w in WORD.findall(description.lower())
+        if not w.isdigit() and (len(w) < 4 or not REFERENCE.search(w))
+    ])
+
+
+def _inner_names(name: str, names) -> list:
+    """The names in `names` that occur in `name` starting at a word, other than `name` itself."""
+    starts = [0] + [i + 1 for i, char in enumerate(name) if char == " "]
+    return [
+        name[start:end] for start in starts for end in range(start + 1, len(name) + 1)
+        if (start, end) != (0, len(name)) and name[start:end] in names
+    ]
+
+
+class MerchantClassifier:
+    """Compiled keyword/alias dictionary: description -> (canonical merchant or None, labels)."""
+
+    def __init__(self, labels: dict, aliases: dict, cache_size: int = MERCHANT_CACHE_SIZE):
+        entries = {}  # normalized name -> [merchant, labels]
+        for label, keywords in labels.items():
+            for keyword in keywords:
+                entries.setdefault(normalize(keyword), [None, set()])[1].add(label)
+        for merchant, names in aliases.items():
+            for name in (merchant, *names):
+                entries.setdefault(normalize(name), [None, set()])[0] = merchant
+        entries.pop("", None)
+
+        # The regex reports only the longest name at each position, so a name also carries
+        # whatever the names inside it would have matched ("amazon prime" -> "amazon", "prime").
+        for name, entry in entries.items():
+            for other in _inner_names(name, entries):
+                merchant, other_labels = entries[other]
+                entry[0] = entry[0] or merchant
+                entry[1] |= other_labels
+        # An alias is labelled like its canonical merchant ("nflx" -> "netflix" -> entertainment)
+        canonical = {merchant: entries[normalize(merchant)][1] for merchant in aliases if normalize(merchant)}
+        self._entries = {
+            name: (merchant, frozenset(found | canonical.get(merchant, set())))
+            for name, (merchant, found) in entries.items()
+        }
+        names = sorted(self._entries, key=len, reverse=True)
+        self._pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, names)) + ")") if names else None
+        self.version = hashlib.sha256(json.dumps(
+            sorted((name, merchant, sorted(found)) for name, (merchant, found) in self._entries.items())
+        ).encode()).hexdigest()[:12]
+        self._match = lru_cache(maxsize=cache_size)(self._scan)
+
+    def _scan(self, text: str) -> tuple:
+        """(merchant, labels, grouping key) for a normalized description."""
+        merchant, labels = None, frozenset()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                found_merchant, found_labels = self._entries[match.group()]
+                merchant = merchant or found_merchant
+                labels |= found_labels
+        if merchant:
+            return merchant, labels, merchant
+        words = [w for w in text.split() if len(w) > 1 and w not in MERCHANT_NOISE]
+        return merchant, labels, " ".join(words[:3]) or text
+
+    def classify(self, description: str) -> tuple:
+        """(canonical merchant or None, frozenset of labels)."""
+        merchant, labels, _ = self._match(normalize(description))
+        return merchant, labels
+
+    def has_label(self, description: str, label: str) -> bool:
+        return label in self._match(normalize(description))[1]
+
+    def merchant_key(self, description: str) -> str:
+        """A grouping key: the canonical merchant, else the first three words that aren't payment noise."""
+        return self._match(normalize(description))[2] or description.lower().strip()
+
+    def names_merchant(self, description: str) -> bool:
+        """Whether the description has more than reference numbers and payment noise to key a merchant by."""
+        merchant, _, key = self._match(normalize(description))
+        return bool(merchant) or any(len(w) > 1 and w not in MERCHANT_NOISE for w in key.split())
+
+    def stats(self) -> dict:
+        info = self._match.cache_info()
+        return {"names": len(self._entries), "hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+def _load_dictionary() -> tuple:
+    labels = {label: list(words) for label, words in DEFAULT_LABELS.items()}
+    aliases = {merchant: list(names) for merchant, names in DEFAULT_ALIASES.items()}
+    if MERCHANT_KEYWORDS_FILE:
+        try:
+            with open(MERCHANT_KEYWORDS_FILE) as f:
+                extra = json.load(f)
+            for label, words in extra.get("labels", {}).items():
+                labels.setdefault(label, []).extend(words)
+            for merchant, names in extra.get("aliases", {}).items():
+                aliases.setdefault(merchant, []).extend(names)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Could not load merchant keywords from {MERCHANT_KEYWORDS_FILE}: {e}")
+    return labels, aliases
+
+
+merchant_classifier = MerchantClassifier(*_load_dictionary())
@@ -0,0 +1,11 @@
+"""
+Script to remove the google_id: None placeholders that email signups used to
+write, so the unique google_id index can be built. Run it once before deploying
+the index bootstrap (or before check_indexes.py). Safe to re-run.
+"""
+from database import unset_legacy_google_ids
+
+if __name__ == "__main__":
+    print("🧹 Removing legacy google_id placeholders...")
+    updated = unset_legacy_google_ids()
+    print(f"✅ Updated {updated} users")
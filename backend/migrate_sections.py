@@ -0,0 +1,10 @@
+"""
+Script to move the inline LLM `result` text of existing analyses into the
+compressed analysis_sections collection. Safe to re-run.
+"""
+from database import compress_legacy_results
+
+if __name__ == "__main__":
+    print("🗜️ Compressing legacy analysis results...")
+    migrated = compress_legacy_results()
+    print(f"✅ Migrated {migrated} analyses")
@@ -1,33 +1,239 @@
+"""
+Bank statement PDF parser.
+
+Pages are extracted and scanned one at a time, so memory stays bounded by the
+largest page rather than growing with the whole statement. Lines are read by
+statement_tokenizer, using the column layout detected on the first page.
+iter_pages() yields each page's typed transactions as soon as it is parsed;
+iter_bank_pdf() / parse_bank_pdf() give the debits as categorized expenses.
+
+Extraction is pure-Python CPU work, so statements of PDF_PARALLEL_MIN_PAGES or
+more are split into one contiguous page range per worker and extracted on a
+process pool. Workers open the statement from a file path (the upload's spooled
+file is copied to disk first), so the document is never sent to them as bytes,
+and the ranges' results are yielded back in page order.
+"""
+import hashlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain
+from typing import Iterator, Optional
+
+import pypdf
 from pypdf import PdfReader
-import re
 
-def parse_bank_pdf(file):
-    reader = PdfReader(file)
-    text = ""
+import statement_tokenizer
+from categorizer import categorizer
+from merchant_classifier import merchant_classifier
+from statement_tokenizer import StatementTokenizer, advance_balance, detect_layout, recheck_side
 
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "2000"))
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(50 * 1024 * 1024)))
+# Parallel extraction: statements with at least this many pages are split across
+# PDF_PARSE_WORKERS processes (with one worker everything stays in-process).
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "0")) or os.cpu_count() or 1
 
-    expenses = []
 
-    lines = text.split("\n")
+def _parser_version() -> str:
+    # Changes whenever the parser, the tokenizer, the merchant keywords or pypdf
+    # do, so cached parses (see statement_cache.py) from an older parser are never served.
+    digest = hashlib.sha256((pypdf.__version__ + merchant_classifier.version).encode())
+    for module in (__file__, statement_tokenizer.__file__):
+        with open(module, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
 
-    for line in lines:
-        # Match lines like: "Rent Payment 15000"
-        match = re.search(r"([A-Za-z ].+?)\s+(\d{1,3}(?:,\d{3})*)$", line)
-        if match:
-            description = match.group(1).strip()
-            amount = int(match.group(2).replace(",", ""))
 
-            # Ignore salary credits (heuristic)
-            if "salary" in description.lower():
-                continue
+PARSER_VERSION = _parser_version()
 
-            expenses.append({
-                "category": description,
-                "amount": amount
-            })
 
+class PdfTooLarge(ValueError):
+    """The statement is over the page or size cap."""
+
+
+def _file_size(file) -> Optional[int]:
+    try:
+        position = file.tell()
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def to_expenses(transactions: list, overrides: dict = None, llm: bool = False) -> list:
+    """
+    Debits as the {category, description, amount} expenses the analysis endpoints
+    take, categorized by categorizer.py (see Categorizer.categorize_all for
+    `overrides` and `llm`).
+    """
+    debits = [transaction for transaction in transactions if transaction["debit"] is not None]
+    categories = categorizer.categorize_all([transaction["description"] for transaction in debits], overrides, llm)
+    expenses = []
+    for transaction, category in zip(debits, categories):
+        expense = {"category": category, "description": transaction["description"], "amount": transaction["debit"]}
+        if transaction["date"]:
+            expense["date"] = transaction["date"]
+        expenses.append(expense)
     return expenses
+
+
+def _page_text(page, mode: str) -> str:
+    try:
+        return page.extract_text(extraction_mode=mode) or ""
+    except Exception:
+        if mode == "plain":
+            raise
+        return page.extract_text() or ""  # layout mode can't handle every font
+
+
+def open_statement(file, max_pages: int = None, max_bytes: int = None) -> PdfReader:
+    """Open a statement, enforcing the size and page caps."""
+    max_pages = max_pages or PDF_MAX_PAGES
+    max_bytes = max_bytes or PDF_MAX_BYTES
+    size = _file_size(file)
+    if size is not None and size > max_bytes:
+        raise PdfTooLarge(f"PDF is {size} bytes; the limit is {max_bytes}")
+    reader = PdfReader(file)
+    if len(reader.pages) > max_pages:
+        raise PdfTooLarge(f"PDF has {len(reader.pages)} pages; the limit is {max_pages}")
+    return reader
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def start_parse_pool() -> ProcessPoolExecutor:
+    """Return the page extraction pool, starting it on first use."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn, not fork: the parent has driver and writer threads running
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_pool
+
+
+def stop_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _parse_page_range(path: str, start: int, stop: int, layout: dict) -> tuple:
+    """
+    Transactions for each page in [start, stop), zero-based. Runs on the pool.
+    Returns (pages, (page, row) of the tokenizer's guessed row or None, running balance at the end).
+    """
+    tokenizer = StatementTokenizer(layout)
+    # An open file rather than the path: given a path, pypdf reads the whole file into memory
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        pages = [tokenizer.feed(_page_text(reader.pages[index], layout["extraction"])) for index in range(start, stop)]
+    guessed = next(
+        ((page, row) for page, rows in enumerate(pages) for row, transaction in enumerate(rows)
+         if transaction is tokenizer.guessed),
+        None
+    )
+    return pages, guessed, tokenizer.balance
+
+
+def _page_ranges(first: int, pages: int, workers: int) -> list:
+    # One range per worker, so each worker opens the document once
+    size = -(-(pages - first) // workers)
+    return [(start, min(start + size, pages)) for start in range(first, pages, size)]
+
+
+@contextmanager
+def _statement_path(file) -> Iterator[str]:
+    """A path the pool's workers can open `file` at: its own, or a temporary copy made in chunks."""
+    name = getattr(file, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield os.path.abspath(name)
+        return
+    file.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="statement-", suffix=".pdf", delete=False) as copy:
+        shutil.copyfileobj(file, copy)
+    try:
+        yield copy.name
+    finally:
+        os.unlink(copy.name)
+
+
+def _iter_pages_parallel(file, first: int, pages: int, layout: dict, balance: Optional[float]) -> Iterator[tuple]:
+    """
+    Each range starts without the running balance the sequential parser would have,
+    so the first row whose side needed it is re-checked against `balance`, the
+    balance carried over from the pages before.
+    """
+    with _statement_path(file) as path:
+        pool = start_parse_pool()
+        futures = [
+            (start, pool.submit(_parse_page_range, path, start, stop, layout))
+            for start, stop in _page_ranges(first, pages, PDF_PARSE_WORKERS)
+        ]
+        try:
+            for start, future in futures:
+                range_pages, guessed, end_balance = future.result()
+                if guessed is not None and balance is not None:
+                    page, row = guessed
+                    recheck_side(range_pages[page][row], balance)
+                if end_balance is None:
+                    for transaction in chain.from_iterable(range_pages):
+                        balance = advance_balance(
+                            balance, transaction["debit"], transaction["credit"], transaction["balance"],
+                            layout["columns"]
+                        )
+                else:
+                    balance = end_balance
+                for offset, transactions in enumerate(range_pages):
+                    yield start + offset + 1, transactions
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+
+def iter_pages(file, max_pages: int = None, max_bytes: int = None) -> Iterator[tuple]:
+    """Yield (page_number, transactions) for each page, starting at 1."""
+    reader = open_statement(file, max_pages, max_bytes)
+    pages = len(reader.pages)
+    if not pages:
+        return
+    # The layout comes from the first page in pypdf's layout mode, which keeps
+    # columns aligned; the other pages use whichever mode the layout needs.
+    first_page = _page_text(reader.pages[0], "layout")
+    layout = detect_layout(first_page)
+    tokenizer = StatementTokenizer(layout)
+    yield 1, tokenizer.feed(first_page)
+    if PDF_PARSE_WORKERS > 1 and pages >= PDF_PARALLEL_MIN_PAGES:
+        yield from _iter_pages_parallel(file, 1, pages, layout, tokenizer.balance)
+        return
+    for number in range(2, pages + 1):
+        yield number, tokenizer.feed(_page_text(reader.pages[number - 1], layout["extraction"]))
+
+
+def iter_transactions(file, max_pages: int = None, max_bytes: int = None) -> Iterator[dict]:
+    """Yield typed transactions in statement order."""
+    for _, transactions in iter_pages(file, max_pages, max_bytes):
+        yield from transactions
+
+
+def iter_bank_pdf(file, max_pages: int = None, max_bytes: int = None) -> Iterator[dict]:
+    """Yield the statement's debits as expenses, in statement order."""
+    for _, transactions in iter_pages(file, max_pages, max_bytes):
+        yield from to_expenses(transactions)
+
+
+def parse_bank_pdf(file, max_pages: int = None, max_bytes: int = None) -> list:
+    return list(iter_bank_pdf(file, max_pages, max_bytes))
@@ -1,110 +1,293 @@
 """
 Recurring Expense Detector
 
-Analyzes expense history to identify recurring charges (subscriptions, bills, etc.)
+Finds recurring charges (subscriptions, bills, EMIs) in dated transactions.
+Charges are grouped by merchant (see merchant_classifier.py), each merchant's
+amounts are clustered with a tolerance (so a price change of a few rupees stays
+in the same series), and each cluster's period is inferred from the median gap
+between consecutive charges. Clustering and interval statistics are vectorized with
+NumPy, so a user's whole history is analyzed in one pass.
+
+Expenses without a date fall back to the old heuristic: seen more than once,
+or a subscription-like name.
 """
+import os
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional
 
+import numpy as np
 
-def detect_recurring_expenses(expenses: list) -> dict:
+from merchant_classifier import merchant_classifier
+
+# A sorted amount more than this far above the previous one starts a new cluster:
+# the larger of a relative step and an absolute one (in currency units)
+AMOUNT_TOLERANCE = float(os.getenv("RECURRING_AMOUNT_TOLERANCE", "0.1"))
+AMOUNT_TOLERANCE_MIN = float(os.getenv("RECURRING_AMOUNT_TOLERANCE_MIN", "20"))
+MIN_OCCURRENCES = int(os.getenv("RECURRING_MIN_OCCURRENCES", "3"))
+MIN_CONFIDENCE = float(os.getenv("RECURRING_MIN_CONFIDENCE", "0.5"))
+
+# frequency -> (typical gap in days, shortest and longest gap that fits, months per charge or 0)
+PERIODS = {
+    "weekly": (7.0, 5, 9, 0),
+    "monthly": (30.44, 25, 36, 1),
+    "quarterly": (91.31, 80, 102, 3),
+    "annual": (365.25, 340, 390, 12),
+}
+PERIOD_NAMES = list(PERIODS)
+PERIOD_LOW = np.array([spec[1] for spec in PERIODS.values()])
+PERIOD_HIGH = np.array([spec[2] for spec in PERIODS.values()])
+
+
+# ===== NORMALIZATION =====
+
+@lru_cache(maxsize=65536)
+def _day(value: str) -> Optional[int]:
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _charge(expense: dict) -> tuple:
+    """(description, amount, day ordinal or None) for an expense or a statement row; amount is None unless it's a debit."""
+    description = expense.get("description") or expense.get("category") or "Unknown"
+    value = expense.get("date")
+    if isinstance(value, date):
+        day = value.toordinal()
+    else:
+        day = _day(str(value)) if value else None
+    amount = expense["debit"] if "debit" in expense else expense.get("amount")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return description, None, day
+    return description, amount if amount > 0 else None, day
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    for last in (31, 30, 29, 28):
+        try:
+            return date(year, month, min(day.day, last))
+        except ValueError:
+            continue
+
+
+# ===== DETECTION =====
+
+def detect_series(transactions: list, as_of: Optional[date] = None, undated: list = None) -> list:
     """
-    Analyze expenses to find recurring patterns.
-    
-    Args:
-        expenses: List of expenses [{ category, amount, date? }]
-    
-    Returns:
-        {
-            recurring: [{ category, amount, frequency, annual_cost }],
-            total_monthly: float,
-            total_annual: float,
-            suggestions: [str]
-        }
+    Recurring series in dated debits (expenses {category, amount, date} or
+    statement rows {date, description, debit}), most expensive first.
+    A series is active if its last charge is within two periods of `as_of`
+    (default: the latest date in `transactions`). Transactions without a date
+    are appended to `undated` if it is given.
     """
-    # Group expenses by category and amount
-    expense_groups = {}
-    
+    merchants, names = {}, []
+    by_description = {}  # description -> merchant code; expense lists repeat descriptions a lot
+    codes, amounts, days, rows = [], [], [], []
+    for index, transaction in enumerate(transactions):
+        description, amount, day = _charge(transaction)
+        if amount is None:
+            continue
+        if day is None:
+            if undated is not None:
+                undated.append(transaction)
+            continue
+        code = by_description.get(description)
+        if code is None:
+            key = merchant_classifier.merchant_key(description)
+            code = merchants.get(key)
+            if code is None:
+                code = merchants[key] = len(names)
+                names.append(key)
+            by_description[description] = code
+        codes.append(code)
+        amounts.append(amount)
+        days.append(day)
+        rows.append(index)
+    if not codes:
+        return []
+
+    codes, amounts = np.array(codes), np.array(amounts)
+    days, rows = np.array(days), np.array(rows)
+
+    # Amount clusters within each merchant (single linkage over sorted amounts)
+    order = np.lexsort((amounts, codes))
+    sorted_codes, sorted_amounts = codes[order], amounts[order]
+    step = np.maximum(AMOUNT_TOLERANCE * sorted_amounts[:-1], AMOUNT_TOLERANCE_MIN)
+    starts_cluster = np.r_[True, (sorted_codes[1:] != sorted_codes[:-1]) | (np.diff(sorted_amounts) > step)]
+    cluster = np.empty(len(order), dtype=np.int64)
+    cluster[order] = np.cumsum(starts_cluster) - 1
+    clusters = int(cluster.max()) + 1
+
+    # Each cluster's charges in date order, and the gaps between them
+    order = np.lexsort((days, cluster))
+    cluster, amounts, days, rows, codes = cluster[order], amounts[order], days[order], rows[order], codes[order]
+    counts = np.bincount(cluster, minlength=clusters)
+    first = np.cumsum(counts) - counts
+    last = first + counts - 1
+    within = cluster[1:] == cluster[:-1]
+    gap_cluster, gaps = cluster[1:][within], np.diff(days)[within]
+
+    # Median gap per cluster: sort gaps within their cluster and take the middle
+    order = np.lexsort((gaps, gap_cluster))
+    gap_cluster, gaps = gap_cluster[order], gaps[order]
+    gap_counts = np.bincount(gap_cluster, minlength=clusters)
+    gap_first = np.cumsum(gap_counts) - gap_counts
+    has_gaps = gap_counts > 0
+    median = np.full(clusters, np.nan)
+    low_mid = gap_first[has_gaps] + (gap_counts[has_gaps] - 1) // 2
+    high_mid = gap_first[has_gaps] + gap_counts[has_gaps] // 2
+    median[has_gaps] = (gaps[low_mid] + gaps[high_mid]) / 2
+
+    # Period whose window holds the median gap, and the share of gaps that fit it
+    fits = (median[:, None] >= PERIOD_LOW) & (median[:, None] <= PERIOD_HIGH)
+    period = np.where(fits.any(axis=1), fits.argmax(axis=1), -1)
+    gap_period = period[gap_cluster]
+    fitting = (gap_period >= 0) & (gaps >= PERIOD_LOW[gap_period]) & (gaps <= PERIOD_HIGH[gap_period])
+    regular = np.bincount(gap_cluster, weights=fitting, minlength=clusters) / np.maximum(gap_counts, 1)
+
+    # Steady amounts (coefficient of variation) and more history both raise confidence,
+    # and so does the series being most of what is paid to that merchant: a shop visited
+    # at random throws up the odd run of similar amounts a month apart by chance.
+    totals = np.bincount(cluster, weights=amounts, minlength=clusters)
+    squares = np.bincount(cluster, weights=amounts * amounts, minlength=clusters)
+    mean = totals / counts
+    spread = np.sqrt(np.maximum(squares / counts - mean * mean, 0)) / mean
+    share = counts / np.bincount(codes, minlength=len(names))[codes[first]]
+    confidence = regular * np.clip(1 - spread, 0, 1) * (1 - 0.5 ** gap_counts) * np.minimum(1, 2 * share)
+
+    as_of_day = as_of.toordinal() if as_of else int(days.max())
+    selected = np.flatnonzero((counts >= MIN_OCCURRENCES) & (period >= 0) & (confidence >= MIN_CONFIDENCE))
+    series = []
+    for c in selected:
+        end = last[c]
+        series.append(series_entry(
+            transactions[rows[end]].get("description") or transactions[rows[end]].get("category"),
+            names[codes[end]], float(amounts[end]), PERIOD_NAMES[period[c]], float(median[c]), int(counts[c]),
+            float(confidence[c]), int(days[first[c]]), int(days[end]), as_of_day
+        ))
+    series.sort(key=lambda s: s["annual_cost"], reverse=True)
+    return series
+
+
+def series_entry(category: str, merchant: str, amount: float, frequency: str, interval_days: float,
+                 occurrences: int, confidence: float, first_day: int, last_day: int, as_of_day: int) -> dict:
+    """A recurring series as the API reports it; `amount` is the latest charge, so a price change shows up."""
+    period_days, _, _, months = PERIODS[frequency]
+    amount = round(amount, 2)
+    last_date = date.fromordinal(last_day)
+    return {
+        "category": category,
+        "merchant": merchant,
+        "amount": amount,
+        "frequency": frequency,
+        "interval_days": interval_days,
+        "monthly_cost": round(amount * PERIODS["monthly"][0] / period_days, 2),
+        "annual_cost": round(amount * 365.25 / period_days, 2),
+        "occurrences": occurrences,
+        "confidence": round(confidence, 2),
+        "first_date": date.fromordinal(first_day).isoformat(),
+        "last_date": last_date.isoformat(),
+        "next_expected": (
+            _add_months(last_date, months) if months else last_date + timedelta(days=period_days)
+        ).isoformat(),
+        "active": bool(as_of_day - last_day <= 2 * period_days)
+    }
+
+
+def _undated_recurring(expenses: list) -> list:
+    """The old heuristic for expenses without dates: same name and amount more than once, or a subscription name."""
+    groups = {}
     for exp in expenses:
-        category = exp.get("category", "Unknown").lower().strip()
-        amount = exp.get("amount", 0)
-        
-        # Create a key for grouping similar expenses
-        key = f"{category}_{amount}"
-        
-        if key not in expense_groups:
-            expense_groups[key] = {
-                "category": exp.get("category", "Unknown"),
-                "amount": amount,
-                "count": 0
-            }
-        expense_groups[key]["count"] += 1
-    
-    # Identify recurring expenses (appear more than once or match subscription patterns)
-    subscription_keywords = [
-        "netflix", "spotify", "amazon", "prime", "hulu", "disney",
-        "subscription", "membership", "gym", "insurance", "phone",
-        "internet", "electricity", "water", "gas", "rent", "mortgage",
-        "youtube", "apple", "google", "microsoft", "adobe", "cloud"
-    ]
-    
+        category, amount, _ = _charge(exp)
+        key = (category.lower().strip(), amount)
+        if key not in groups:
+            groups[key] = {"category": category, "amount": amount, "count": 0}
+        groups[key]["count"] += 1
+
     recurring = []
-    
-    for key, data in expense_groups.items():
-        is_subscription = any(
-            keyword in data["category"].lower() 
-            for keyword in subscription_keywords
-        )
-        
-        # Consider it recurring if it appears multiple times OR matches subscription keywords
+    for data in groups.values():
+        is_subscription = merchant_classifier.has_label(data["category"], "subscription")
         if data["count"] > 1 or is_subscription:
-            monthly_amount = data["amount"]
-            annual_cost = monthly_amount * 12
-            
             recurring.append({
                 "category": data["category"],
-                "amount": monthly_amount,
+                "amount": data["amount"],
                 "frequency": "monthly",
-                "annual_cost": annual_cost,
-                "occurrences": data["count"]
+                "monthly_cost": data["amount"],
+                "annual_cost": data["amount"] * 12,
+                "occurrences": data["count"],
+                "confidence": None,
+                "next_expected": None,
+                "active": True
             })
-    
-    # Sort by annual cost (highest first)
-    recurring.sort(key=lambda x: x["annual_cost"], reverse=True)
-    
-    # Calculate totals
-    total_monthly = sum(r["amount"] for r in recurring)
-    total_annual = total_monthly * 12
-    
+    return recurring
+
+
+def summarize(recurring: list) -> dict:
+    """{ recurring, total_monthly, total_annual, suggestions } for a list of series."""
+    # Totals count only series that are still being charged
+    active = [r for r in recurring if r["active"]]
+    total_monthly = round(sum(r["monthly_cost"] for r in active), 2)
+    total_annual = round(total_monthly * 12, 2)
+
     # Generate suggestions
     suggestions = []
-    
+
     if total_monthly > 0:
         suggestions.append(
             f"You have ${total_monthly:.2f}/month in recurring expenses (${total_annual:.2f}/year)"
         )
-    
+
     # Find potentially unnecessary subscriptions
-    entertainment_keywords = ["netflix", "spotify", "hulu", "disney", "youtube", "gaming"]
     entertainment_subs = [
-        r for r in recurring 
-        if any(kw in r["category"].lower() for kw in entertainment_keywords)
+        r for r in active
+        if merchant_classifier.has_label(r["category"], "entertainment")
     ]
-    
+
     if len(entertainment_subs) > 2:
-        total_entertainment = sum(s["amount"] for s in entertainment_subs)
+        total_entertainment = sum(s["monthly_cost"] for s in entertainment_subs)
         suggestions.append(
             f"You have {len(entertainment_subs)} entertainment subscriptions totaling ${total_entertainment:.2f}/month. Consider consolidating."
         )
-    
+
     # High-cost recurring expenses
-    high_cost = [r for r in recurring if r["amount"] > 100]
+    high_cost = [r for r in active if r["monthly_cost"] > 100]
     if high_cost:
         suggestions.append(
             f"Review your {len(high_cost)} high-cost recurring expense(s) for potential savings."
         )
-    
+
     return {
         "recurring": recurring,
         "total_monthly": total_monthly,
         "total_annual": total_annual,
         "suggestions": suggestions
     }
+
+
+def detect_recurring_expenses(expenses: list) -> dict:
+    """
+    Analyze expenses to find recurring patterns.
+
+    Args:
+        expenses: List of expenses [{ category, amount, date? }] or statement rows
+            [{ date, description, debit }]
+
+    Returns:
+        {
+            recurring: [{ category, amount, frequency, monthly_cost, annual_cost,
+                          occurrences, confidence, next_expected, active, ... }],
+            total_monthly: float,
+            total_annual: float,
+            suggestions: [str]
+        }
+    """
+    undated = []
+    recurring = detect_series(expenses, undated=undated)
+    recurring += _undated_recurring(undated)
+    recurring.sort(key=lambda x: x["annual_cost"], reverse=True)
+    return summarize(recurring)
@@ -0,0 +1,192 @@
+"""
+Per-user recurring series, maintained as transactions arrive.
+
+PDF uploads and CSV/OFX/QIF imports pass their rows to record(). A user's state
+holds candidate series (merchant key, amount band, first and last charge,
+occurrence count, sum and sum of squares of the amounts, the latest
+RECURRING_WINDOW charges and the period estimated from them) and a charge count
+per merchant. A new charge joins the series of its merchant whose amount band it
+falls in, with the tolerance recurring_detector.py clusters by, so an update
+costs O(new rows) plus loading and saving the state. The series that look
+recurring are scored as in detect_series (with the regularity of the gaps taken
+from the recent window) each time the state is saved, and stored next to it, so
+GET /recurring reads just those, without the state or any history.
+
+The state is saved with a version check and re-applied on a conflict, so two
+uploads finishing together don't lose each other's charges. A charge already in
+its series' window (same day and amount) is skipped, so uploading the same
+statement twice doesn't count it twice. Past RECURRING_MAX_SERIES, the series
+with fewer than MIN_OCCURRENCES charges and the oldest last charge go first.
+"""
+import bisect
+import math
+import os
+import statistics
+from datetime import date
+from typing import Optional
+
+from merchant_classifier import merchant_classifier
+from recurring_detector import (
+    AMOUNT_TOLERANCE, AMOUNT_TOLERANCE_MIN, MIN_CONFIDENCE, MIN_OCCURRENCES, PERIODS, _charge, series_entry, summarize
+)
+
+RECURRING_WINDOW = int(os.getenv("RECURRING_WINDOW", "12"))
+RECURRING_MAX_SERIES = int(os.getenv("RECURRING_MAX_SERIES", "20000"))
+RECURRING_SAVE_RETRIES = int(os.getenv("RECURRING_SAVE_RETRIES", "5"))
+
+
+def new_state() -> dict:
+    return {"series": [], "merchants": {}}
+
+
+def _step(amount: float) -> float:
+    return max(AMOUNT_TOLERANCE * amount, AMOUNT_TOLERANCE_MIN)
+
+
+# ===== UPDATES =====
+
+def _new_series(merchant: str, description: str, amount: float, day: int) -> dict:
+    return {
+        "merchant": merchant, "category": description, "amount": amount, "low": amount, "high": amount,
+        "first_day": day, "last_day": day, "occurrences": 0, "total": 0.0, "squares": 0.0,
+        "recent": [], "frequency": None, "interval_days": None, "regular": 0.0
+    }
+
+
+def _add(series: dict, description: str, amount: float, day: int):
+    bisect.insort(series["recent"], [day, amount])
+    if len(series["recent"]) > RECURRING_WINDOW:
+        del series["recent"][0]
+    series["occurrences"] += 1
+    series["total"] += amount
+    series["squares"] += amount * amount
+    series["low"], series["high"] = min(series["low"], amount), max(series["high"], amount)
+    series["first_day"] = min(series["first_day"], day)
+    if day >= series["last_day"]:
+        series["last_day"], series["category"], series["amount"] = day, description, amount
+
+
+def _merge(series: dict, other: dict):
+    """Fold `other` into `series` (a charge fell in both their bands)."""
+    for field in ("occurrences", "total", "squares"):
+        series[field] += other[field]
+    series["low"], series["high"] = min(series["low"], other["low"]), max(series["high"], other["high"])
+    series["first_day"] = min(series["first_day"], other["first_day"])
+    if other["last_day"] > series["last_day"]:
+        for field in ("last_day", "category", "amount"):
+            series[field] = other[field]
+    series["recent"] = sorted(series["recent"] + other["recent"])[-RECURRING_WINDOW:]
+
+
+def _fit(series: dict):
+    """Median gap of the recent charges, the period it falls in and the share of gaps that fit it."""
+    days = [day for day, _ in series["recent"]]
+    gaps = [b - a for a, b in zip(days, days[1:])]
+    series["frequency"], series["interval_days"], series["regular"] = None, None, 0.0
+    if not gaps:
+        return
+    median = statistics.median(gaps)
+    series["interval_days"] = float(median)
+    for name, (_, low, high, _) in PERIODS.items():
+        if low <= median <= high:
+            series["frequency"] = name
+            series["regular"] = sum(1 for gap in gaps if low <= gap <= high) / len(gaps)
+            return
+
+
+def apply(state: dict, transactions: list) -> int:
+    """Add the dated debits in `transactions` to `state` in place. Returns how many charges were new."""
+    by_merchant = {}
+    for series in state["series"]:
+        by_merchant.setdefault(series["merchant"], []).append(series)
+    merchants = state["merchants"]
+    touched = {}
+    added = 0
+    for transaction in transactions:
+        description, amount, day = _charge(transaction)
+        if amount is None or day is None:
+            continue
+        amount = round(amount, 2)
+        key = transaction.get("merchant") or merchant_classifier.merchant_key(description)
+        candidates = by_merchant.setdefault(key, [])
+        matches = [s for s in candidates if s["low"] - _step(amount) <= amount <= s["high"] + _step(s["high"])]
+        if not matches:
+            series = _new_series(key, description, amount, day)
+            candidates.append(series)
+        else:
+            series = matches[0]
+            for other in matches[1:]:
+                _merge(series, other)
+                candidates.remove(other)
+                touched.pop(id(other), None)
+                touched[id(series)] = series
+            if [day, amount] in series["recent"]:
+                continue
+        _add(series, description, amount, day)
+        merchants[key] = merchants.get(key, 0) + 1
+        touched[id(series)] = series
+        added += 1
+
+    for series in touched.values():
+        _fit(series)
+    state["series"] = [series for candidates in by_merchant.values() for series in candidates]
+    if len(state["series"]) > RECURRING_MAX_SERIES:
+        state["series"].sort(key=lambda s: (s["occurrences"] >= MIN_OCCURRENCES, s["last_day"]), reverse=True)
+        del state["series"][RECURRING_MAX_SERIES:]
+    return added
+
+
+def record(store, user_id: str, transactions: list) -> Optional[dict]:
+    """
+    Fold new statement rows or expenses into the user's saved state and return it.
+    Called from ingestion worker threads; never raises, so an upload doesn't fail
+    because its recurring charges couldn't be recorded.
+    """
+    try:
+        for _ in range(RECURRING_SAVE_RETRIES):
+            saved = store.get_recurring_state(user_id)
+            state = saved["state"] if saved else new_state()
+            if not apply(state, transactions):
+                return state
+            if store.save_recurring_state(user_id, state, saved["version"] if saved else 0, view(state)):
+                return state
+        print(f"⚠️ Recurring state for user {user_id} kept changing; {len(transactions)} rows not recorded")
+    except Exception as e:
+        print(f"⚠️ Recurring state update failed: {e}")
+    return None
+
+
+# ===== READS =====
+
+def view(state: dict, as_of: Optional[date] = None) -> list:
+    """
+    The series in `state` that look recurring, most expensive first, in the shape
+    detect_series returns. Active is judged against `as_of` (default: the latest charge).
+    """
+    if not state["series"]:
+        return []
+    as_of_day = as_of.toordinal() if as_of else max(series["last_day"] for series in state["series"])
+    recurring = []
+    for series in state["series"]:
+        count = series["occurrences"]
+        if count < MIN_OCCURRENCES or series["frequency"] is None:
+            continue
+        mean = series["total"] / count
+        spread = math.sqrt(max(series["squares"] / count - mean * mean, 0)) / mean
+        share = count / state["merchants"][series["merchant"]]
+        confidence = series["regular"] * min(max(1 - spread, 0), 1) * (1 - 0.5 ** (count - 1)) * min(1, 2 * share)
+        if confidence < MIN_CONFIDENCE:
+            continue
+        recurring.append(series_entry(
+            series["category"], series["merchant"], series["amount"], series["frequency"], series["interval_days"],
+            count, confidence, series["first_day"], series["last_day"], as_of_day
+        ))
+    recurring.sort(key=lambda s: s["annual_cost"], reverse=True)
+    return recurring
+
+
+def report(saved: Optional[dict]) -> dict:
+    """The /detect-recurring response for the series saved with the state (storage.get_recurring), plus updated_at."""
+    result = summarize(saved["recurring"] if saved else [])
+    result["updated_at"] = saved["updated_at"] if saved else None
+    return result
@@ -0,0 +1,293 @@
+"""
+Retention tiers for chat history and analyses.
+
+Chat messages older than CHAT_RETENTION_DAYS and analyses older than
+ANALYSES_RETENTION_MONTHS are moved out of the hot collections into
+`archives`: compressed bundles per (user, kind, month), split into numbered parts
+of at most ARCHIVE_PART_BYTES (raw BSON) so a heavy month never reaches MongoDB's
+16 MB document limit. Hot collections and their indexes stay small, while archives
+can be listed, read or restored on demand.
+
+Trends are unaffected: they read monthly_rollups, which archiving never touches.
+Each analyses part also carries a numeric summary, so rollups can still be
+rebuilt and checked from archived months (see database._history_months).
+
+Run periodically with `python retention.py`, or in-app by setting
+RETENTION_INTERVAL_HOURS; a lease in `job_leases` keeps it to one worker at a time.
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import bson
+from bson.binary import Binary
+from pymongo.errors import DuplicateKeyError
+
+from compression import pack, unpack
+from database import (
+    db, archives_collection, analyses_collection, sections_collection, chat_history_collection,
+    _sections_document, _as_number, _category_name, _encode_category
+)
+
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "90"))
+ANALYSES_RETENTION_MONTHS = int(os.getenv("ANALYSES_RETENTION_MONTHS", "12"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "0"))  # 0 = don't run in-app
+BATCH_SIZE = 1000
+# Raw (uncompressed) BSON per archive part; compressed parts stay well below 16 MB
+ARCHIVE_PART_BYTES = int(os.getenv("ARCHIVE_PART_BYTES", str(8 * 1024 * 1024)))
+
+KINDS = ("chat", "analyses")
+
+leases_collection = db["job_leases"]
+_worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+
+# ===== ARCHIVE BUNDLES =====
+
+def _summarize_analyses(docs: list) -> dict:
+    """Numeric totals of archived analyses, in rollup shape (encoded category keys)."""
+    summary = {"total_income": 0, "total_expenses": 0, "analyses_count": 0, "categories": {}}
+    for doc in docs:
+        summary["total_income"] += _as_number(doc.get("income", 0))
+        summary["analyses_count"] += 1
+        for exp in doc.get("expenses", []):
+            amount = _as_number(exp.get("amount", 0))
+            key = _encode_category(_category_name(exp.get("category")))
+            summary["categories"][key] = summary["categories"].get(key, 0) + amount
+            summary["total_expenses"] += amount
+    return summary
+
+
+def _bundle_parts(user_id: str, kind: str, month: str) -> list:
+    """The (user, kind, month) archive parts in order (bundles written before parts existed count as part 0)."""
+    parts = archives_collection.find({"user_id": user_id, "kind": kind, "month": month})
+    return sorted(parts, key=lambda part: part.get("part", 0))
+
+
+def _split(items: list, limit: int) -> list:
+    """Cut `items` into consecutive chunks of at most `limit` encoded bytes (at least one item each)."""
+    chunks, chunk, size = [], [], 0
+    for item in items:
+        item_size = len(bson.encode(item))
+        if chunk and size + item_size > limit:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _write_part(user_id: str, kind: str, month: str, number: int, items: list, _id=None):
+    codec, data, raw_size = pack(items)
+    bundle = {
+        "user_id": user_id,
+        "kind": kind,
+        "month": month,
+        "part": number,
+        "count": len(items),
+        "codec": codec,
+        "data": Binary(data),
+        "raw_size": raw_size,
+        "updated_at": datetime.utcnow()
+    }
+    if kind == "analyses":
+        bundle["summary"] = _summarize_analyses(items)
+    where = {"_id": _id} if _id is not None else {"user_id": user_id, "kind": kind, "month": month, "part": number}
+    archives_collection.replace_one(where, bundle, upsert=True)
+
+
+def _write_bundle(user_id: str, kind: str, month: str, docs: list):
+    """
+    Append `docs` to the (user, kind, month) archive: fill up the last part, then
+    start new ones. Earlier parts are never rewritten, so a crash can only leave
+    documents both archived and hot, which the next run's merge drops.
+    """
+    parts = _bundle_parts(user_id, kind, month)
+    seen = set()
+    for part in parts:
+        seen.update(item["_id"] for item in unpack(bytes(part["data"]), part["codec"]))
+    new = sorted(
+        (doc for doc in docs if doc["_id"] not in seen),
+        key=lambda item: (item["created_at"], item["_id"])
+    )
+    if not new:
+        return
+
+    last, items = None, []
+    if parts and parts[-1]["raw_size"] < ARCHIVE_PART_BYTES:
+        last = parts.pop()
+        items = unpack(bytes(last["data"]), last["codec"])
+    number = len(parts)
+    for i, chunk in enumerate(_split(items + new, ARCHIVE_PART_BYTES)):
+        # Only the first chunk replaces the reopened last part; the rest are new parts
+        _write_part(user_id, kind, month, number + i, chunk, last["_id"] if last and i == 0 else None)
+
+
+def _archive(collection, kind: str, cutoff: datetime) -> int:
+    """Move documents older than `cutoff` into archive bundles. Returns the number moved."""
+    moved = 0
+    while True:
+        docs = list(collection.find({"created_at": {"$lt": cutoff}}).sort(
+            [("user_id", 1), ("created_at", 1), ("_id", 1)]
+        ).limit(BATCH_SIZE))
+        if not docs:
+            return moved
+
+        if kind == "analyses":
+            # Inline the compressed sections so the bundle is self-contained
+            sections = {
+                s["_id"]: s for s in sections_collection.find({"_id": {"$in": [d["_id"] for d in docs]}})
+            }
+            for doc in docs:
+                section = sections.get(doc["_id"])
+                doc.pop("result_ref", None)
+                if section is not None:
+                    doc["result"] = unpack(bytes(section["data"]), section["codec"])
+
+        groups = {}
+        for doc in docs:
+            groups.setdefault((doc["user_id"], doc["created_at"].strftime("%Y-%m")), []).append(doc)
+
+        for (user_id, month), group in groups.items():
+            # Write the bundle before deleting, so a crash can only leave a duplicate
+            # that the next run's merge drops.
+            _write_bundle(user_id, kind, month, group)
+            ids = [doc["_id"] for doc in group]
+            collection.delete_many({"_id": {"$in": ids}})
+            if kind == "analyses":
+                sections_collection.delete_many({"_id": {"$in": ids}})
+            moved += len(group)
+
+
+def archive_chat_history(days: int = CHAT_RETENTION_DAYS) -> int:
+    """Archive chat messages older than `days`."""
+    return _archive(chat_history_collection, "chat", datetime.utcnow() - timedelta(days=days))
+
+
+def archive_analyses(months: int = ANALYSES_RETENTION_MONTHS) -> int:
+    """Archive analyses older than `months` (30-day) months."""
+    return _archive(analyses_collection, "analyses", datetime.utcnow() - timedelta(days=months * 30))
+
+
+def run_retention() -> dict:
+    """Apply both retention tiers. Returns how many documents each one moved."""
+    return {"chat": archive_chat_history(), "analyses": archive_analyses()}
+
+
+# ===== REHYDRATION =====
+
+def list_archives(user_id: str) -> list:
+    """The user's archived months (without their contents), oldest first."""
+    cursor = archives_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": {"kind": "$kind", "month": "$month"},
+            "count": {"$sum": "$count"},
+            "raw_size": {"$sum": "$raw_size"},
+            "parts": {"$sum": 1},
+            "updated_at": {"$max": "$updated_at"}
+        }},
+        {"$sort": {"_id.kind": 1, "_id.month": 1}}
+    ])
+    return [
+        {"kind": row["_id"]["kind"], "month": row["_id"]["month"],
+         **{field: row[field] for field in ("count", "raw_size", "parts", "updated_at")}}
+        for row in cursor
+    ]
+
+
+def load_archive(user_id: str, kind: str, month: str) -> list:
+    """Decompress one archived month and return its documents (None if it was never archived)."""
+    parts = _bundle_parts(user_id, kind, month)
+    if not parts:
+        return None
+    items = [item for part in parts for item in unpack(bytes(part["data"]), part["codec"])]
+    items.sort(key=lambda item: (item["created_at"], item["_id"]))
+    for item in items:
+        item["_id"] = str(item["_id"])
+    return items
+
+
+def _restore_items(kind: str, items: list):
+    from pymongo import ReplaceOne
+
+    if kind == "analyses":
+        section_writes, analysis_writes = [], []
+        for item in items:
+            result = item.pop("result", None)
+            if result is not None:
+                sections = _sections_document(item["_id"], item["user_id"], result)
+                section_writes.append(ReplaceOne({"_id": item["_id"]}, sections, upsert=True))
+                item["result_ref"] = {
+                    "codec": sections["codec"],
+                    "raw_size": sections["raw_size"],
+                    "compressed_size": len(sections["data"])
+                }
+            analysis_writes.append(ReplaceOne({"_id": item["_id"]}, item, upsert=True))
+        if section_writes:
+            sections_collection.bulk_write(section_writes, ordered=False)
+        if analysis_writes:
+            analyses_collection.bulk_write(analysis_writes, ordered=False)
+    else:
+        writes = [ReplaceOne({"_id": item["_id"]}, item, upsert=True) for item in items]
+        if writes:
+            chat_history_collection.bulk_write(writes, ordered=False)
+
+
+def restore_archive(user_id: str, kind: str, month: str) -> int:
+    """
+    Move an archived month back into the hot collections and delete it, one part at a time.
+    Restored documents keep their IDs, so existing links keep working.
+    """
+    restored = 0
+    for part in _bundle_parts(user_id, kind, month):
+        items = unpack(bytes(part["data"]), part["codec"])
+        _restore_items(kind, items)
+        archives_collection.delete_one({"_id": part["_id"]})
+        restored += len(items)
+    return restored
+
+
+# ===== SCHEDULING =====
+
+def _acquire_lease(name: str, seconds: float) -> bool:
+    """Take (or renew) a named lease so only one worker runs a job at a time."""
+    now = datetime.utcnow()
+    try:
+        leases_collection.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": _worker_id}]},
+            {"$set": {"owner": _worker_id, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # held by another worker
+
+
+def start_retention_thread(stop: threading.Event) -> threading.Thread:
+    """Run retention every RETENTION_INTERVAL_HOURS until `stop` is set."""
+    interval = RETENTION_INTERVAL_HOURS * 3600
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                if _acquire_lease("retention", interval):
+                    moved = run_retention()
+                    print(f"🗄️ Retention archived {moved['chat']} chat messages, {moved['analyses']} analyses")
+            except Exception as e:
+                print(f"❌ Retention run failed: {e}")
+
+    thread = threading.Thread(target=loop, name="retention", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    print(f"🗄️ Archiving chat older than {CHAT_RETENTION_DAYS} days "
+          f"and analyses older than {ANALYSES_RETENTION_MONTHS} months...")
+    moved = run_retention()
+    print(f"✅ Archived {moved['chat']} chat messages and {moved['analyses']} analyses")
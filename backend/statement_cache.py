@@ -0,0 +1,93 @@
+"""
+Cache of parsed bank statements, keyed by a SHA-256 of the uploaded PDF.
+
+People re-upload the same statement (after a refresh, from another device), and
+each upload used to run the full text extraction again. Parsed results are kept
+in an in-process LRU (PDF_CACHE_SIZE statements of up to PDF_CACHE_MAX_ROWS
+transactions) and, with PDF_CACHE_PERSIST=true, in the storage backend's
+parsed_statements table/collection, where they expire after
+PARSE_CACHE_TTL_DAYS.
+
+Keys are prefixed with pdf_parser.PARSER_VERSION, so a change to the parser (or
+a pypdf upgrade) makes older entries unreachable; they then age out.
+"""
+import hashlib
+import os
+from typing import Optional
+
+from pdf_parser import PARSER_VERSION
+from storage import storage
+from user_cache import MemoryBackend
+
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "32"))
+PDF_CACHE_MAX_ROWS = int(os.getenv("PDF_CACHE_MAX_ROWS", "20000"))
+PDF_CACHE_TTL = float(os.getenv("PDF_CACHE_TTL", "86400"))  # in-process entries
+PDF_CACHE_PERSIST = os.getenv("PDF_CACHE_PERSIST", "false").lower() == "true"
+
+
+def content_hash(file, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's contents, read in chunks. Leaves the file at the start."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class StatementCache:
+    """content hash -> {"pages": n, "transactions": [...]}"""
+
+    def __init__(self, store, max_size: int, persist: bool):
+        self.store = store
+        self.persist = persist
+        self._memory = MemoryBackend(max_size)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, digest: str) -> str:
+        return f"{PARSER_VERSION}:{digest}"
+
+    def get(self, digest: str) -> Optional[dict]:
+        key = self._key(digest)
+        statement = self._memory.get(key)
+        if statement is None and self.persist:
+            try:
+                statement = self.store.get_parsed_statement(key)
+            except Exception as e:
+                print(f"⚠️ Statement cache read failed: {e}")
+            if statement is not None:
+                self._remember(key, statement)
+        if statement is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return statement
+
+    def _remember(self, key: str, statement: dict):
+        if len(statement["transactions"]) <= PDF_CACHE_MAX_ROWS:
+            self._memory.set(key, statement, PDF_CACHE_TTL)
+
+    def set(self, digest: str, pages: int, transactions: list):
+        key = self._key(digest)
+        statement = {"pages": pages, "transactions": transactions}
+        self._remember(key, statement)
+        if self.persist:
+            try:
+                self.store.save_parsed_statement(key, statement)
+            except Exception as e:
+                print(f"⚠️ Statement cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": self._memory.size(),
+            "persistent": self.persist,
+            "parser_version": PARSER_VERSION
+        }
+
+
+statement_cache = StatementCache(storage, PDF_CACHE_SIZE, PDF_CACHE_PERSIST)
@@ -0,0 +1,339 @@
+"""
+Streaming import of CSV, OFX and QIF statement exports.
+
+Banks and finance apps export years of history as CSV or OFX (older software:
+QIF). The upload is read incrementally from its spooled file, each row is
+normalized to the statement tokenizer's shape ({date, description, debit,
+credit, balance}), and rows are upserted into the user's transactions (see
+transactions.py) in ordered batches of IMPORT_BATCH_SIZE, so memory stays flat
+however long the file is. Rows already stored by an earlier upload are counted
+as duplicates. New dated debits are also folded into the user's recurring series
+(see recurring_state.py) every IMPORT_RECURRING_ROWS of them.
+
+Rows that can't be read (no date, no amount, footers and totals) are counted as
+skipped. An import that fails part way keeps the batches already written; they
+carry its import_id.
+"""
+import csv
+import html
+import io
+import math
+import os
+import re
+import time
+from datetime import date
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Optional
+
+import recurring_state
+import transactions
+from merchant_classifier import merchant_classifier
+from statement_tokenizer import HEADER_WORDS, NUMERIC_DATE, parse_amount, parse_date
+
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_RECURRING_ROWS = int(os.getenv("IMPORT_RECURRING_ROWS", "20000"))
+QIF_DATE_ORDER = os.getenv("QIF_DATE_ORDER", "mdy")  # Quicken writes US dates unless a day is over 12
+CSV_HEADER_ROWS = 20  # exports often start with a few lines of account details
+SAMPLE_ROWS = 200  # rows read ahead to work out the date order and how amounts are signed
+
+FORMATS = {"csv": "csv", "txt": "csv", "ofx": "ofx", "qfx": "ofx", "qif": "qif"}
+
+# CSV header words -> column, on top of the PDF statement ones
+CSV_HEADER_WORDS = {
+    **HEADER_WORDS,
+    "payee": "description", "merchant": "description", "name": "description", "memo": "description",
+    "type": "type", "dt": "date", "withdrawn": "debit", "paid": "debit", "received": "credit",
+}
+# When a header cell has several known words ("Withdrawal Amt", "Transaction Date"), the first of these wins
+COLUMN_PRIORITY = ("date", "debit", "credit", "balance", "type", "amount", "description")
+TYPE_WORDS = {
+    "dr": "debit", "d": "debit", "debit": "debit", "withdrawal": "debit", "payment": "debit",
+    "cr": "credit", "c": "credit", "credit": "credit", "deposit": "credit",
+}
+HEADER_WORD = re.compile(r"[a-z]+")
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+# ===== FORMAT =====
+
+def detect_format(file, filename: str = None) -> str:
+    """"csv", "ofx" or "qif", from the file extension or else the first few KB."""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if extension in FORMATS:
+        return FORMATS[extension]
+    head = file.read(4096).decode("utf-8-sig", errors="replace").lstrip()
+    file.seek(0)
+    if head.startswith("OFXHEADER") or "<OFX>" in head.upper():
+        return "ofx"
+    if head.startswith("!"):
+        return "qif"
+    return "csv"
+
+
+def _text(file) -> io.TextIOWrapper:
+    return io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def _date_order(values, default: str) -> str:
+    """"dmy" or "mdy" for a run of dates: whichever a day over 12 gives away, else `default`."""
+    for value in values:
+        match = NUMERIC_DATE.match(value)
+        if not match or len(match.group(1)) == 4:
+            continue
+        if int(match.group(1)) > 12:
+            return "dmy"
+        if int(match.group(2)) > 12:
+            return "mdy"
+    return default
+
+
+@lru_cache(maxsize=4096)  # exports repeat each date for every transaction that day
+def _date(value: str, order: str) -> Optional[str]:
+    value = value.strip().replace("'", "/")
+    return parse_date(value.split(), order)[0] if value else None
+
+
+def _amount(value: str) -> Optional[tuple]:
+    value = value.strip().replace(" ", "")
+    if not value:
+        return None
+    try:
+        # Most exports write plain numbers; float() is much cheaper than the statement pattern
+        number = float(value)
+    except ValueError:
+        return parse_amount(value)
+    if not math.isfinite(number):
+        return None
+    return round(abs(number), 2), ("debit" if number < 0 else "credit" if value[0] == "+" else None)
+
+
+def _row(day: str, description: str, debit=None, credit=None, balance=None) -> dict:
+    return {"date": day, "description": description, "debit": debit, "credit": credit, "balance": balance}
+
+
+# ===== CSV =====
+
+def _header_columns(cells: list) -> Optional[dict]:
+    """column -> cell indexes ("description" may span several) if `cells` is a header row."""
+    columns = {}
+    for index, cell in enumerate(cells):
+        words = HEADER_WORD.findall(cell.lower())
+        if "dr" in words and "cr" in words:
+            kinds = {"type"}
+        else:
+            kinds = {CSV_HEADER_WORDS[word] for word in words if word in CSV_HEADER_WORDS}
+        for column in COLUMN_PRIORITY:
+            if column in kinds:
+                columns.setdefault(column, []).append(index)
+                break
+    if "date" in columns and columns.keys() & {"amount", "debit", "credit"}:
+        return columns
+    return None
+
+
+def _cell(cells: list, indexes: Optional[list]) -> str:
+    return cells[indexes[0]] if indexes and indexes[0] < len(cells) else ""
+
+
+def iter_csv(file) -> iter:
+    """Statement rows from a CSV export (None for each row that isn't a transaction)."""
+    sample = file.read(64 * 1024).decode("utf-8-sig", errors="replace")
+    file.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(_text(file), dialect)
+
+    columns = None
+    for cells in islice(reader, CSV_HEADER_ROWS):
+        columns = _header_columns(cells)
+        if columns:
+            break
+    if columns is None:
+        raise ValueError(f"No header with a date and an amount column in the first {CSV_HEADER_ROWS} rows")
+
+    ahead = list(islice(reader, SAMPLE_ROWS))
+    order = _date_order((_cell(cells, columns["date"]) for cells in ahead), None)
+    # A single amount column either signs its debits (so unsigned amounts are
+    # credits) or holds unsigned debits, as the PDF tokenizer assumes.
+    signed = "amount" in columns and any(
+        (parsed := _amount(_cell(cells, columns["amount"]))) and parsed[1] for cells in ahead
+    )
+    descriptions = columns.get("description", [])
+
+    for cells in chain(ahead, reader):
+        day = _date(_cell(cells, columns["date"]), order)
+        if day is None:
+            yield None
+            continue
+        description = " ".join(cells[i].strip() for i in descriptions if i < len(cells) and cells[i].strip())
+        debit = _amount(_cell(cells, columns.get("debit")))
+        credit = _amount(_cell(cells, columns.get("credit")))
+        balance = _amount(_cell(cells, columns.get("balance")))
+        balance = None if balance is None else (-balance[0] if balance[1] == "debit" else balance[0])
+        if debit and debit[0]:
+            yield _row(day, description, debit=debit[0], balance=balance)
+        elif credit and credit[0]:
+            yield _row(day, description, credit=credit[0], balance=balance)
+        elif "amount" in columns and (amount := _amount(_cell(cells, columns["amount"]))) and amount[0]:
+            side = TYPE_WORDS.get(_cell(cells, columns.get("type")).strip().lower()) or amount[1]
+            if side is None:
+                side = "credit" if signed or merchant_classifier.has_label(description, "income") else "debit"
+            yield _row(day, description, balance=balance, **{side: amount[0]})
+        else:
+            yield None
+
+
+# ===== OFX =====
+
+def _ofx_date(value: str) -> Optional[str]:
+    """YYYYMMDD[HHMMSS[.XXX]][TZ] -> ISO date."""
+    try:
+        return date(int(value[:4]), int(value[4:6]), int(value[6:8])).isoformat()
+    except ValueError:
+        return None
+
+
+def _ofx_row(fields: dict) -> Optional[dict]:
+    day = _ofx_date(fields.get("DTPOSTED", ""))
+    amount = fields.get("TRNAMT", "").replace(" ", "")
+    if "." not in amount:
+        amount = amount.replace(",", ".")  # some exporters write a decimal comma
+    try:
+        value = round(float(amount), 2)
+    except ValueError:
+        return None
+    if day is None or not value:
+        return None
+    name, memo = fields.get("NAME", ""), fields.get("MEMO", "")
+    description = f"{name} {memo}" if name and memo and memo != name else name or memo
+    if value < 0:
+        return _row(day, description, debit=-value)
+    return _row(day, description, credit=value)
+
+
+def iter_ofx(file, chunk_size: int = 64 * 1024) -> iter:
+    """Statement rows from an OFX/QFX file (SGML 1.x or XML 2.x), read a chunk at a time."""
+    text = _text(file)
+    fields = None
+    pending = ""
+    while True:
+        chunk = text.read(chunk_size)
+        pending += chunk
+        # Only parse up to the last "<": the text after it may continue in the next chunk
+        cut = pending.rfind("<") if chunk else len(pending)
+        if cut <= 0 and chunk:
+            continue
+        for match in OFX_TAG.finditer(pending, 0, cut):
+            closing, tag, value = match.groups()
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if fields is not None:  # also ends a transaction whose closing tag was left out
+                    yield _ofx_row(fields)
+                fields = None if closing else {}
+            elif closing and tag == "BANKTRANLIST" and fields is not None:
+                yield _ofx_row(fields)
+                fields = None
+            elif fields is not None and not closing and value.strip():
+                fields[tag] = html.unescape(value.strip())
+        pending = pending[cut:]
+        if not chunk:
+            return
+
+
+# ===== QIF =====
+
+def _qif_records(text) -> iter:
+    """{field code: value} for each "^"-terminated record of a QIF file."""
+    record = {}
+    for line in text:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("!"):
+            continue
+        if line[0] == "^":
+            if record:
+                yield record
+            record = {}
+        else:
+            record.setdefault(line[0], line[1:].strip())
+    if record:
+        yield record
+
+
+def iter_qif(file) -> iter:
+    """Statement rows from a QIF file; records without a date and an amount (accounts, categories) are skipped."""
+    records = _qif_records(_text(file))
+    ahead = list(islice(records, SAMPLE_ROWS))
+    order = _date_order((record.get("D", "").replace(" ", "").replace("'", "/") for record in ahead), QIF_DATE_ORDER)
+    for record in chain(ahead, records):
+        day = _date(record.get("D", "").replace(" ", ""), order)
+        amount = _amount(record.get("T") or record.get("U") or "")
+        if day is None or not amount or not amount[0]:
+            yield None
+            continue
+        payee, memo = record.get("P", ""), record.get("M", "")
+        description = f"{payee} {memo}" if payee and memo else payee or memo
+        yield _row(day, description, **{amount[1] or "credit": amount[0]})
+
+
+# ===== IMPORT =====
+
+READERS = {"csv": iter_csv, "ofx": iter_ofx, "qif": iter_qif}
+
+
+def import_statement(store, user_id: str, source: str, import_id: str, file, update=None) -> dict:
+    """
+    Read `file` as `source` ("csv"/"ofx"/"qif") and upsert its rows into the
+    user's transactions in batches. `update(**progress)` is called after each
+    batch (see ingest.IngestJobs).
+    Returns {format, imported, duplicates, skipped, seconds, rows_per_second}.
+    """
+    start = time.perf_counter()
+    imported = duplicates = skipped = 0
+    batch, charges = [], []
+    overrides = store.get_category_overrides(user_id)
+    seen = {}
+
+    def flush():
+        nonlocal imported, duplicates, skipped, batch, charges
+        records = transactions.to_records(batch, overrides, seen)
+        skipped += len(batch) - len(records)
+        new = store.upsert_transactions(user_id, records, source, import_id)
+        imported += len(new)
+        duplicates += len(records) - len(new)
+        charges += [record for record in new if record["amount"] > 0 and record["date"]]
+        if len(charges) >= IMPORT_RECURRING_ROWS:
+            recurring_state.record(store, user_id, charges)
+            charges = []
+        batch = []
+        if update:
+            elapsed = time.perf_counter() - start
+            update(
+                rows=imported, duplicates=duplicates, skipped=skipped,
+                rows_per_second=round(imported / elapsed) if elapsed else 0
+            )
+
+    for row in READERS[source](file):
+        if row is None:
+            skipped += 1
+            continue
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    if charges:
+        recurring_state.record(store, user_id, charges)
+
+    seconds = time.perf_counter() - start
+    return {
+        "format": source,
+        "imported": imported,
+        "duplicates": duplicates,
+        "skipped": skipped,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(imported / seconds) if seconds else 0
+    }
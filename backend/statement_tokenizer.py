@@ -0,0 +1,416 @@
+"""
+Line tokenizer for bank statement text.
+
+Each line is split into whitespace-separated tokens in one pass, and tokens are
+classified with small anchored patterns that only ever look at one token, so
+the work per line is linear in its length (no backtracking across the line).
+A line reads as: an optional leading date, the description, then the amount
+columns.
+
+detect_layout() reads the statement's column layout once per document, from
+the header row on its first page ("Date  Description  Debit  Credit  Balance",
+"Date Particulars Amount", ...), or from the shape of the rows when there is no
+header. When the text comes from pypdf's layout extraction mode, columns stay
+aligned and amounts are assigned to columns by position; otherwise by count,
+Dr/Cr markers and signs, and the running balance.
+
+Rows come out typed: {date, description, debit, credit, balance}, with dates as
+ISO strings and missing values as None.
+"""
+import os
+import re
+from datetime import date
+from typing import Optional
+
+from merchant_classifier import merchant_classifier
+
+STATEMENT_DATE_ORDER = os.getenv("STATEMENT_DATE_ORDER", "dmy")  # how to read 03/04/2024: "dmy" or "mdy"
+
+# Rows that restate the balance rather than record a transaction, and summary rows
+BALANCE_ROWS = ("opening balance", "closing balance", "balance brought forward", "balance carried forward",
+                "balance b/f", "balance c/f", "brought forward", "carried forward")
+SUMMARY_ROWS = ("total", "grand total", "sub total", "subtotal")
+
+TOKEN = re.compile(r"\S+")
+LETTER = re.compile(r"[^\W\d_]")
+AMOUNT = re.compile(
+    r"(\()?([+-])?(Rs\.?|INR|[₹$€£])?([+-])?(\d{1,3}(?:,\d{2,3})+|\d{1,10})(?:\.(\d{1,2}))?(\))?(Cr|CR|cr|Dr|DR|dr)?"
+)
+# Longer bare integers (no grouping, decimals or currency mark) are account numbers,
+# customer IDs and the like, not amounts
+MAX_PLAIN_DIGITS = 7
+NUMERIC_DATE = re.compile(r"(\d{1,4})[/.-](\d{1,2})[/.-](\d{2,4})")
+NAMED_DATE = re.compile(r"(\d{1,2})[/.-]?([A-Za-z]{3,9})\.?(?:[/.-]?(\d{4}|\d{2}))?,?")
+MONTHS = {name: number for number, name in enumerate(
+    ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+)}
+MARKERS = {"cr": "credit", "dr": "debit"}
+PLACEHOLDERS = {"-", "--", "—", "nil", "NIL"}
+
+# Header words -> column. "amount" is a single signed/marked amount column.
+HEADER_WORDS = {
+    "date": "date", "dated": "date",
+    "description": "description", "particulars": "description", "narration": "description",
+    "details": "description", "remarks": "description", "transaction": "description",
+    "debit": "debit", "debits": "debit", "withdrawal": "debit", "withdrawals": "debit", "dr": "debit", "out": "debit",
+    "credit": "credit", "credits": "credit", "deposit": "credit", "deposits": "credit", "cr": "credit", "in": "credit",
+    "balance": "balance", "bal": "balance",
+    "amount": "amount", "amt": "amount",
+}
+AMOUNT_COLUMNS = ("amount", "debit", "credit", "balance")
+
+
+# ===== TOKENS =====
+
+def _iso_date(day: int, month: int, year: Optional[int]) -> Optional[str]:
+    if year is None:
+        return None
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def parse_date(tokens: list, order: str = None) -> tuple:
+    """
+    (iso_date, tokens_used, leftover) for a date at the start of `tokens`, or
+    (None, 0, None). `leftover` is text glued to the end of the date token.
+    `order` ("dmy"/"mdy") defaults to STATEMENT_DATE_ORDER.
+    """
+    if not tokens or not tokens[0][:1].isdigit():
+        return None, 0, None
+    first = tokens[0]
+    match = NUMERIC_DATE.match(first)
+    if match:
+        a, b, c = (int(part) for part in match.groups())
+        if len(match.group(1)) == 4:
+            value = _iso_date(c, b, a)
+        elif (order or STATEMENT_DATE_ORDER) == "mdy":
+            value = _iso_date(b, a, c)
+        else:
+            value = _iso_date(a, b, c)
+        if value:
+            return value, 1, first[match.end():] or None
+        return None, 0, None
+
+    match = NAMED_DATE.match(first)
+    if match and match.group(2)[:3].lower() in MONTHS:
+        day, month = int(match.group(1)), MONTHS[match.group(2)[:3].lower()]
+        if match.group(3):
+            return _iso_date(day, month, int(match.group(3))), 1, first[match.end():] or None
+    elif first.isdigit() and len(first) <= 2 and len(tokens) > 2 and tokens[1][:3].lower() in MONTHS:
+        # "25 Mar 2024"
+        day, month = int(first), MONTHS[tokens[1][:3].lower()]
+        year = tokens[2].rstrip(",")
+        if len(year) == 4 and year.isdigit():
+            return _iso_date(day, month, int(year)), 3, None
+    return None, 0, None
+
+
+def parse_amount(token: str) -> Optional[tuple]:
+    """(value, side) for an amount token; side is "debit"/"credit" when a sign or Dr/Cr says so."""
+    match = AMOUNT.fullmatch(token)
+    if not match:
+        return None
+    open_paren, sign, currency, inner_sign, whole, cents, close_paren, marker = match.groups()
+    if bool(open_paren) != bool(close_paren):
+        return None
+    if "," not in whole and len(whole) > MAX_PLAIN_DIGITS and not (cents or currency):
+        return None
+    value = int(whole.replace(",", ""))
+    if cents:
+        value = round(value + int(cents) / 10 ** len(cents), 2)
+    sign = sign or inner_sign
+    if marker:
+        side = MARKERS[marker.lower()]
+    elif open_paren or sign == "-":
+        side = "debit"
+    elif sign == "+":
+        side = "credit"
+    else:
+        side = None
+    return value, side
+
+
+# ===== LAYOUT =====
+
+def _header_cells(line: str) -> list:
+    """
+    [(column, start, end)] if `line` looks like a table header, else []. Words one
+    space apart are one cell ("Closing Balance", "Withdrawal Amt."); cells that
+    aren't a known column (reference numbers, ...) are "other".
+    """
+    cells = []
+    known = 0
+    words = 0
+    for match in TOKEN.finditer(line):
+        words += 1
+        column = HEADER_WORDS.get(match.group().strip(".:()").lower(), "other")
+        if column != "other":
+            known += 1
+        if cells and match.start() - cells[-1][2] == 1:
+            previous = cells[-1][0]
+            if previous == "other" or column == "other" or previous == column or (
+                column == "amount" and previous in ("debit", "credit")
+            ):
+                merged = column if previous == "other" else previous
+                cells[-1] = (merged, cells[-1][1], match.end())
+                continue
+        cells.append((column, match.start(), match.end()))
+    columns = {cell[0] for cell in cells}
+    if known * 2 < words or not columns & set(AMOUNT_COLUMNS) or not columns & {"date", "description"}:
+        return []
+    return cells
+
+
+def detect_layout(text: str, positional: bool = True) -> dict:
+    """
+    The column layout of a statement, from the text of its first page.
+
+    { columns: amount columns in line order, e.g. ["debit", "credit", "balance"],
+      zones: [(column, left, right)] character ranges of the amount columns when
+             they have to be told apart by position and `positional` (the text
+             keeps column alignment), else None,
+      extraction: pypdf extraction mode the rest of the document should use,
+      dated: rows carry a leading date, so lines without one (account numbers,
+             phone numbers, ... in headers and footers) aren't transactions }
+    """
+    lines = text.splitlines()
+    for line in lines:
+        cells = _header_cells(line)
+        if cells:
+            break
+    else:
+        cells = []
+
+    # Dated under a Date header whose rows do carry dates (not every statement with
+    # one repeats the date on each row), or without a header when most rows do
+    amount_lines = [words for words in (line.split() for line in lines) if _trailing_amounts(words, 1)]
+    dated_lines = sum(1 for words in amount_lines if parse_date(words[:3])[0])
+    if any(cell[0] == "date" for cell in cells):
+        dated = dated_lines > 0
+    else:
+        dated = dated_lines > 0 and dated_lines * 2 >= len(amount_lines)
+
+    if cells:
+        columns = [cell[0] for cell in cells if cell[0] in AMOUNT_COLUMNS]
+        if "amount" in columns and ("debit" in columns or "credit" in columns):
+            columns.remove("amount")
+        columns = list(dict.fromkeys(columns))
+    else:
+        # No header: one trailing amount per row, or amount + running balance
+        counts = [len(_trailing_amounts([m.group() for m in TOKEN.finditer(line)], 2)) for line in lines]
+        counts = [count for count in counts if count]
+        columns = ["amount", "balance"] if counts and counts.count(2) * 2 > len(counts) else ["amount"]
+
+    # Separate debit and credit columns can only be told apart by position
+    extraction = "layout" if "debit" in columns and "credit" in columns else "plain"
+    zones = None
+    if cells and positional and extraction == "layout":
+        centers = [((start + end) / 2, column) for column, start, end in cells]
+        zones = []
+        for i, (center, column) in enumerate(centers):
+            if column not in columns:
+                continue
+            left = (centers[i - 1][0] + center) / 2 if i else 0
+            right = (center + centers[i + 1][0]) / 2 if i + 1 < len(centers) else float("inf")
+            zones.append((column, left, right))
+    return {"columns": columns, "zones": zones, "extraction": extraction, "dated": dated}
+
+
+def _trailing_amounts(words: list, limit: int) -> list:
+    """Up to `limit` amount tokens at the end of `words` (markers and placeholders skipped)."""
+    found = []
+    for word in reversed(words):
+        if len(found) == limit:
+            break
+        if word.lower() in MARKERS or word in PLACEHOLDERS:
+            continue
+        if parse_amount(word) is None:
+            break
+        found.append(word)
+    return found
+
+
+DEFAULT_LAYOUT = {"columns": ["amount"], "zones": None, "extraction": "plain", "dated": False}
+
+
+# ===== ROWS =====
+
+def advance_balance(running: Optional[float], debit, credit, balance, columns: list) -> Optional[float]:
+    """The running balance after a row: its own balance, else the last one moved by its amount."""
+    if balance is not None:
+        return balance
+    if running is not None and "balance" in columns:
+        return round(running + (credit or 0) - (debit or 0), 2)
+    return running
+
+
+def recheck_side(row: dict, running: float):
+    """
+    Re-decide the side of a row StatementTokenizer guessed (see .guessed) now that
+    the running balance before it is known, as _side would have. Edits `row` in place.
+    """
+    value = row["debit"] if row["debit"] is not None else row["credit"]
+    if abs(running - value - row["balance"]) < 0.005:
+        row["debit"], row["credit"] = value, None
+    elif abs(running + value - row["balance"]) < 0.005:
+        row["debit"], row["credit"] = None, value
+
+
+class StatementTokenizer:
+    """Turns statement text into typed rows, using one layout for the whole document."""
+
+    def __init__(self, layout: dict = None):
+        self.layout = layout or DEFAULT_LAYOUT
+        self.columns = self.layout["columns"]
+        self.zones = self.layout.get("zones")
+        self.dated = self.layout.get("dated", False)
+        self.balance = None  # running balance, for telling debits from credits
+        # The first row whose side was guessed because there was no running balance yet,
+        # though the row has one (a tokenizer starting mid-document, see pdf_parser)
+        self.guessed = None
+
+    def feed(self, text: str) -> list:
+        """Rows for one page of text."""
+        rows = []
+        for line in text.splitlines():
+            row = self.parse_line(line)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def _zone(self, start: int, end: int) -> Optional[str]:
+        center = (start + end) / 2
+        for column, left, right in self.zones:
+            if left <= center < right:
+                return column
+        return None
+
+    def _amounts(self, words: list, spans: Optional[list], first: int) -> tuple:
+        """
+        Amount cells at the end of the line, scanning back no further than
+        words[first]. Returns (cells, index of the first amount word) with
+        cells as [(column or None, value, side)] in line order.
+        """
+        cells = []
+        marker = None
+        index = len(words)
+        while index > first and len(cells) < len(self.columns):
+            word = words[index - 1]
+            lowered = word.lower()
+            if lowered in MARKERS and marker is None:
+                marker = MARKERS[lowered]
+                index -= 1
+                continue
+            column = None
+            if spans is not None:
+                column = self._zone(*spans[index - 1])
+                if column is None or any(cell[0] == column for cell in cells):
+                    break
+            if word in PLACEHOLDERS:
+                index -= 1
+                continue
+            parsed = parse_amount(word)
+            if parsed is None:
+                break
+            value, side = parsed
+            cells.append((column, value, marker or side))
+            marker = None
+            index -= 1
+        cells.reverse()
+        return cells, index
+
+    def _assign(self, cells: list) -> dict:
+        """Map amount cells to debit/credit/balance when the text has no column positions."""
+        assigned = {}
+        columns = self.columns
+        if len(cells) == len(columns):
+            return {column: cell for column, cell in zip(columns, cells)}
+        if "balance" in columns and len(cells) >= 2:
+            assigned["balance"] = cells[-1]
+            cells = cells[:-1]
+        value_columns = [column for column in columns if column != "balance"]
+        for column, cell in zip(value_columns, cells):
+            assigned[column] = cell
+        if len(cells) == 1 and len(value_columns) > 1:
+            # One of debit/credit is empty; which one is decided from the amount
+            assigned = {key: cell for key, cell in assigned.items() if key == "balance"}
+            assigned["amount"] = cells[0]
+        return assigned
+
+    def _side(self, value, side: Optional[str], balance, lowered: str) -> str:
+        if side:
+            return side
+        if self.balance is not None and balance is not None:
+            if abs(self.balance - value - balance) < 0.005:
+                return "debit"
+            if abs(self.balance + value - balance) < 0.005:
+                return "credit"
+        # No balance to check against: a debit unless the description is income (salary)
+        return "credit" if merchant_classifier.has_label(lowered, "income") else "debit"
+
+    def parse_line(self, line: str) -> Optional[dict]:
+        """A typed row, or None for lines that aren't transactions."""
+        if self.zones is None:
+            words, spans = line.split(), None
+        else:
+            matches = list(TOKEN.finditer(line))
+            words, spans = [match.group() for match in matches], [match.span() for match in matches]
+        if not words:
+            return None
+        row_date, used, leftover = parse_date(words[:3])
+        cells, amounts_at = self._amounts(words, spans, used)
+        if not cells:
+            return None
+
+        words = words[used:amounts_at]
+        if leftover:
+            words.insert(0, leftover)
+        description = " ".join(words)
+        if not LETTER.search(description):
+            return None
+
+        if self.zones is not None:
+            assigned = {column: (column, value, side) for column, value, side in cells}
+        else:
+            assigned = self._assign(cells)
+
+        balance = None
+        if "balance" in assigned:
+            _, value, side = assigned["balance"]
+            balance = -value if side == "debit" else value
+
+        lowered = description.lower()
+        if lowered.startswith(SUMMARY_ROWS):
+            return None
+        if lowered.startswith(BALANCE_ROWS):
+            if balance is not None or len(cells) == 1:
+                self.balance = balance if balance is not None else cells[0][1]
+            return None
+        if self.dated and row_date is None:
+            return None
+
+        debit = credit = None
+        if "debit" in assigned:
+            debit = assigned["debit"][1]
+        if "credit" in assigned:
+            credit = assigned["credit"][1]
+        guessed = False
+        if "amount" in assigned:
+            _, value, side = assigned["amount"]
+            guessed = side is None and self.balance is None and balance is not None
+            if self._side(value, side, balance, lowered) == "credit":
+                credit = value
+            else:
+                debit = value
+        if debit is None and credit is None:
+            return None
+
+        self.balance = advance_balance(self.balance, debit, credit, balance, self.columns)
+        row = {"date": row_date, "description": description, "debit": debit, "credit": credit, "balance": balance}
+        if guessed and self.guessed is None:
+            self.guessed = row
+        return row
@@ -0,0 +1,27 @@
+"""
+Storage backends.
+
+STORAGE_BACKEND selects where the API keeps its data:
+- "mongo" (default): MongoDB, see database.py / async_database.py
+- "sqlite": an embedded SQLite file at SQLITE_PATH, no server needed
+"""
+import os
+
+from storage.base import StorageBackend
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "finance.db")
+
+
+def create_storage(backend: str = None) -> StorageBackend:
+    backend = backend or STORAGE_BACKEND
+    if backend == "mongo":
+        from storage.mongo import MongoStorage
+        return MongoStorage()
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(SQLITE_PATH)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage()
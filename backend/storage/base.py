@@ -0,0 +1,196 @@
+"""
+The storage interface the API is written against.
+
+Every backend exposes the same operations with the same document shapes as
+database.py: string `_id`s, datetime timestamps and the { items, next_cursor }
+page format. Sync endpoints call the backend directly; async endpoints use
+`backend.aio`, which has the same methods as coroutines. The email outbox,
+parsed statement, transaction and recurring state operations are only used
+from worker threads and are sync-only, except reading the reported recurring
+series and transaction reads.
+"""
+import asyncio
+from datetime import date, datetime
+from typing import Optional
+
+
+class StorageBackend:
+    name = None
+
+    @property
+    def aio(self):
+        """Async view of this backend. By default every call runs in a worker thread."""
+        if getattr(self, "_aio", None) is None:
+            self._aio = ThreadedAsync(self)
+        return self._aio
+
+    # ===== LIFECYCLE =====
+
+    def connect(self):
+        """Open connections and prepare the schema. Called from the app lifespan."""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def ping(self) -> bool:
+        """Round-trip to the store; raises if it is unreachable."""
+        raise NotImplementedError
+
+    # ===== USERS =====
+
+    def create_user(self, email: str, password_hash: str, is_verified: bool = False) -> str:
+        raise NotImplementedError
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_user_by_google_id(self, google_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def verify_user_email(self, email: str) -> bool:
+        raise NotImplementedError
+
+    def create_or_update_google_user(self, google_id: str, email: str, name: str = "", picture: str = "") -> dict:
+        raise NotImplementedError
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> bool:
+        raise NotImplementedError
+
+    # ===== ANALYSES =====
+
+    def save_analysis(self, user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
+        raise NotImplementedError
+
+    def get_analyses_page(self, user_id: str, limit: int = 10, cursor: str = None, fields: list = None) -> dict:
+        """Newest first; raises ValueError for a bad cursor or unknown fields."""
+        raise NotImplementedError
+
+    def get_analysis_by_id(self, user_id: str, analysis_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    # ===== SAVINGS GOALS =====
+
+    def save_goal(self, user_id: str, name: str, target: float, current: float = 0, deadline: str = None) -> str:
+        raise NotImplementedError
+
+    def get_all_goals(self, user_id: str) -> list:
+        raise NotImplementedError
+
+    def get_goal_by_id(self, user_id: str, goal_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_goal(self, user_id: str, goal_id: str, updates: dict) -> bool:
+        raise NotImplementedError
+
+    def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        raise NotImplementedError
+
+    # ===== CHAT HISTORY =====
+
+    def save_chat_message(self, user_id: str, role: str, content: str) -> str:
+        raise NotImplementedError
+
+    def get_chat_history_page(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        """Chronological page; next_cursor pages further back in time."""
+        raise NotImplementedError
+
+    def clear_chat_history(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    # ===== EMAIL OUTBOX =====
+
+    def enqueue_email(self, recipient: str, subject: str, text: str, html: str) -> str:
+        raise NotImplementedError
+
+    def claim_emails(self, limit: int, lease_seconds: float) -> list:
+        """Due emails, oldest first; each claim counts as an attempt and hides the email for the lease."""
+        raise NotImplementedError
+
+    def mark_email_sent(self, email_id: str):
+        raise NotImplementedError
+
+    def mark_email_failed(self, email_id: str, error: str, retry_at: Optional[datetime] = None):
+        """Retry at `retry_at`, or give up (status "failed") if it is None."""
+        raise NotImplementedError
+
+    # ===== PARSED STATEMENTS =====
+
+    def get_parsed_statement(self, key: str) -> Optional[dict]:
+        """A cached {pages, transactions} parse result, or None."""
+        raise NotImplementedError
+
+    def save_parsed_statement(self, key: str, statement: dict):
+        """Store a parse result; the backend drops it after PARSE_CACHE_TTL_DAYS."""
+        raise NotImplementedError
+
+    # ===== TRANSACTIONS =====
+
+    def upsert_transactions(self, user_id: str, records: list, source: str, import_id: str) -> list:
+        """
+        Store transaction records (see transactions.py), skipping fingerprints the user
+        already has. Returns the records that were new.
+        """
+        raise NotImplementedError
+
+    def get_transactions(self, user_id: str, start: date, end: Optional[date] = None, category: str = None) -> list:
+        """Transactions dated from `start` up to (not including) `end`, oldest first, dates as "YYYY-MM-DD"."""
+        raise NotImplementedError
+
+    def count_transactions(self, user_id: str) -> int:
+        raise NotImplementedError
+
+    def get_transaction_trends(self, user_id: str, months: int = 6) -> dict:
+        """get_trends over stored transactions: spending per category and month, with income and counts."""
+        raise NotImplementedError
+
+    # ===== RECURRING STATE =====
+
+    def get_recurring(self, user_id: str) -> Optional[dict]:
+        """{ recurring, updated_at }: the series last reported from the user's state, or None."""
+        raise NotImplementedError
+
+    def get_recurring_state(self, user_id: str) -> Optional[dict]:
+        """{ state, version } for the user's recurring series (see recurring_state.py), or None."""
+        raise NotImplementedError
+
+    def save_recurring_state(self, user_id: str, state: dict, version: int, recurring: list) -> bool:
+        """
+        Replace the state and its reported series if the state is still at `version`
+        (0: none saved yet), bumping the version. False if another writer got there first.
+        """
+        raise NotImplementedError
+
+    # ===== CATEGORY OVERRIDES =====
+
+    def get_category_overrides(self, user_id: str) -> dict:
+        """{merchant key: category} from the user's corrections (see categorizer.py)."""
+        raise NotImplementedError
+
+    def set_category_override(self, user_id: str, merchant: str, category: str):
+        """Save a correction; the merchant's stored spending is re-labelled too."""
+        raise NotImplementedError
+
+    # ===== TRENDS =====
+
+    def get_trends(self, user_id: str, months: int = 6) -> dict:
+        """{ categories: {cat: total}, monthly_breakdown: [month, ...] } for the last `months` months."""
+        raise NotImplementedError
+
+
+class ThreadedAsync:
+    """Coroutine versions of a sync backend's methods, run with asyncio.to_thread."""
+
+    def __init__(self, backend: StorageBackend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        method = getattr(self._backend, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
@@ -0,0 +1,161 @@
+"""
+MongoDB storage backend: the functions in database.py (sync) and
+async_database.py (Motor) behind the StorageBackend interface.
+
+Maintenance that only exists for MongoDB (indexes, rollup backfill and checks,
+retention archives) stays in those modules.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+import async_database
+import database
+from storage.base import StorageBackend
+
+
+class MongoStorage(StorageBackend):
+    name = "mongo"
+
+    @property
+    def aio(self):
+        return async_database  # same function names, native async driver
+
+    # ===== LIFECYCLE =====
+
+    def connect(self):
+        # Creating the clients does no network I/O; pools connect in the background.
+        database.get_client()
+        async_database.get_client()
+        database.chat_log_writer.start()
+
+    def close(self):
+        # Write out any chat messages still buffered before the clients go away
+        database.chat_log_writer.close()
+        async_database.close_client()
+        database.close_client()
+
+    def ping(self) -> bool:
+        database.get_client().admin.command("ping")
+        return True
+
+    # ===== USERS =====
+
+    def create_user(self, email: str, password_hash: str, is_verified: bool = False) -> str:
+        return database.create_user(email, password_hash, is_verified)
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        return database.get_user_by_email(email)
+
+    def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        return database.get_user_by_id(user_id)
+
+    def get_user_by_google_id(self, google_id: str) -> Optional[dict]:
+        return database.get_user_by_google_id(google_id)
+
+    def verify_user_email(self, email: str) -> bool:
+        return database.verify_user_email(email)
+
+    def create_or_update_google_user(self, google_id: str, email: str, name: str = "", picture: str = "") -> dict:
+        return database.create_or_update_google_user(google_id, email, name, picture)
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> bool:
+        return database.update_password_hash(user_id, password_hash)
+
+    # ===== ANALYSES =====
+
+    def save_analysis(self, user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
+        return database.save_analysis(user_id, income, profile, expenses, result)
+
+    def get_analyses_page(self, user_id: str, limit: int = 10, cursor: str = None, fields: list = None) -> dict:
+        return database.get_analyses_page(user_id, limit, cursor, fields)
+
+    def get_analysis_by_id(self, user_id: str, analysis_id: str) -> Optional[dict]:
+        return database.get_analysis_by_id(user_id, analysis_id)
+
+    # ===== SAVINGS GOALS =====
+
+    def save_goal(self, user_id: str, name: str, target: float, current: float = 0, deadline: str = None) -> str:
+        return database.save_goal(user_id, name, target, current, deadline)
+
+    def get_all_goals(self, user_id: str) -> list:
+        return database.get_all_goals(user_id)
+
+    def get_goal_by_id(self, user_id: str, goal_id: str) -> Optional[dict]:
+        return database.get_goal_by_id(user_id, goal_id)
+
+    def update_goal(self, user_id: str, goal_id: str, updates: dict) -> bool:
+        return database.update_goal(user_id, goal_id, updates)
+
+    def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        return database.delete_goal(user_id, goal_id)
+
+    # ===== CHAT HISTORY =====
+
+    def save_chat_message(self, user_id: str, role: str, content: str) -> str:
+        return database.save_chat_message(user_id, role, content)
+
+    def get_chat_history_page(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        return database.get_chat_history_page(user_id, limit, cursor)
+
+    def clear_chat_history(self, user_id: str) -> bool:
+        return database.clear_chat_history(user_id)
+
+    # ===== EMAIL OUTBOX =====
+
+    def enqueue_email(self, recipient: str, subject: str, text: str, html: str) -> str:
+        return database.enqueue_email(recipient, subject, text, html)
+
+    def claim_emails(self, limit: int, lease_seconds: float) -> list:
+        return database.claim_emails(limit, lease_seconds)
+
+    def mark_email_sent(self, email_id: str):
+        database.mark_email_sent(email_id)
+
+    def mark_email_failed(self, email_id: str, error: str, retry_at: Optional[datetime] = None):
+        database.mark_email_failed(email_id, error, retry_at)
+
+    # ===== PARSED STATEMENTS =====
+
+    def get_parsed_statement(self, key: str) -> Optional[dict]:
+        return database.get_parsed_statement(key)
+
+    def save_parsed_statement(self, key: str, statement: dict):
+        database.save_parsed_statement(key, statement)
+
+    # ===== TRANSACTIONS =====
+
+    def upsert_transactions(self, user_id: str, records: list, source: str, import_id: str) -> list:
+        return database.upsert_transactions(user_id, records, source, import_id)
+
+    def get_transactions(self, user_id: str, start: date, end: Optional[date] = None, category: str = None) -> list:
+        return database.get_transactions(user_id, start, end, category)
+
+    def count_transactions(self, user_id: str) -> int:
+        return database.count_transactions(user_id)
+
+    def get_transaction_trends(self, user_id: str, months: int = 6) -> dict:
+        return database.get_transaction_trends(user_id, months)
+
+    # ===== RECURRING STATE =====
+
+    def get_recurring(self, user_id: str) -> Optional[dict]:
+        return database.get_recurring(user_id)
+
+    def get_recurring_state(self, user_id: str) -> Optional[dict]:
+        return database.get_recurring_state(user_id)
+
+    def save_recurring_state(self, user_id: str, state: dict, version: int, recurring: list) -> bool:
+        return database.save_recurring_state(user_id, state, version, recurring)
+
+    # ===== CATEGORY OVERRIDES =====
+
+    def get_category_overrides(self, user_id: str) -> dict:
+        return database.get_category_overrides(user_id)
+
+    def set_category_override(self, user_id: str, merchant: str, category: str):
+        database.set_category_override(user_id, merchant, category)
+
+    # ===== TRENDS =====
+
+    def get_trends(self, user_id: str, months: int = 6) -> dict:
+        return database.get_trends(user_id, months)
@@ -0,0 +1,682 @@
+"""
+Embedded SQLite storage backend.
+
+Runs the whole API without a MongoDB server: benchmarks, tests and small
+single-node deployments. The database is a single file in WAL mode, so readers
+never block the writer, and every thread gets its own connection.
+
+Documents have the same shapes database.py returns. IDs are ObjectId hex strings,
+so keyset cursors work the same way, and result sections are stored compressed
+in their own table. Trends are aggregated in SQL: analysis_expenses holds one row
+per expense line, indexed by (user_id, month, category).
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from bson.objectid import ObjectId
+
+from compression import pack, unpack
+from database import (
+    PARSE_CACHE_TTL_DAYS, _history_projection, _wants_result, _attach_sections,
+    _cursor_position, _keyset_result, _extract_health_rating, _as_number, _category_name,
+    _first_month, _merge_trends, _summarize_categories, _transaction_trends
+)
+from storage.base import StorageBackend
+from user_cache import user_cache
+
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+# NORMAL is safe from corruption in WAL mode; a power loss can drop the last commits
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT,
+    is_verified INTEGER NOT NULL DEFAULT 0,
+    google_id TEXT UNIQUE,
+    name TEXT,
+    picture TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    income,
+    profile TEXT,
+    expenses TEXT NOT NULL,
+    total_expenses NUMERIC NOT NULL,
+    health_rating TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_user_created ON analyses (user_id, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS analysis_sections (
+    id TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    raw_size INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analysis_expenses (
+    analysis_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    amount NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_expenses_user_month
+    ON analysis_expenses (user_id, month, category, amount);
+
+CREATE TABLE IF NOT EXISTS savings_goals (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT,
+    target NUMERIC,
+    current NUMERIC,
+    deadline TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS savings_goals_user_created ON savings_goals (user_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS chat_history (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_history_user_created ON chat_history (user_id, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    text TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TEXT NOT NULL,
+    last_error TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS email_outbox_due ON email_outbox (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS parsed_statements (
+    key TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parsed_statements_created ON parsed_statements (created_at);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date TEXT,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    balance REAL,
+    category TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    source TEXT NOT NULL,
+    import_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_user_date ON transactions (user_id, date);
+CREATE INDEX IF NOT EXISTS transactions_user_category_date ON transactions (user_id, category, date);
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_user_fingerprint ON transactions (user_id, fingerprint);
+
+CREATE TABLE IF NOT EXISTS recurring_state (
+    user_id TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    recurring TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS category_overrides (
+    user_id TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    category TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, merchant)
+);
+"""
+
+# /history field -> analyses column
+ANALYSIS_COLUMNS = {
+    "income": "income",
+    "profile": "profile",
+    "expenses": "expenses",
+    "total_expenses": "total_expenses",
+    "health_rating": "health_rating"
+}
+
+GOAL_FIELDS = ("name", "target", "current", "deadline")
+
+
+def _date_text(value) -> Optional[str]:
+    """A date or "YYYY-MM-DD" string as stored in transactions.date."""
+    if not value:
+        return None
+    return value if isinstance(value, str) else value.isoformat()[:10]
+
+
+def _timestamp(value: datetime) -> str:
+    """Fixed-width ISO text, so string order is time order."""
+    return value.isoformat(timespec="microseconds")
+
+
+def _user_document(row) -> Optional[dict]:
+    if row is None:
+        return None
+    doc = {
+        "_id": row["id"],
+        "email": row["email"],
+        "password_hash": row["password_hash"],
+        "is_verified": bool(row["is_verified"]),
+        "created_at": datetime.fromisoformat(row["created_at"]),
+        "updated_at": datetime.fromisoformat(row["updated_at"])
+    }
+    # Like the Mongo documents, email users have no google_id/name/picture fields
+    for field in ("google_id", "name", "picture"):
+        if row[field] is not None:
+            doc[field] = row[field]
+    return doc
+
+
+def _row_document(row, exclude: tuple = ()) -> dict:
+    """Turn a row into a document: id -> _id, timestamps -> datetime, JSON columns decoded."""
+    doc = {}
+    for key in row.keys():
+        if key in exclude:
+            continue
+        value = row[key]
+        if key == "id":
+            doc["_id"] = value
+        elif key in ("created_at", "updated_at", "next_attempt_at"):
+            doc[key] = datetime.fromisoformat(value)
+        elif key == "expenses":
+            doc[key] = json.loads(value)
+        else:
+            doc[key] = value
+    return doc
+
+
+class SQLiteStorage(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() can close every thread's connection
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    # ===== LIFECYCLE =====
+
+    def connect(self):
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def ping(self) -> bool:
+        self._conn().execute("SELECT 1").fetchone()
+        return True
+
+    # ===== USERS =====
+
+    def create_user(self, email: str, password_hash: str, is_verified: bool = False) -> str:
+        user_id = str(ObjectId())
+        now = _timestamp(datetime.utcnow())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO users (id, email, password_hash, is_verified, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, email.lower(), password_hash, int(is_verified), now, now)
+            )
+        return user_id
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM users WHERE email = ?", (email.lower(),)).fetchone()
+        return _user_document(row)
+
+    def get_user_by_id(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return _user_document(row)
+
+    def get_user_by_google_id(self, google_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM users WHERE google_id = ?", (google_id,)).fetchone()
+        return _user_document(row)
+
+    def verify_user_email(self, email: str) -> bool:
+        with self._conn() as conn:
+            row = conn.execute(
+                "UPDATE users SET is_verified = 1, updated_at = ? WHERE email = ? RETURNING id",
+                (_timestamp(datetime.utcnow()), email.lower())
+            ).fetchone()
+        if row is None:
+            return False
+        user_cache.invalidate(row["id"])
+        return True
+
+    def create_or_update_google_user(self, google_id: str, email: str, name: str = "", picture: str = "") -> dict:
+        now = _timestamp(datetime.utcnow())
+        with self._conn() as conn:
+            row = conn.execute(
+                "UPDATE users SET name = ?, picture = ?, updated_at = ? WHERE google_id = ? RETURNING *",
+                (name, picture, now, google_id)
+            ).fetchone()
+            if row is None:
+                # Link Google account to an existing email user (Google users are auto-verified)
+                row = conn.execute(
+                    "UPDATE users SET google_id = ?, is_verified = 1, name = ?, picture = ?, updated_at = ? "
+                    "WHERE email = ? RETURNING *",
+                    (google_id, name, picture, now, email.lower())
+                ).fetchone()
+            if row is not None:
+                user_cache.invalidate(row["id"])
+                return _user_document(row)
+
+            user_id = str(ObjectId())
+            row = conn.execute(
+                "INSERT INTO users (id, email, password_hash, is_verified, google_id, name, picture, "
+                "created_at, updated_at) VALUES (?, ?, NULL, 1, ?, ?, ?, ?, ?) RETURNING *",
+                (user_id, email.lower(), google_id, name, picture, now, now)
+            ).fetchone()
+        return _user_document(row)
+
+    def update_password_hash(self, user_id: str, password_hash: str) -> bool:
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET password_hash = ?, updated_at = ? WHERE id = ?",
+                (password_hash, _timestamp(datetime.utcnow()), user_id)
+            )
+        return cursor.rowcount > 0
+
+    # ===== ANALYSES =====
+
+    def save_analysis(self, user_id: str, income: float, profile: str, expenses: list, result: dict) -> str:
+        analysis_id = str(ObjectId())
+        created_at = datetime.utcnow()
+        month = created_at.strftime("%Y-%m")
+        codec, data, raw_size = pack(result)
+        lines = [
+            (analysis_id, user_id, month, _category_name(exp.get("category")), _as_number(exp.get("amount", 0)))
+            for exp in expenses
+        ]
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO analyses (id, user_id, income, profile, expenses, total_expenses, "
+                "health_rating, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    analysis_id, user_id, income, profile, json.dumps(expenses, default=str),
+                    sum(line[4] for line in lines),
+                    _extract_health_rating(result.get("budget_plan")),
+                    _timestamp(created_at)
+                )
+            )
+            conn.execute(
+                "INSERT INTO analysis_sections (id, codec, data, raw_size) VALUES (?, ?, ?, ?)",
+                (analysis_id, codec, data, raw_size)
+            )
+            conn.executemany(
+                "INSERT INTO analysis_expenses (analysis_id, user_id, month, category, amount) "
+                "VALUES (?, ?, ?, ?, ?)",
+                lines
+            )
+        return analysis_id
+
+    def get_analyses_page(self, user_id: str, limit: int = 10, cursor: str = None, fields: list = None) -> dict:
+        projection = _history_projection(fields)
+        columns = ["a.id", "a.created_at"] + [
+            f"a.{ANALYSIS_COLUMNS[field]}" for field in projection if field in ANALYSIS_COLUMNS
+        ]
+        join = ""
+        if _wants_result(projection):
+            columns += ["s.codec", "s.data"]
+            join = "LEFT JOIN analysis_sections s ON s.id = a.id"
+
+        sql = f"SELECT {', '.join(columns)} FROM analyses a {join} WHERE a.user_id = ?"
+        params = [user_id]
+        if cursor:
+            created_at, doc_id = _cursor_position(cursor)
+            sql += " AND (a.created_at, a.id) < (?, ?)"
+            params += [_timestamp(created_at), str(doc_id)]
+        sql += " ORDER BY a.created_at DESC, a.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        docs = [_row_document(row, exclude=("codec", "data")) for row in rows]
+        if _wants_result(projection):
+            sections = [
+                {"_id": row["id"], "codec": row["codec"], "data": row["data"]}
+                for row in rows if row["codec"] is not None
+            ]
+            _attach_sections(docs, sections, projection)
+        return _keyset_result(docs, limit)
+
+    def get_analysis_by_id(self, user_id: str, analysis_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT a.*, s.codec, s.data FROM analyses a LEFT JOIN analysis_sections s ON s.id = a.id "
+            "WHERE a.id = ? AND a.user_id = ?",
+            (analysis_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        doc = _row_document(row, exclude=("codec", "data"))
+        if row["codec"] is not None:
+            _attach_sections([doc], [{"_id": row["id"], "codec": row["codec"], "data": row["data"]}])
+        return doc
+
+    # ===== SAVINGS GOALS =====
+
+    def save_goal(self, user_id: str, name: str, target: float, current: float = 0, deadline: str = None) -> str:
+        goal_id = str(ObjectId())
+        now = _timestamp(datetime.utcnow())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO savings_goals (id, user_id, name, target, current, deadline, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (goal_id, user_id, name, target, current, deadline, now, now)
+            )
+        return goal_id
+
+    def get_all_goals(self, user_id: str) -> list:
+        rows = self._conn().execute(
+            "SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC", (user_id,)
+        ).fetchall()
+        return [_row_document(row) for row in rows]
+
+    def get_goal_by_id(self, user_id: str, goal_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT * FROM savings_goals WHERE id = ? AND user_id = ?", (goal_id, user_id)
+        ).fetchone()
+        return _row_document(row) if row else None
+
+    def update_goal(self, user_id: str, goal_id: str, updates: dict) -> bool:
+        # Only known columns can be set (the Mongo backend stores any field)
+        fields = [field for field in GOAL_FIELDS if field in updates]
+        assignments = "".join(f"{field} = ?, " for field in fields)
+        with self._conn() as conn:
+            cursor = conn.execute(
+                f"UPDATE savings_goals SET {assignments}updated_at = ? WHERE id = ? AND user_id = ?",
+                [updates[field] for field in fields] + [_timestamp(datetime.utcnow()), goal_id, user_id]
+            )
+        return cursor.rowcount > 0
+
+    def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM savings_goals WHERE id = ? AND user_id = ?", (goal_id, user_id))
+        return cursor.rowcount > 0
+
+    # ===== CHAT HISTORY =====
+
+    def save_chat_message(self, user_id: str, role: str, content: str) -> str:
+        # A local insert is cheap enough that chat needs no write-behind buffer here
+        message_id = str(ObjectId())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO chat_history (id, user_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (message_id, user_id, role, content, _timestamp(datetime.utcnow()))
+            )
+        return message_id
+
+    def get_chat_history_page(self, user_id: str, limit: int = 50, cursor: str = None) -> dict:
+        sql = "SELECT * FROM chat_history WHERE user_id = ?"
+        params = [user_id]
+        if cursor:
+            created_at, doc_id = _cursor_position(cursor)
+            sql += " AND (created_at, id) < (?, ?)"
+            params += [_timestamp(created_at), str(doc_id)]
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        page = _keyset_result([_row_document(row) for row in rows], limit)
+        page["items"].reverse()  # Return in chronological order
+        return page
+
+    def clear_chat_history(self, user_id: str) -> bool:
+        with self._conn() as conn:
+            cursor = conn.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
+        return cursor.rowcount > 0
+
+    # ===== EMAIL OUTBOX =====
+
+    def enqueue_email(self, recipient: str, subject: str, text: str, html: str) -> str:
+        email_id = str(ObjectId())
+        now = _timestamp(datetime.utcnow())
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO email_outbox (id, recipient, subject, text, html, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (email_id, recipient, subject, text, html, now, now)
+            )
+        return email_id
+
+    def claim_emails(self, limit: int, lease_seconds: float) -> list:
+        now = datetime.utcnow()
+        with self._conn() as conn:
+            rows = conn.execute(
+                "UPDATE email_outbox SET next_attempt_at = ?, attempts = attempts + 1 WHERE id IN ("
+                "SELECT id FROM email_outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?) RETURNING *",
+                (_timestamp(now + timedelta(seconds=lease_seconds)), _timestamp(now), limit)
+            ).fetchall()
+        return [_row_document(row) for row in rows]
+
+    def mark_email_sent(self, email_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM email_outbox WHERE id = ?", (email_id,))
+
+    def mark_email_failed(self, email_id: str, error: str, retry_at: Optional[datetime] = None):
+        with self._conn() as conn:
+            if retry_at is None:
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'failed', last_error = ? WHERE id = ?", (error, email_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE email_outbox SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (_timestamp(retry_at), error, email_id)
+                )
+
+    # ===== PARSED STATEMENTS =====
+
+    def get_parsed_statement(self, key: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT codec, data FROM parsed_statements WHERE key = ?", (key,)).fetchone()
+        return unpack(bytes(row["data"]), row["codec"]) if row else None
+
+    def save_parsed_statement(self, key: str, statement: dict):
+        codec, data, _ = pack(statement)
+        now = datetime.utcnow()
+        with self._conn() as conn:
+            # No TTL index here: expired entries are dropped as new ones are written
+            conn.execute(
+                "DELETE FROM parsed_statements WHERE created_at < ?",
+                (_timestamp(now - timedelta(days=PARSE_CACHE_TTL_DAYS)),)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO parsed_statements (key, codec, data, created_at) VALUES (?, ?, ?, ?)",
+                (key, codec, data, _timestamp(now))
+            )
+
+    # ===== TRANSACTIONS =====
+
+    def upsert_transactions(self, user_id: str, records: list, source: str, import_id: str) -> list:
+        if not records:
+            return []
+        now = _timestamp(datetime.utcnow())
+        ids = [str(ObjectId()) for _ in records]
+        with self._conn() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO transactions (id, user_id, date, description, amount, balance, category, "
+                "merchant, source, import_id, fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (row_id, user_id, _date_text(record["date"]), record["description"], record["amount"],
+                     record["balance"], record["category"], record["merchant"], source, import_id,
+                     record["fingerprint"], now)
+                    for row_id, record in zip(ids, records)
+                ]
+            )
+            if conn.total_changes - before == len(records):
+                return records
+            # Some fingerprints were already stored: the new records are the ones whose row went in
+            inserted = {
+                row[0] for row in conn.execute(
+                    "SELECT id FROM transactions WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)
+                )
+            }
+        return [record for row_id, record in zip(ids, records) if row_id in inserted]
+
+    def get_transactions(self, user_id: str, start: date, end: Optional[date] = None, category: str = None) -> list:
+        query = "SELECT * FROM transactions WHERE user_id = ?"
+        params = [user_id]
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        query += " AND date >= ?"
+        params.append(_date_text(start))
+        if end:
+            query += " AND date < ?"
+            params.append(_date_text(end))
+        rows = self._conn().execute(query + " ORDER BY date", params).fetchall()
+        return [
+            {key: row[key] for key in row.keys() if key not in ("id", "user_id", "created_at")}
+            for row in rows
+        ]
+
+    def count_transactions(self, user_id: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM transactions WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def get_transaction_trends(self, user_id: str, months: int = 6) -> dict:
+        rows = self._conn().execute(
+            "SELECT substr(date, 1, 7) AS month, category, "
+            "SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS spent, "
+            "SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS received, COUNT(*) AS count "
+            "FROM transactions WHERE user_id = ? AND date >= ? GROUP BY month, category",
+            (user_id, _first_month(months))
+        ).fetchall()
+        return _transaction_trends([
+            {"_id": {"month": row["month"], "category": row["category"]}, "spent": row["spent"],
+             "received": row["received"], "count": row["count"]}
+            for row in rows
+        ])
+
+    # ===== RECURRING STATE =====
+
+    def get_recurring(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT recurring, updated_at FROM recurring_state WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"recurring": json.loads(row["recurring"]), "updated_at": datetime.fromisoformat(row["updated_at"])}
+
+    def get_recurring_state(self, user_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT codec, data, version FROM recurring_state WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return {"state": unpack(bytes(row["data"]), row["codec"]), "version": row["version"]} if row else None
+
+    def save_recurring_state(self, user_id: str, state: dict, version: int, recurring: list) -> bool:
+        codec, data, _ = pack(state)
+        now = _timestamp(datetime.utcnow())
+        with self._conn() as conn:
+            if not version:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO recurring_state (user_id, codec, data, recurring, version, updated_at) "
+                    "VALUES (?, ?, ?, ?, 1, ?)",
+                    (user_id, codec, data, json.dumps(recurring), now)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE recurring_state SET codec = ?, data = ?, recurring = ?, version = version + 1, "
+                    "updated_at = ? WHERE user_id = ? AND version = ?",
+                    (codec, data, json.dumps(recurring), now, user_id, version)
+                )
+        return cursor.rowcount == 1
+
+    # ===== CATEGORY OVERRIDES =====
+
+    def get_category_overrides(self, user_id: str) -> dict:
+        rows = self._conn().execute(
+            "SELECT merchant, category FROM category_overrides WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        return {row["merchant"]: row["category"] for row in rows}
+
+    def set_category_override(self, user_id: str, merchant: str, category: str):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO category_overrides (user_id, merchant, category, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, merchant, category, _timestamp(datetime.utcnow()))
+            )
+            conn.execute(
+                "UPDATE transactions SET category = ? WHERE user_id = ? AND merchant = ? AND amount > 0",
+                (category, user_id, merchant)
+            )
+
+    # ===== TRENDS =====
+
+    def get_trends(self, user_id: str, months: int = 6) -> dict:
+        """Per-month totals grouped in SQL, merged into the same shape as the Mongo rollups."""
+        first_month = _first_month(months)
+        conn = self._conn()
+        month_rows = conn.execute(
+            "SELECT substr(created_at, 1, 7) AS month, "
+            "SUM(CASE WHEN typeof(income) IN ('integer', 'real') THEN income ELSE 0 END) AS total_income, "
+            "COUNT(*) AS analyses_count "
+            "FROM analyses WHERE user_id = ? AND created_at >= ? GROUP BY month",
+            (user_id, first_month)
+        ).fetchall()
+        category_rows = conn.execute(
+            "SELECT month, category, SUM(amount) AS amount FROM analysis_expenses "
+            "WHERE user_id = ? AND month >= ? GROUP BY month, category",
+            (user_id, first_month)
+        ).fetchall()
+
+        monthly = _merge_trends({
+            "months": [
+                {"_id": row["month"], "total_income": row["total_income"], "analyses_count": row["analyses_count"]}
+                for row in month_rows
+            ],
+            "categories": [
+                {"_id": {"month": row["month"], "category": row["category"]}, "amount": row["amount"]}
+                for row in category_rows
+            ]
+        })
+        return {
+            "categories": _summarize_categories(monthly),
+            "monthly_breakdown": monthly
+        }
@@ -0,0 +1,126 @@
+"""
+Per-user transactions: the normalized records imports and PDF uploads store, and
+month-bounded reads of them for trends, recurring detection and fraud baselines.
+
+Statement rows ({date, description, debit, credit, balance}) become records
+{date, description, amount, balance, category, merchant, fingerprint}. Amount is
+positive for money spent and negative for money received; debits are
+categorized by categorizer.py (with the user's overrides) and credits are
+"Income"; merchant is the merchant_classifier key. The fingerprint hashes the
+date, amount and normalized description, plus a counter for identical rows in
+the same upload, and the store upserts on it, so uploading a statement again
+adds nothing. Rows without a date aren't stored: they would have no month to be
+read back in, and nothing to tell next month's identical row from a duplicate.
+
+Reads take a range of whole calendar months, which the (user_id, date) and
+(user_id, category, date) indexes serve directly, instead of a user's whole history.
+"""
+import hashlib
+import os
+import statistics
+from datetime import date, datetime
+from typing import Optional
+
+from categorizer import categorizer
+from merchant_classifier import merchant_classifier, normalize
+
+INCOME_CATEGORY = "Income"
+# Fingerprint counters kept per upload before earlier dates' are dropped (bounds memory on huge imports)
+FINGERPRINT_MEMORY = int(os.getenv("TRANSACTION_FINGERPRINT_MEMORY", "20000"))
+RECURRING_LOOKBACK_MONTHS = int(os.getenv("RECURRING_LOOKBACK_MONTHS", "24"))  # enough for annual charges
+FRAUD_BASELINE_MONTHS = int(os.getenv("FRAUD_BASELINE_MONTHS", "3"))
+
+
+# ===== RECORDS =====
+
+def fingerprint(day: str, amount: float, text: str, seen: dict) -> str:
+    """
+    Stable id for a dated row (`text` is its normalized description); `seen`
+    numbers identical rows within one upload so they stay distinct. Starts with
+    the date, so a statement's rows land next to each other in the unique index.
+    """
+    days = seen.setdefault("days", {})  # date -> {row key: count}
+    passes = seen.setdefault("passes", {})  # date -> times its counters were started
+    counts = days.get(day)
+    if counts is None:
+        # Identical rows share a date and statements are usually sorted by date, so once
+        # the counters are too many, the other dates' go. A date that comes back anyway
+        # (an unsorted upload) is counted again in a new pass, which is part of the hash,
+        # so its rows can't collide with the ones counted before.
+        if sum(len(other) for other in days.values()) > FINGERPRINT_MEMORY:
+            days.clear()
+        counts = days[day] = {}
+        passes[day] = passes.get(day, 0) + 1
+    key = f"{day}|{amount:.2f}|{text}"
+    count = counts.get(key, 0)
+    counts[key] = count + 1
+    number = f"{count}" if passes[day] == 1 else f"{count}|{passes[day] - 1}"
+    return f"{day}:{hashlib.sha1(f'{key}|{number}'.encode()).hexdigest()[:16]}"
+
+
+def to_records(rows: list, overrides: dict = None, seen: dict = None) -> list:
+    """
+    Statement rows as transaction records, in order. Rows without a date, or with
+    neither a debit nor a credit, are dropped. Pass the same `seen` for every batch
+    of one upload.
+    """
+    seen = {} if seen is None else seen
+    rows = [row for row in rows if row["date"] and (row["debit"] is not None or row["credit"] is not None)]
+    debits = [row["description"] for row in rows if row["debit"] is not None]
+    categories = iter(categorizer.categorize_all(debits, overrides))
+    described = {}  # description -> (normalized text, merchant key); statements repeat descriptions a lot
+    records = []
+    for row in rows:
+        if row["debit"] is not None:
+            amount, category = row["debit"], next(categories)
+        else:
+            amount, category = -row["credit"], INCOME_CATEGORY
+        description = row["description"]
+        if description not in described:
+            described[description] = (normalize(description), merchant_classifier.merchant_key(description))
+        text, merchant = described[description]
+        records.append({
+            "date": row["date"],
+            "description": description,
+            "amount": amount,
+            "balance": row["balance"],
+            "category": category,
+            "merchant": merchant,
+            "fingerprint": fingerprint(row["date"], amount, text, seen)
+        })
+    return records
+
+
+# ===== MONTH-BOUNDED READS =====
+
+def month_start(months: int, today: Optional[date] = None) -> date:
+    """The first day of the oldest of the last `months` calendar months (the current one included)."""
+    today = today or datetime.utcnow().date()
+    index = today.year * 12 + today.month - 1 - (max(months, 1) - 1)
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def recent(store, user_id: str, months: int, category: str = None) -> list:
+    """The user's transactions from the last `months` calendar months, oldest first."""
+    return store.get_transactions(user_id, month_start(months), category=category)
+
+
+def category_baseline(transactions: list) -> dict:
+    """
+    Typical spending per category: {category: {count, median, high, max}}, where high
+    is the 90th percentile. Used by the fraud agent to judge new expenses.
+    """
+    amounts = {}
+    for transaction in transactions:
+        if transaction["amount"] > 0:
+            amounts.setdefault(transaction["category"], []).append(transaction["amount"])
+    baseline = {}
+    for category, values in amounts.items():
+        values.sort()
+        baseline[category] = {
+            "count": len(values),
+            "median": round(statistics.median(values), 2),
+            "high": round(values[min(len(values) - 1, int(len(values) * 0.9))], 2),
+            "max": round(values[-1], 2)
+        }
+    return baseline
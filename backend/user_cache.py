@@ -0,0 +1,219 @@
+"""
+TTL + LRU cache of user records for the auth dependency.
+
+Every protected request used to decode the JWT and then do a find_one on the users
+collection. User documents almost never change, so they are cached by user id for
+USER_CACHE_TTL seconds and invalidated explicitly when database.py modifies a user.
+
+Backends:
+- "memory" (default): per-process OrderedDict. Other workers may serve a stale
+  record for up to the TTL after an invalidation.
+- "redis": shared between workers (set USER_CACHE_REDIS_URL); needs the `redis`
+  package (in requirements.txt, only imported with this backend). Async callers
+  use redis.asyncio, so the auth dependency never blocks the event loop on Redis.
+  Datetimes are stored tagged, so cached users come back exactly as loaded.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_REDIS_URL = os.getenv("USER_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Never keep credentials in the cache (it may be a shared Redis)
+EXCLUDED_FIELDS = ("password_hash",)
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(value)
+
+    def set(self, key: str, value: dict, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # Nothing here waits on I/O, so async callers use the same methods
+    async def aget(self, key: str) -> Optional[dict]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: dict, ttl: float):
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    return str(value)
+
+
+def _decode(value: dict):
+    if value.keys() == {"$datetime"}:
+        return datetime.fromisoformat(value["$datetime"])
+    return value
+
+
+def dumps(user: dict) -> str:
+    return json.dumps(user, default=_encode)
+
+
+def loads(raw) -> dict:
+    return json.loads(raw, object_hook=_decode)
+
+
+class RedisBackend:
+    """Shared cache for multi-worker deployments. Redis handles expiry and eviction."""
+
+    def __init__(self, url: str, prefix: str = "user:"):
+        import redis
+        import redis.asyncio
+
+        self._redis = redis.Redis.from_url(url)
+        self._aredis = redis.asyncio.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self._redis.get(self.prefix + key)
+        return loads(raw) if raw else None
+
+    def set(self, key: str, value: dict, ttl: float):
+        self._redis.set(self.prefix + key, dumps(value), ex=max(int(ttl), 1))
+
+    def delete(self, key: str):
+        self._redis.delete(self.prefix + key)
+
+    async def aget(self, key: str) -> Optional[dict]:
+        raw = await self._aredis.get(self.prefix + key)
+        return loads(raw) if raw else None
+
+    async def aset(self, key: str, value: dict, ttl: float):
+        await self._aredis.set(self.prefix + key, dumps(value), ex=max(int(ttl), 1))
+
+    async def adelete(self, key: str):
+        await self._aredis.delete(self.prefix + key)
+
+    def size(self) -> Optional[int]:
+        return None  # not tracked per key prefix
+
+
+class UserCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _count(self, user: Optional[dict]) -> Optional[dict]:
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    @staticmethod
+    def _cacheable(user: dict) -> dict:
+        return {k: v for k, v in user.items() if k not in EXCLUDED_FIELDS}
+
+    def get(self, user_id: str, loader) -> Optional[dict]:
+        """Return the cached user, or call loader(user_id) and cache the result."""
+        try:
+            user = self._count(self.backend.get(user_id))
+        except Exception as e:
+            print(f"⚠️ User cache read failed: {e}")
+            user = self._count(None)
+        if user is None:
+            user = loader(user_id)
+            if user:  # unknown ids are not cached
+                try:
+                    self.backend.set(user_id, self._cacheable(user), self.ttl)
+                except Exception as e:
+                    print(f"⚠️ User cache write failed: {e}")
+        return user
+
+    async def aget(self, user_id: str, loader) -> Optional[dict]:
+        """Like get(), for an async loader; never blocks the event loop on the backend."""
+        try:
+            user = self._count(await self.backend.aget(user_id))
+        except Exception as e:
+            print(f"⚠️ User cache read failed: {e}")
+            user = self._count(None)
+        if user is None:
+            user = await loader(user_id)
+            if user:
+                try:
+                    await self.backend.aset(user_id, self._cacheable(user), self.ttl)
+                except Exception as e:
+                    print(f"⚠️ User cache write failed: {e}")
+        return user
+
+    def invalidate(self, user_id: str):
+        """Drop a user's cached record after it changes."""
+        self.invalidations += 1
+        try:
+            self.backend.delete(str(user_id))
+        except Exception as e:
+            print(f"⚠️ User cache invalidation failed: {e}")
+
+    async def ainvalidate(self, user_id: str):
+        """invalidate() for async callers."""
+        self.invalidations += 1
+        try:
+            await self.backend.adelete(str(user_id))
+        except Exception as e:
+            print(f"⚠️ User cache invalidation failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "size": self.backend.size(),
+            "ttl_seconds": self.ttl
+        }
+
+
+def _create_backend():
+    if USER_CACHE_BACKEND == "redis":
+        return RedisBackend(USER_CACHE_REDIS_URL)
+    return MemoryBackend(USER_CACHE_SIZE)
+
+
+user_cache = UserCache(_create_backend(), USER_CACHE_TTL)
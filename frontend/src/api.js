@@ -65,8 +65,11 @@ export const analyzeFinance = async (data) => {
   return res.data;
 };
 
-export const getHistory = async (limit = 10) => {
-  const res = await api.get(`/history?limit=${limit}`);
+export const getHistory = async (limit = 10, cursor = null, fields = null) => {
+  const params = { limit };
+  if (cursor) params.cursor = cursor;
+  if (fields) params.fields = fields.join(",");
+  const res = await api.get('/history', { params });
   return res.data;
 };
 
@@ -76,6 +79,55 @@ export const getAnalysisById = async (id) => {
 };
 
 
+// ===== PDF UPLOAD =====
+
+// Returns { expenses } for a short statement, or { job } to poll with getUploadJob
+export const uploadPdf = async (file) => {
+  const form = new FormData();
+  form.append("file", file);
+  const res = await api.post('/upload-pdf', form, {
+    headers: { "Content-Type": "multipart/form-data" }
+  });
+  return res.data;
+};
+
+export const getUploadJob = async (id) => {
+  const res = await api.get(`/upload-pdf/jobs/${id}`);
+  return res.data;
+};
+
+// ===== IMPORT =====
+
+// CSV / OFX / QIF export; returns { job } to poll with getImportJob
+export const importTransactions = async (file) => {
+  const form = new FormData();
+  form.append("file", file);
+  const res = await api.post('/import', form, {
+    headers: { "Content-Type": "multipart/form-data" }
+  });
+  return res.data;
+};
+
+export const getImportJob = async (id) => {
+  const res = await api.get(`/import/jobs/${id}`);
+  return res.data;
+};
+
+
+// ===== CATEGORIES =====
+
+export const getCategories = async () => {
+  const res = await api.get('/categories');
+  return res.data;
+};
+
+// Applies to every row from the same merchant in later uploads
+export const correctCategory = async (description, category) => {
+  const res = await api.post('/categories/corrections', { description, category });
+  return res.data;
+};
+
+
 // ===== SAVINGS GOALS =====
 
 export const createGoal = async (data) => {
@@ -111,8 +163,10 @@ export const sendChatMessage = async (message, context = {}) => {
   return res.data;
 };
 
-export const getChatHistory = async (limit = 50) => {
-  const res = await api.get(`/chat/history?limit=${limit}`);
+export const getChatHistory = async (limit = 50, cursor = null) => {
+  const params = { limit };
+  if (cursor) params.cursor = cursor;
+  const res = await api.get('/chat/history', { params });
   return res.data;
 };
 
@@ -129,15 +183,20 @@ export const detectRecurring = async (expenses) => {
   return res.data;
 };
 
+export const getRecurring = async () => {
+  const res = await api.get('/recurring');
+  return res.data;
+};
+
 
 // ===== TRENDS =====
 
-export const getMonthlyTrends = async (months = 6) => {
-  const res = await api.get(`/trends/monthly?months=${months}`);
+export const getMonthlyTrends = async (months = 6, source = "analyses") => {
+  const res = await api.get(`/trends/monthly?months=${months}&source=${source}`);
   return res.data;
 };
 
-export const getCategoryTrends = async (months = 6) => {
-  const res = await api.get(`/trends/categories?months=${months}`);
+export const getCategoryTrends = async (months = 6, source = "analyses") => {
+  const res = await api.get(`/trends/categories?months=${months}&source=${source}`);
   return res.data;
 };
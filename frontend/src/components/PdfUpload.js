@@ -1,21 +1,39 @@
-import axios from "axios";
+import { useState } from "react";
+import { uploadPdf, getUploadJob } from "../api";
 
-const API_URL = process.env.REACT_APP_API_URL || "http://127.0.0.1:8000";
+const POLL_INTERVAL_MS = 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
 
 function PdfUpload({ setExpenses }) {
+  const [progress, setProgress] = useState("");
+
   const upload = async (e) => {
     const file = e.target.files[0];
     if (!file) return;
 
-    const form = new FormData();
-    form.append("file", file);
-
-    const res = await axios.post(
-      `${API_URL}/upload-pdf`,
-      form
-    );
+    let raw;
+    try {
+      const data = await uploadPdf(file);
+      raw = data.expenses;
 
-    const raw = res.data.expenses;
+      // Long statements are parsed in the background: poll until done
+      if (data.job) {
+        let job = data.job;
+        while (job.status === "queued" || job.status === "running") {
+          setProgress(`Reading page ${job.pages_done} of ${job.pages}...`);
+          await sleep(POLL_INTERVAL_MS);
+          job = await getUploadJob(job.id);
+        }
+        if (job.status !== "done") throw new Error(job.error);
+        raw = job.expenses;
+      }
+    } catch (err) {
+      alert(err.response?.data?.detail || "Could not parse expenses from PDF");
+      return;
+    } finally {
+      setProgress("");
+    }
 
     // 🔥 NORMALIZE TO ARRAY
     let normalized = [];
@@ -36,7 +54,10 @@ function PdfUpload({ setExpenses }) {
   };
 
   return (
-    <input type="file" accept=".pdf" onChange={upload} />
+    <>
+      <input type="file" accept=".pdf" onChange={upload} />
+      {progress && <p>{progress}</p>}
+    </>
   );
 }
 
@@ -97,10 +97,12 @@ function RecurringExpenses({ expenses = [] }) {
                             <div key={i} className="recurring-item">
                                 <div className="item-info">
                                     <span className="item-name">{item.category}</span>
-                                    <span className="item-frequency">{item.frequency}</span>
+                                    <span className="item-frequency">
+                                        {item.frequency}{item.next_expected && ` · next ${item.next_expected}`}
+                                    </span>
                                 </div>
                                 <div className="item-amounts">
-                                    <span className="monthly-amount">₹{item.amount}/mo</span>
+                                    <span className="monthly-amount">₹{item.monthly_cost ?? item.amount}/mo</span>
                                     <span className="annual-amount">₹{item.annual_cost}/yr</span>
                                 </div>
                             </div>
@@ -1,5 +1,5 @@
 import { useState, useEffect } from "react";
-import { getMonthlyTrends, getCategoryTrends } from "../api";
+import { getCategoryTrends } from "../api";
 import "./TrendsDashboard.css";
 
 function TrendsDashboard() {
@@ -15,12 +15,10 @@ function TrendsDashboard() {
     const fetchTrends = async () => {
         setLoading(true);
         try {
-            const [monthly, categories] = await Promise.all([
-                getMonthlyTrends(6),
-                getCategoryTrends(6)
-            ]);
-            setMonthlyData(monthly.trends || []);
-            setCategoryData(categories.categories || {});
+            // One request: the category endpoint also returns the monthly breakdown
+            const trends = await getCategoryTrends(6);
+            setMonthlyData(trends.monthly_breakdown || []);
+            setCategoryData(trends.categories || {});
         } catch (err) {
             console.error("Error fetching trends:", err);
         }